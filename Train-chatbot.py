@@ -92,12 +92,8 @@ from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import Dense, Dropout
 from tensorflow.keras.optimizers import SGD
 import random
-import nltk
-from nltk.stem import LancasterStemmer
 from textblob import TextBlob
-
-# Initialize stemmer
-stemmer = LancasterStemmer()
+from functions.bow_encoder import BowEncoder
 
 # Load dataset
 with open('chatbot.json') as file:
@@ -108,58 +104,16 @@ def correct_typo(sentence):
     blob = TextBlob(sentence)
     return str(blob.correct())  # Correct spelling errors
 
-# Prepare data
-words = []
-classes = []
-documents = []
-ignore_words = ['?', '!', '.', ',']
-
-for intent in data['intents']:
-    for pattern in intent['patterns']:
-        # Correct typos in the sentence
-        corrected_pattern = correct_typo(pattern)
-        
-        # Tokenize each word in the sentence
-        word_list = nltk.word_tokenize(corrected_pattern)
-        words.extend(word_list)
-        documents.append((word_list, intent['tag']))
-        if intent['tag'] not in classes:
-            classes.append(intent['tag'])
-
-# Stem and sort words
-words = [stemmer.stem(w.lower()) for w in words if w not in ignore_words]
-words = sorted(list(set(words)))
-
-# Sort classes
-classes = sorted(list(set(classes)))
-
-# Create training data
-training = []
-output_empty = [0] * len(classes)
-
-for doc in documents:
-    bag = []
-    pattern_words = doc[0]
-    pattern_words = [stemmer.stem(word.lower()) for word in pattern_words]
-
-    for w in words:
-        bag.append(1) if w in pattern_words else bag.append(0)
-
-    output_row = list(output_empty)
-    output_row[classes.index(doc[1])] = 1
-
-    training.append([bag, output_row])
+# Prepare data (typo dikoreksi dulu, lalu vocabulary dibangun oleh encoder bersama)
+encoder, documents = BowEncoder.from_intents(data, preprocess=correct_typo)
 
 # Shuffle and convert to np.array
-random.shuffle(training)
-
-# Ensure consistent shapes before conversion
-bag_length = len(training[0][0])
-output_length = len(training[0][1])
+random.shuffle(documents)
+train_x = encoder.encode_batch([text for text, _ in documents])
+train_y = encoder.encode_labels([tag for _, tag in documents])
 
-# Convert to np.array
-train_x = np.array([item[0] for item in training])
-train_y = np.array([item[1] for item in training])
+bag_length = train_x.shape[1]
+output_length = train_y.shape[1]
 
 # Create model
 # Adjusting the model architecture for larger dataset
@@ -0,0 +1,224 @@
+# functions/aggregates.py
+
+import hashlib
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+
+# =============================================================================
+# CUBE AGREGAT: RATA-RATA SLA BULANAN & TAHUNAN PER WILAYAH DAN NASIONAL
+# =============================================================================
+#
+# Rebuild manual:
+#   python -m functions.aggregates rebuild            (observasi & proyeksi)
+#   python -m functions.aggregates rebuild observasi
+#   python -m functions.aggregates status
+
+AGGREGATE_DIR = "data/aggregates"
+# Versi 2: kolom `n` (cacah baris) disimpan di samping rata-rata agar increment bisa digabung
+AGGREGATE_FORMAT = 2
+AGGREGATE_LEVELS = ["provinsi", "kabupaten", "kecamatan", "desa"]
+NATIONAL = ("nasional", "indonesia")
+
+
+def _paths(data_type, out_dir=AGGREGATE_DIR):
+    return {
+        "monthly": os.path.join(out_dir, f"{data_type}_monthly.parquet"),
+        "yearly": os.path.join(out_dir, f"{data_type}_yearly.parquet"),
+        "meta": os.path.join(out_dir, f"{data_type}.meta.json"),
+    }
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _source_signature(source_path):
+    stat = os.stat(source_path)
+    return {"source": source_path, "mtime": stat.st_mtime, "size": stat.st_size}
+
+
+def _read_meta(data_type, out_dir=AGGREGATE_DIR):
+    path = _paths(data_type, out_dir)["meta"]
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _write_meta(data_type, meta, out_dir=AGGREGATE_DIR):
+    with open(_paths(data_type, out_dir)["meta"], "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def is_stale(data_type, source_path, out_dir=AGGREGATE_DIR):
+    """
+    True jika agregat belum ada atau parquet sumber sudah berubah.
+    mtime/ukuran dicek dulu (murah); jika berbeda, hash isi file yang menentukan.
+    """
+    paths = _paths(data_type, out_dir)
+    meta = _read_meta(data_type, out_dir)
+    if meta is None or not all(os.path.exists(paths[k]) for k in ("monthly", "yearly")):
+        return True
+    if meta.get("format") != AGGREGATE_FORMAT:
+        return True
+
+    signature = _source_signature(source_path)
+    if signature["source"] == meta.get("source") and signature["mtime"] == meta.get("mtime") and signature["size"] == meta.get("size"):
+        return False
+    if file_sha256(source_path) != meta.get("sha256"):
+        return True
+
+    # File hanya di-touch/disalin ulang: isi sama, perbarui signature saja
+    meta.update(signature)
+    _write_meta(data_type, meta, out_dir)
+    return False
+
+
+def _aggregate(df, period):
+    parts = [
+        df.groupby(period, sort=True)["sla"].agg(sla="mean", n="count").reset_index()
+        .assign(level=NATIONAL[0], name=NATIONAL[1])
+    ]
+    for level in AGGREGATE_LEVELS:
+        if level not in df.columns:
+            continue
+        agg = df.groupby([level, period], sort=True, observed=True)["sla"].agg(sla="mean", n="count").reset_index()
+        parts.append(agg.rename(columns={level: "name"}).assign(level=level))
+
+    out = pd.concat(parts, ignore_index=True)[["level", "name", period, "sla", "n"]]
+    out["name"] = out["name"].astype(str)
+    return out.sort_values(["level", "name", period], kind="stable").reset_index(drop=True)
+
+
+def build_aggregates(data_type, df, source_path, out_dir=AGGREGATE_DIR, increments=()):
+    """
+    Menulis agregat bulanan & tahunan `df` (frame hasil load_timeseries_data) ke `out_dir`.
+    `increments` adalah nama file increment yang sudah termasuk di dalam `df`.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = _paths(data_type, out_dir)
+    started = time.perf_counter()
+
+    if "year" not in df.columns:
+        df = df.assign(year=pd.to_datetime(df["time"]).dt.year)
+    _aggregate(df, "time").to_parquet(paths["monthly"], index=False)
+    _aggregate(df, "year").to_parquet(paths["yearly"], index=False)
+
+    meta = _source_signature(source_path)
+    meta.update({
+        "sha256": file_sha256(source_path),
+        "format": AGGREGATE_FORMAT,
+        "increments": list(increments),
+        "n_source_rows": int(len(df)),
+        "built_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "build_seconds": round(time.perf_counter() - started, 2),
+    })
+    _write_meta(data_type, meta, out_dir)
+    return meta
+
+
+def _merge(old, new, period):
+    """Menggabungkan dua tabel agregat: rata-rata dibobot cacah baris masing-masing."""
+    key = ["level", "name", period]
+    both = pd.concat([old, new], ignore_index=True)
+    both = both.assign(total=both["sla"].astype("float64") * both["n"])
+    out = both.groupby(key, sort=False)[["total", "n"]].sum().reset_index()
+    out["sla"] = out["total"] / out["n"]
+    out = out[["level", "name", period, "sla", "n"]]
+    return out.sort_values(key, kind="stable").reset_index(drop=True)
+
+
+def applied_increments(data_type, out_dir=AGGREGATE_DIR):
+    meta = _read_meta(data_type, out_dir)
+    return (meta or {}).get("increments", [])
+
+
+def apply_increment(data_type, df_new, increment_name, out_dir=AGGREGATE_DIR):
+    """Memperbarui agregat tersimpan hanya dengan baris increment `df_new` (tanpa membaca sumber)."""
+    paths = _paths(data_type, out_dir)
+    started = time.perf_counter()
+    if "year" not in df_new.columns:
+        df_new = df_new.assign(year=pd.to_datetime(df_new["time"]).dt.year)
+    for period, key in (("time", "monthly"), ("year", "yearly")):
+        merged = _merge(pd.read_parquet(paths[key]), _aggregate(df_new, period), period)
+        merged.to_parquet(paths[key], index=False)
+
+    meta = _read_meta(data_type, out_dir)
+    meta["increments"] = meta.get("increments", []) + [increment_name]
+    meta["n_source_rows"] = meta.get("n_source_rows", 0) + int(len(df_new))
+    meta["updated_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    meta["update_seconds"] = round(time.perf_counter() - started, 2)
+    _write_meta(data_type, meta, out_dir)
+    return meta
+
+
+class _SeriesTable:
+    """Tabel agregat terurut (level, name, periode) dengan indeks (level, name) -> slice baris."""
+
+    def __init__(self, frame, period):
+        self.frame = frame
+        self.period = period
+        self.ranges = {
+            key: (int(positions[0]), int(positions[-1]) + 1)
+            for key, positions in frame.groupby(["level", "name"], sort=False).indices.items()
+        }
+
+    def get(self, level, name):
+        rng = self.ranges.get((level, str(name).lower().strip()))
+        if rng is None:
+            return self.frame.iloc[0:0][[self.period, "sla"]].reset_index(drop=True)
+        return self.frame.iloc[rng[0]:rng[1]][[self.period, "sla"]].reset_index(drop=True)
+
+
+class AggregateStore:
+    """Akses baca agregat bulanan/tahunan satu dataset."""
+
+    def __init__(self, monthly, yearly):
+        self._monthly = _SeriesTable(monthly, "time")
+        self._yearly = _SeriesTable(yearly, "year")
+
+    @classmethod
+    def load(cls, data_type, out_dir=AGGREGATE_DIR):
+        paths = _paths(data_type, out_dir)
+        return cls(pd.read_parquet(paths["monthly"]), pd.read_parquet(paths["yearly"]))
+
+    def monthly(self, level=NATIONAL[0], name=NATIONAL[1]):
+        """Rata-rata SLA per bulan: kolom [time, sla]."""
+        return self._monthly.get(level, name)
+
+    def yearly(self, level=NATIONAL[0], name=NATIONAL[1]):
+        """Rata-rata SLA per tahun: kolom [year, sla]."""
+        return self._yearly.get(level, name)
+
+
+def status(data_type, source_path, out_dir=AGGREGATE_DIR):
+    meta = _read_meta(data_type, out_dir)
+    return {"data_type": data_type, "stale": is_stale(data_type, source_path, out_dir), "meta": meta}
+
+
+if __name__ == "__main__":
+    from functions import ingest, plotter
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    data_types = sys.argv[2:] or list(plotter.TIMESERIES_PATHS)
+
+    for data_type in data_types:
+        source_path = plotter.TIMESERIES_PATHS[data_type]
+        if command == "rebuild":
+            print(f"🔧 Membangun agregat {data_type} dari {source_path}...")
+            meta = build_aggregates(data_type, plotter.load_timeseries_data(data_type), source_path,
+                                    increments=ingest.increment_names(data_type))
+            print(f"✅ Selesai dalam {meta['build_seconds']} detik ({meta['n_source_rows']} baris sumber).")
+        elif command == "status":
+            print(json.dumps(status(data_type, source_path), indent=2))
+        else:
+            print(f"Perintah tidak dikenal: {command}. Gunakan 'rebuild' atau 'status'.")
+            sys.exit(1)
@@ -0,0 +1,181 @@
+# functions/artifact_store.py
+
+import hashlib
+import io
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+
+# =============================================================================
+# STORE ARTEFAK (FIGURE / DATAFRAME) BERBASIS HASH ISI, DIBAGI SEMUA SESI
+# =============================================================================
+#
+# Riwayat chat di st.session_state hanya menyimpan hash; figure disimpan sekali sebagai
+# JSON Plotly terkompresi zlib dan dataframe sebagai Arrow IPC (zstd). Setiap sesi
+# memegang referensi ke hash yang dipakainya. Entri tanpa referensi disimpan dalam LRU
+# terbatas byte (figure yang sama sering diminta lagi), lalu dibuang. Referensi sesi yang
+# tidak aktif lebih lama dari `session_ttl` dilepas otomatis.
+
+ARTIFACT_KINDS = ("chart", "dataframe")
+
+
+def figure_to_json(fig):
+    return fig.to_json()
+
+
+def figure_from_json(text):
+    import plotly.io as pio
+
+    return pio.from_json(text)
+
+
+def dataframe_to_arrow(df, compression=None):
+    """DataFrame -> bytes Arrow IPC stream (opsional terkompresi, mis. "zstd")."""
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df)
+    sink = io.BytesIO()
+    options = pa.ipc.IpcWriteOptions(compression=compression)
+    with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def dataframe_from_arrow(data):
+    import pyarrow as pa
+
+    return pa.ipc.open_stream(data).read_all().to_pandas()
+
+
+def encode_artifact(kind, obj):
+    """(bytes ringkas, hash isi) untuk figure atau DataFrame."""
+    if kind == "chart":
+        raw = figure_to_json(obj).encode("utf-8")
+        data = zlib.compress(raw, 6)
+    elif kind == "dataframe":
+        raw = data = dataframe_to_arrow(obj, compression="zstd")
+    else:
+        raise ValueError(f"Jenis artefak tidak dikenal: {kind}")
+    return data, hashlib.sha256(kind.encode() + b"\0" + raw).hexdigest()
+
+
+def decode_artifact(kind, data):
+    if kind == "chart":
+        return figure_from_json(zlib.decompress(data).decode("utf-8"))
+    return dataframe_from_arrow(data)
+
+
+class ArtifactStore:
+    """
+    Store artefak process-wide: hash -> (jenis, bytes), dengan reference count per sesi.
+    Thread-safe; dipakai bersama oleh semua sesi Streamlit lewat st.cache_resource.
+    """
+
+    def __init__(self, max_unreferenced_bytes=64 << 20, session_ttl=6 * 3600):
+        self.max_unreferenced_bytes = int(max_unreferenced_bytes)
+        self.session_ttl = session_ttl
+        self._entries = {}                  # hash -> (jenis, bytes)
+        self._refcounts = Counter()         # hash -> jumlah referensi semua sesi
+        self._unreferenced = OrderedDict()  # hash -> ukuran, urut LRU
+        self._unreferenced_bytes = 0
+        self._sessions = {}                 # session_id -> Counter(hash -> jumlah referensi)
+        self._last_seen = {}
+        self._lock = threading.Lock()
+        self.puts = 0
+        self.dedup_hits = 0
+        self.evictions = 0
+        self.expired_sessions = 0
+
+    def _acquire(self, session_id, key):
+        self._sessions.setdefault(session_id, Counter())[key] += 1
+        self._refcounts[key] += 1
+        if key in self._unreferenced:
+            self._unreferenced_bytes -= self._unreferenced.pop(key)
+
+    def _release(self, key, count):
+        self._refcounts[key] -= count
+        if self._refcounts[key] > 0:
+            return
+        del self._refcounts[key]
+        size = len(self._entries[key][1])
+        self._unreferenced[key] = size
+        self._unreferenced_bytes += size
+        while self._unreferenced_bytes > self.max_unreferenced_bytes and self._unreferenced:
+            old_key, old_size = self._unreferenced.popitem(last=False)
+            self._unreferenced_bytes -= old_size
+            del self._entries[old_key]
+            self.evictions += 1
+
+    def _release_session(self, session_id):
+        for key, count in self._sessions.pop(session_id, Counter()).items():
+            self._release(key, count)
+        self._last_seen.pop(session_id, None)
+
+    def _expire(self, now):
+        if self.session_ttl is None:
+            return
+        for session_id in [s for s, seen in self._last_seen.items() if now - seen > self.session_ttl]:
+            self._release_session(session_id)
+            self.expired_sessions += 1
+
+    def touch(self, session_id):
+        """Menandai sesi masih aktif dan melepas referensi sesi lain yang sudah kedaluwarsa."""
+        now = time.time()
+        with self._lock:
+            self._last_seen[session_id] = now
+            self._expire(now)
+
+    def put(self, session_id, kind, obj):
+        """Menyimpan `obj` (sekali per isi) dan menambah referensi sesi; mengembalikan hash-nya."""
+        data, key = encode_artifact(kind, obj)
+        with self._lock:
+            self.puts += 1
+            if key in self._entries:
+                self.dedup_hits += 1
+            else:
+                self._entries[key] = (kind, data)
+            self._acquire(session_id, key)
+            self._last_seen[session_id] = time.time()
+        return key
+
+    def get(self, key):
+        """Figure/DataFrame untuk `key`, atau None jika sudah dibuang."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and key in self._unreferenced:
+                self._unreferenced.move_to_end(key)
+        return None if entry is None else decode_artifact(*entry)
+
+    def release_session(self, session_id):
+        """Melepas semua referensi sesi (mis. saat percakapan baru dimulai)."""
+        with self._lock:
+            self._release_session(session_id)
+
+    def session_stats(self, session_id):
+        with self._lock:
+            refs = self._sessions.get(session_id, Counter())
+            return {
+                "artifacts": len(refs),
+                "references": sum(refs.values()),
+                "bytes": sum(len(self._entries[key][1]) for key in refs),
+            }
+
+    def stats(self):
+        with self._lock:
+            total_bytes = sum(len(data) for _, data in self._entries.values())
+            return {
+                "entries": len(self._entries),
+                "bytes": total_bytes,
+                "referenced_bytes": total_bytes - self._unreferenced_bytes,
+                "unreferenced_bytes": self._unreferenced_bytes,
+                "sessions": len(self._sessions),
+                "puts": self.puts,
+                "dedup_hits": self.dedup_hits,
+                "evictions": self.evictions,
+                "expired_sessions": self.expired_sessions,
+                "per_session_bytes": {
+                    session_id: sum(len(self._entries[key][1]) for key in refs)
+                    for session_id, refs in self._sessions.items()
+                },
+            }
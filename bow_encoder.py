@@ -0,0 +1,106 @@
+# functions/bow_encoder.py
+
+import pickle
+import threading
+import numpy as np
+import nltk
+from nltk.stem import LancasterStemmer
+
+IGNORE_WORDS = ['?', '!', '.', ',']
+
+
+def tokenize(text):
+    """
+    Tokenisasi yang sama untuk training dan serving. preserve_line=True melewati
+    sent_tokenize, sehingga data `punkt`/`punkt_tab` NLTK tidak diperlukan.
+    """
+    return nltk.word_tokenize(text, preserve_line=True)
+
+class BowEncoder:
+    """
+    Encoder bag-of-words bersama untuk model Keras (training dan serving).
+
+    Menyimpan indeks kata->posisi dan memo hasil stemming, sehingga satu pesan
+    cukup satu lookup dict per token, bukan loop token x vocabulary.
+    """
+
+    max_memo_size = 50000
+
+    def __init__(self, words, classes):
+        self.words = list(words)
+        self.classes = list(classes)
+        self.word_index = {w: i for i, w in enumerate(self.words)}
+        self._stemmer = LancasterStemmer()
+        self._stem_memo = {}
+        self._memo_lock = threading.Lock()
+
+    @classmethod
+    def from_intents(cls, intents, ignore_words=IGNORE_WORDS, preprocess=None):
+        """
+        Membangun vocabulary dan kelas dari file intents (sama seperti skrip training lama).
+        Mengembalikan (encoder, documents) dengan documents = [(teks_pattern, tag), ...].
+        """
+        stemmer = LancasterStemmer()
+        words, classes, documents = set(), set(), []
+        for intent in intents['intents']:
+            for pattern in intent['patterns']:
+                text = preprocess(pattern) if preprocess else pattern
+                words.update(stemmer.stem(w.lower()) for w in tokenize(text) if w not in ignore_words)
+                documents.append((text, intent['tag']))
+                classes.add(intent['tag'])
+        return cls(sorted(words), sorted(classes)), documents
+
+    @classmethod
+    def load(cls, words_path, classes_path):
+        with open(words_path, "rb") as f:
+            words = pickle.load(f)
+        with open(classes_path, "rb") as f:
+            classes = pickle.load(f)
+        return cls(words, classes)
+
+    def save(self, words_path, classes_path):
+        with open(words_path, "wb") as f:
+            pickle.dump(self.words, f)
+        with open(classes_path, "wb") as f:
+            pickle.dump(self.classes, f)
+
+    def stem(self, word):
+        stem = self._stem_memo.get(word)
+        if stem is None:
+            stem = self._stemmer.stem(word.lower())
+            with self._memo_lock:
+                if len(self._stem_memo) >= self.max_memo_size:
+                    self._stem_memo.clear()
+                self._stem_memo[word] = stem
+        return stem
+
+    def clean_up_sentence(self, sentence):
+        return [self.stem(w) for w in tokenize(sentence)]
+
+    def _indices(self, sentence):
+        lookup = self.word_index.get
+        return {i for i in map(lookup, self.clean_up_sentence(sentence)) if i is not None}
+
+    def encode(self, sentence):
+        """Vektor bag-of-words (float32, panjang = jumlah vocabulary) untuk satu kalimat."""
+        bag = np.zeros(len(self.words), dtype=np.float32)
+        bag[list(self._indices(sentence))] = 1.0
+        return bag
+
+    def encode_batch(self, sentences):
+        """Matriks bag-of-words (n_kalimat x vocabulary) untuk banyak kalimat sekaligus."""
+        matrix = np.zeros((len(sentences), len(self.words)), dtype=np.float32)
+        rows, cols = [], []
+        for row, sentence in enumerate(sentences):
+            idx = self._indices(sentence)
+            rows.extend([row] * len(idx))
+            cols.extend(idx)
+        matrix[rows, cols] = 1.0
+        return matrix
+
+    def encode_labels(self, tags):
+        """One-hot matriks (n x kelas) untuk daftar tag."""
+        class_index = {c: i for i, c in enumerate(self.classes)}
+        labels = np.zeros((len(tags), len(self.classes)), dtype=np.float32)
+        labels[np.arange(len(tags)), [class_index[t] for t in tags]] = 1.0
+        return labels
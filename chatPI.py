@@ -3,70 +3,36 @@ import json
 import numpy as np
 import random
 import nltk
-import tensorflow as tf
 import time
+from functions.bow_encoder import BowEncoder
+from functions.numpy_model import load_intent_model
 from gtts import gTTS
 import os
 
 nltk.download('punkt')
-from nltk.stem import LancasterStemmer
-
-# Initialize stemmer
-stemmer = LancasterStemmer()
-
 # Load dataset and model
 try:
     with open('chatbot/chatbot.json') as file:
         data = json.load(file)
 
-    model = tf.keras.models.load_model('chatbot\chatbot_PI_new.keras')
+    model = load_intent_model(os.path.join('chatbot', 'chatbot_PI_new.npz'), os.path.join('chatbot', 'chatbot_PI_new.keras'))
 except Exception as e:
     st.error(f"Error loading model: {e}")
     st.stop()  # Stop execution if the model can't be loaded
 
-# Prepare data
-words = []
-classes = []
-documents = []
-ignore_words = ['?', '!', '.', ',']
-
-for intent in data['intents']:
-    for pattern in intent['patterns']:
-        # Tokenize each word in the sentence
-        word_list = nltk.word_tokenize(pattern)
-        words.extend(word_list)
-        documents.append((word_list, intent['tag']))
-        if intent['tag'] not in classes:
-            classes.append(intent['tag'])
-
-# Stem and sort words
-words = [stemmer.stem(w.lower()) for w in words if w not in ignore_words]
-words = sorted(list(set(words)))
-
-# Sort classes
-classes = sorted(list(set(classes)))
-
-# Functions for processing and predicting
-def clean_up_sentence(sentence):
-    """Tokenizes and stems a sentence."""
-    sentence_words = nltk.word_tokenize(sentence)
-    sentence_words = [stemmer.stem(word.lower()) for word in sentence_words]
-    return sentence_words
-
-def bow(sentence, words):
-    """Returns a bag of words representation of the sentence."""
-    sentence_words = clean_up_sentence(sentence)
-    bag = [0] * len(words)
-    for s in sentence_words:
-        for i, w in enumerate(words):
-            if w == s:
-                bag[i] = 1
-    return np.array(bag)
+# Prepare vocabulary (sekali saja, dipakai ulang di setiap rerun)
+@st.cache_resource
+def load_encoder(intents):
+    encoder, _ = BowEncoder.from_intents(intents)
+    return encoder
+
+encoder = load_encoder(data)
+classes = encoder.classes
 
 def predict_class(sentence, model):
     """Predicts the class of the sentence."""
-    p = bow(sentence, words)
-    res = model.predict(np.array([p]))[0]
+    p = encoder.encode(sentence)
+    res = model.predict(p[np.newaxis, :])[0]
     ERROR_THRESHOLD = 0.25
     results = [[i, r] for i, r in enumerate(res) if r > ERROR_THRESHOLD]
     results.sort(key=lambda x: x[1], reverse=True)
@@ -5,25 +5,69 @@ import json
 import re
 import time
 import pandas as pd
+import os
 import random
-import torch
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
+import uuid
+
+# Profiler dimuat paling awal supaya import berat berikutnya ikut tercatat
+from functions import startup_profiler as profiler
+
+with profiler.timed("transformers", "module"):
+    from transformers import AutoTokenizer
 
 # Import all your function modules
-from functions import plotter, narrative, narrative_proj
+# (plotter memuat geopandas/xarray/plotly secara lazy, saat pertama dibutuhkan)
+with profiler.timed("functions.plotter + narrative", "module"):
+    from functions import plotter, narrative, narrative_proj
+from functions.intent_service import (
+    IntentBatcher, IntentCache, IntentCascade, BowIntentClassifier,
+    build_ambiguous_keys, build_exact_match_table, load_intent_runtime
+)
+from functions.bow_encoder import BowEncoder
+from functions.numpy_model import NumpyDenseModel
+from functions.result_cache import ResultCache, code_version, result_key
+from functions.artifact_store import ArtifactStore
+
+# Backend classifier: 'torch' (full precision), 'torch-int8', atau 'onnx-int8' (lihat export-transformer.py)
+INTENT_BACKEND = "torch"
+
+# Micro-batching: permintaan yang datang dalam jendela ini digabung jadi satu forward pass
+INTENT_MAX_BATCH_SIZE = 16
+INTENT_MAX_WAIT_MS = 5
+INTENT_CACHE_SIZE = 4096
+# Cascade: model bag-of-words menjawab sendiri jika confidence-nya di atas ambang ini
+CASCADE_THRESHOLD = 0.9
+CASCADE_MODEL_PATH = "chatbot_samudra_new.npz"  # hasil export-keras-npz.py
+
+# Cache hasil handle_function_call: LRU di memori (batas byte) + SQLite bersama antar worker
+RESULT_CACHE_PATH = "data/result_cache.sqlite"
+RESULT_CACHE_MEMORY_MB = 256
+RESULT_CACHE_DISK_MB = 2048
+# File kode yang menentukan isi hasil: perubahan di salah satunya membuat entri cache lama tidak terpakai
+RESULT_CODE_FILES = [plotter.__file__, narrative.__file__, narrative_proj.__file__, __file__]
+
+# Figure/dataframe riwayat chat disimpan sekali per isi; session_state hanya memegang hash-nya
+ARTIFACT_UNREFERENCED_MB = 64
+ARTIFACT_SESSION_TTL_S = 6 * 3600
+
+# Riwayat: hanya N giliran terakhir yang dirender penuh, giliran lama diringkas (bisa dibuka)
+HISTORY_FULL_TURNS = 3
 
 # =============================================================================
 # 1. ASSET LOADING (Cached for performance)
 # =============================================================================
 
 @st.cache_resource
-def load_resources(model_path="bert-samudra-model"):
+def load_resources(model_path="bert-samudra-model", backend=INTENT_BACKEND):
     """
     Loads all required assets: BERT model, tokenizer, and intents data.
+    `backend` selects the classifier runtime (see intent_service.INTENT_BACKENDS).
     This function runs only once thanks to @st.cache_resource.
     """
-    tokenizer = AutoTokenizer.from_pretrained(model_path)
-    model = AutoModelForSequenceClassification.from_pretrained(model_path)
+    with profiler.timed("tokenizer BERT"):
+        tokenizer = AutoTokenizer.from_pretrained(model_path)
+    with profiler.timed(f"model BERT ({backend})"):
+        model = load_intent_runtime(model_path, backend)
     
     with open("samudra.json", encoding="utf-8") as f:
         intents = json.load(f)
@@ -32,27 +76,76 @@ def load_resources(model_path="bert-samudra-model"):
         label_map = json.load(f)
         # We need a mapping from ID to Label (tag) for prediction output
         id2label = {v: k for k, v in label_map.items()}
+
+    # Pesan yang sama persis dengan pattern training langsung dijawab tanpa model
+    intent_cache = IntentCache(
+        build_exact_match_table(intents, label_map),
+        maxsize=INTENT_CACHE_SIZE,
+        uncached_keys=build_ambiguous_keys(intents, label_map),
+    )
         
-    return tokenizer, model, intents, id2label
+    return tokenizer, model, intents, id2label, intent_cache
+
+@st.cache_resource
+def load_intent_batcher(_tokenizer, _model, id2label, max_batch_size=INTENT_MAX_BATCH_SIZE, max_wait_ms=INTENT_MAX_WAIT_MS):
+    """
+    Creates the process-wide inference queue shared by all Streamlit sessions.
+    """
+    return IntentBatcher(_tokenizer, _model, id2label, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+
+@st.cache_resource
+def load_intent_cascade(_batcher, id2label, threshold=CASCADE_THRESHOLD):
+    """
+    Builds the classifier cascade: the bag-of-words model (chatbot_samudra_new)
+    answers confident messages, everything else escalates to BERT.
+    Falls back to BERT only when the npz export is missing or the bag-of-words
+    classes are not a subset of BERT's labels (model trained on an old samudra.json).
+    """
+    bert_tags = set(id2label.values())
+    if not os.path.exists(CASCADE_MODEL_PATH):
+        reason = f"{CASCADE_MODEL_PATH} tidak ditemukan (jalankan export-keras-npz.py)"
+        return IntentCascade(None, _batcher.predict, threshold=threshold, disabled_reason=reason)
+
+    with profiler.timed("model bag-of-words (npz)"):
+        encoder = BowEncoder.load("words-samudraAI_new.pkl", "classes-samudraAI_new.pkl")
+        unknown = sorted(set(encoder.classes) - bert_tags)
+        if unknown:
+            reason = f"kelas bag-of-words tidak ada di label_map.json: {unknown} (latih ulang train-chatbot-samudra.py)"
+            return IntentCascade(None, _batcher.predict, threshold=threshold, disabled_reason=reason)
+        cheap = BowIntentClassifier(encoder, NumpyDenseModel.load(CASCADE_MODEL_PATH))
+    return IntentCascade(cheap.predict, _batcher.predict, threshold=threshold, allowed_tags=bert_tags)
+
+@st.cache_resource
+def load_result_cache(path=RESULT_CACHE_PATH, memory_mb=RESULT_CACHE_MEMORY_MB, disk_mb=RESULT_CACHE_DISK_MB):
+    """
+    Creates the process-wide result cache shared by all Streamlit sessions.
+    The SQLite tier survives restarts and is shared between worker processes.
+    """
+    return ResultCache(path, max_memory_bytes=memory_mb << 20, max_disk_bytes=disk_mb << 20)
+
+@st.cache_resource
+def load_artifact_store(unreferenced_mb=ARTIFACT_UNREFERENCED_MB, session_ttl=ARTIFACT_SESSION_TTL_S):
+    """
+    Creates the process-wide content-addressed store for chart/dataframe history.
+    """
+    return ArtifactStore(max_unreferenced_bytes=unreferenced_mb << 20, session_ttl=session_ttl)
 
 # =============================================================================
 # 2. CORE LOGIC FUNCTIONS
 # =============================================================================
 
-def predict_intent(text, tokenizer, model, id2label):
+def predict_intent(text, cascade, cache):
     """
-    Predicts the intent (tag) from input text using the BERT model.
+    Predicts the intent (tag) from input text.
+    Repeated (normalized) messages are answered from the cache; misses go
+    through the cascade (bag-of-words model first, BERT only when unsure).
+    A BERT batch that times out under load returns confidence 0, so the
+    caller shows the normal low-confidence fallback reply.
     """
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True, max_length=512)
-    with torch.no_grad():
-        logits = model(**inputs).logits
-    
-    predicted_class_id = logits.argmax().item()
-    confidence = torch.softmax(logits, dim=1)[0][predicted_class_id].item()
-    
-    tag = id2label.get(predicted_class_id, "fallback") # Use .get for safety
-    
-    return tag, confidence
+    try:
+        return cache.get_or_predict(text, cascade.predict)
+    except TimeoutError:
+        return None, 0.0
 
 def extract_entities(text):
     """
@@ -96,6 +189,53 @@ def extract_entities(text):
             
     return entities
 
+def resolve_entities(entities, data_type):
+    """
+    Mencocokkan nama wilayah hasil regex ke nama kanonik di data (toleran typo,
+    kata tambahan, dan spasi). Level induk diselesaikan lebih dulu agar bisa
+    mempersempit nama yang sama di beberapa lokasi. Untuk nama yang dipakai di
+    beberapa induk, hierarki terpilih disimpan di entities["parents"] (sejajar
+    dengan nama di level terdalam) agar plotter hanya mengambil wilayah tersebut.
+    Mengembalikan (entities_baru, pesan_peringatan_atau_None).
+    """
+    if not any(level in entities for level in ["provinsi", "kabupaten", "kecamatan", "desa"]):
+        return entities, None  # peta/nasional/ranking: gazetteer tidak perlu dimuat
+
+    gazetteer = plotter.load_gazetteer(data_type)
+    resolved = dict(entities)
+    parents = {}
+
+    for level in ["provinsi", "kabupaten", "kecamatan", "desa"]:
+        if level not in entities:
+            continue
+        names, level_parents = [], []
+        for raw in entities[level]:
+            match = gazetteer.resolve(level, raw, parents=parents)
+            if match["name"] is None or not match["matches"]:
+                names.append(raw)  # biarkan plotter yang melaporkan data tidak ditemukan
+                level_parents.append(None)
+                continue
+            if match["ambiguous"]:
+                lokasi = "; ".join(
+                    ", ".join(f"{k.title()} {v.title()}" for k, v in m.items()) for m in match["matches"][:5]
+                )
+                return entities, (
+                    f"Nama {level} **{match['name'].title()}** ditemukan di beberapa lokasi: {lokasi}. "
+                    f"Mohon sebutkan juga kabupaten atau provinsinya."
+                )
+            names.append(match["name"])
+            shared = len(gazetteer.hierarchies(level, match["name"])) > 1
+            level_parents.append(match["matches"][0] if shared else None)
+        resolved[level] = names
+        if any(level_parents):
+            resolved["parents"] = level_parents
+        else:
+            resolved.pop("parents", None)
+        if len(names) == 1:
+            parents[level] = names[0]
+
+    return resolved, None
+
 # def handle_function_call(tag, function_name, user_input, entities):
 #     is_projection = "proyeksi" in tag
 #     narrator = narrative_proj if is_projection else narrative
@@ -173,80 +313,100 @@ def extract_entities(text):
 
 # GANTI SELURUH FUNGSI ANDA DENGAN VERSI FINAL DAN LENGKAP INI
 
-def handle_function_call(tag, function_name, user_input, entities):
+def handle_function_call(tag, function_name, user_input, entities, cache):
+    """
+    Handler pusat: entitas diselesaikan ke nama kanonik, lalu hasil (figure, dataframe,
+    narasi) diambil dari `cache` atau dihitung oleh compute_function_call.
+    Kunci cache: fungsi, tag, entitas kanonik, teks (hanya ranking yang membacanya), versi data.
+    """
+    is_projection = "proyeksi" in tag
+    try:
+        entities, ambiguity_warning = resolve_entities(entities, "proyeksi" if is_projection else "observasi")
+        if ambiguity_warning:
+            return {"warning": ambiguity_warning}
+
+        version = f"{code_version(RESULT_CODE_FILES)}|{plotter.data_version()}"
+        key = result_key(function_name, tag, entities, version, text=user_input if "ranking" in tag else None)
+        return cache.get_or_compute(
+            key, version, lambda: compute_function_call(tag, function_name, user_input, entities)
+        )
+
+    except Exception as e:
+        import traceback
+        st.error(f"Terjadi kesalahan saat memproses '{function_name}': {e}")
+        st.error(traceback.format_exc())
+        return {"warning": "Maaf, terjadi kesalahan teknis saat membuat visualisasi."}
+
+def compute_function_call(tag, function_name, user_input, entities):
     """
-    Handler pusat dengan alur logika yang sudah diperbaiki, bersih, dan terstruktur.
+    Menjalankan plotter + narator untuk entitas yang sudah diselesaikan.
     Pola: Kategorikan -> Siapkan Argumen -> Jalankan -> Proses Hasil.
     """
     is_projection = "proyeksi" in tag
     narrator = narrative_proj if is_projection else narrative
-    
+
     narrator_args = entities.copy()
     for key, value in narrator_args.items():
         if isinstance(value, list) and len(value) == 1:
             narrator_args[key] = value[0]
     narrator_args['user_input'] = user_input
     
-    try:
-        plotter_func = getattr(plotter, function_name)
+    plotter_func = getattr(plotter, function_name)
+    
+    # --- KATEGORI 1: PERBANDINGAN ---
+    if "bandingkan" in tag:
+        entity_type = "desa" if "desa" in tag else "provinsi"
+        items = entities.get(entity_type, [])
+        if len(items) < 2: return {"warning": f"Harap sebutkan dua nama {entity_type} untuk dibandingkan."}
+        item1, item2 = items[:2]
         
-        # --- KATEGORI 1: PERBANDINGAN ---
-        if "bandingkan" in tag:
-            entity_type = "desa" if "desa" in tag else "provinsi"
-            items = entities.get(entity_type, [])
-            if len(items) < 2: return {"warning": f"Harap sebutkan dua nama {entity_type} untuk dibandingkan."}
-            item1, item2 = items[:2]
-            
-            plotter_args = {"desa1": item1, "desa2": item2} if entity_type == "desa" else {"provinsi1": item1, "provinsi2": item2}
-            fig, df = plotter_func(**plotter_args, return_df=True)
-            narrator_args.update(plotter_args)
-
-        # --- KATEGORI 2: RANKING (Punya alur & pemanggilan khusus) ---
-        elif "ranking" in tag:
-            # Panggilan fungsi ranking TIDAK menggunakan return_df
-            df_rank = plotter_func(user_input) 
-            if df_rank is None or df_rank.empty: return {"warning": "Data untuk ranking tidak ditemukan."}
-            
-            narrator_args['df'] = df_rank
-            narration_text = narrator.generate_narrative(tag, **narrator_args)
-            return {"dataframe": df_rank, "narration": narration_text}
-
-        # --- KATEGORI 3: PETA ---
-        elif "peta" in tag:
-            if 'tahun' in tag:
-                tahun = narrator_args.get('tahun')
-                if not tahun: return {"warning": "Mohon sebutkan tahun untuk menampilkan peta."}
-                fig, r_max, r_min, p_max, p_min = plotter_func(int(tahun), return_regions=True)
-            else: # Peta tren nasional
-                fig, r_max, r_min, p_max, p_min = plotter_func(return_regions=True)
-            
-            if fig is None: return {"warning": "Data untuk membuat peta tidak ditemukan."}
-            narrator_args.update({'region_max': r_max, 'region_min': r_min, 'prov_max': p_max, 'prov_min': p_min})
-            narration_text = narrator.generate_narrative(tag, **narrator_args)
-            return {"figure": fig, "narration": narration_text}
-
-        # --- KATEGORI 4 & 5: SEMUA PLOT LAINNYA ---
-        else:
-            plotter_args = {key: val for key, val in narrator_args.items() if key in plotter_func.__code__.co_varnames}
-            result_tuple = plotter_func(**plotter_args, return_df=True)
-            
-            if not result_tuple or result_tuple[0] is None:
-                return {"warning": "Maaf, data tidak ditemukan untuk permintaan Anda."}
-
-            fig, df = result_tuple[0], result_tuple[1]
-            if len(result_tuple) > 2: narrator_args['trend'] = result_tuple[2]
+        plotter_args = {"desa1": item1, "desa2": item2} if entity_type == "desa" else {"provinsi1": item1, "provinsi2": item2}
+        fig, df = plotter_func(**plotter_args, return_df=True, parents=entities.get("parents", [None, None])[:2])
+        narrator_args.update(plotter_args)
+
+    # --- KATEGORI 2: RANKING (Punya alur & pemanggilan khusus) ---
+    elif "ranking" in tag:
+        # Panggilan fungsi ranking TIDAK menggunakan return_df
+        df_rank = plotter_func(user_input) 
+        if df_rank is None or df_rank.empty: return {"warning": "Data untuk ranking tidak ditemukan."}
         
-        # --- Proses Hasil dan Narasi (Untuk semua kasus yang belum return) ---
-        narrator_args['df'] = df
+        narrator_args['df'] = df_rank
+        # Arah urutan dan filter provinsi/tahun agar narasi sesuai isi tabel
+        level = function_name.rsplit("_", 1)[1]
+        narrator_args.update(plotter.ranking_context("proyeksi" if is_projection else "observasi", level, user_input))
         narration_text = narrator.generate_narrative(tag, **narrator_args)
+        return {"dataframe": df_rank, "narration": narration_text}
+
+    # --- KATEGORI 3: PETA ---
+    elif "peta" in tag:
+        if 'tahun' in tag:
+            tahun = narrator_args.get('tahun')
+            if not tahun: return {"warning": "Mohon sebutkan tahun untuk menampilkan peta."}
+            fig, r_max, r_min, p_max, p_min = plotter_func(int(tahun), return_regions=True)
+        else: # Peta tren nasional
+            fig, r_max, r_min, p_max, p_min = plotter_func(return_regions=True)
         
+        if fig is None: return {"warning": "Data untuk membuat peta tidak ditemukan."}
+        narrator_args.update({'region_max': r_max, 'region_min': r_min, 'prov_max': p_max, 'prov_min': p_min})
+        narration_text = narrator.generate_narrative(tag, **narrator_args)
         return {"figure": fig, "narration": narration_text}
 
-    except Exception as e:
-        import traceback
-        st.error(f"Terjadi kesalahan saat memproses '{function_name}': {e}")
-        st.error(traceback.format_exc())
-        return {"warning": "Maaf, terjadi kesalahan teknis saat membuat visualisasi."}
+    # --- KATEGORI 4 & 5: SEMUA PLOT LAINNYA ---
+    else:
+        plotter_args = {key: val for key, val in narrator_args.items() if key in plotter_func.__code__.co_varnames}
+        result_tuple = plotter_func(**plotter_args, return_df=True)
+        
+        if not result_tuple or result_tuple[0] is None:
+            return {"warning": "Maaf, data tidak ditemukan untuk permintaan Anda."}
+
+        fig, df = result_tuple[0], result_tuple[1]
+        if len(result_tuple) > 2: narrator_args['trend'] = result_tuple[2]
+    
+    # --- Proses Hasil dan Narasi (Untuk semua kasus yang belum return) ---
+    narrator_args['df'] = df
+    narration_text = narrator.generate_narrative(tag, **narrator_args)
+    
+    return {"figure": fig, "narration": narration_text}
 
 def stream_response(text, delay=0.02):
     """Displays response text with a typing effect."""
@@ -255,12 +415,68 @@ def stream_response(text, delay=0.02):
         yield word + " "
         time.sleep(delay)
 
+def group_turns(messages):
+    """Groups messages into turns: a user message followed by the assistant replies to it."""
+    turns = []
+    for msg in messages:
+        if msg["role"] == "user" or not turns:
+            turns.append([])
+        turns[-1].append(msg)
+    return turns
+
+def render_message(msg):
+    """Renders one history message; charts and tables are fetched from the artifact store by hash."""
+    with st.chat_message(msg["role"]):
+        if msg["type"] == "text":
+            st.markdown(msg["content"])
+        elif msg["type"] in ("chart", "dataframe"):
+            content = artifact_store.get(msg["ref"])
+            if content is None:
+                st.caption("Visualisasi ini sudah tidak tersedia. Silakan ajukan pertanyaannya kembali.")
+            elif msg["type"] == "chart":
+                st.plotly_chart(content, use_container_width=True)
+            else:
+                st.dataframe(content, hide_index=True, use_container_width=True)
+
+def turn_summary(turn):
+    """One-line label for a collapsed turn: the question plus how many charts/tables it produced."""
+    question = next((m["content"] for m in turn if m["role"] == "user"), "Percakapan")
+    question = question if len(question) <= 70 else question[:67] + "..."
+    counts = {"chart": "grafik", "dataframe": "tabel"}
+    details = [f"{n} {label}" for kind, label in counts.items() if (n := sum(m["type"] == kind for m in turn))]
+    return f"💬 {question}" + (f" ({', '.join(details)})" if details else "")
+
+@st.fragment
+def render_collapsed_turn(index, turn):
+    """
+    Older turn shown as a one-line summary. Opening it reruns only this fragment,
+    so the charts of a single turn are rendered without touching the rest of the page.
+    """
+    if st.toggle(turn_summary(turn), key=f"history_turn_{index}"):
+        for msg in turn:
+            render_message(msg)
+
+def render_history(messages, full_turns=HISTORY_FULL_TURNS):
+    """Renders the last `full_turns` turns in full and collapses everything older."""
+    turns = group_turns(messages)
+    cutoff = max(len(turns) - full_turns, 0)
+    for index, turn in enumerate(turns):
+        if index < cutoff:
+            render_collapsed_turn(index, turn)
+        else:
+            for msg in turn:
+                render_message(msg)
+
 # =============================================================================
 # 3. STREAMLIT USER INTERFACE
 # =============================================================================
 
 # Load resources once at the start
-tokenizer, model, intents, id2label = load_resources()
+tokenizer, model, intents, id2label, intent_cache = load_resources()
+intent_batcher = load_intent_batcher(tokenizer, model, id2label)
+intent_cascade = load_intent_cascade(intent_batcher, id2label)
+result_cache = load_result_cache()
+artifact_store = load_artifact_store()
 
 st.title("🤖 Chatbot SAMUDRA-AI 🌊")
 st.markdown("Tanyakan apa saja tentang tinggi muka laut (TML), proyeksi, atau kondisi per wilayah!")
@@ -268,29 +484,42 @@ st.markdown("Tanyakan apa saja tentang tinggi muka laut (TML), proyeksi, atau ko
 # Initialize chat history
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+artifact_store.touch(st.session_state.session_id)
 
 # Sidebar for controls
 with st.sidebar:
     st.header("Kontrol")
     if st.button("🪑 Mulai Percakapan Baru"):
+        artifact_store.release_session(st.session_state.session_id)
         st.session_state.messages = []
+        for key in [k for k in st.session_state if str(k).startswith("history_turn_")]:
+            del st.session_state[key]
         st.rerun()
 
-# Display chat history from session_state
-for msg in st.session_state.messages:
-    with st.chat_message(msg["role"]):
-        # Render content based on its type
-        if msg["type"] == "text":
-            st.markdown(msg["content"])
-        elif msg["type"] == "chart":
-            # Plotly charts are JSON serializable and can be stored in session state
-            st.plotly_chart(msg["content"], use_container_width=True)
-        elif msg["type"] == "dataframe":
-            # DataFrames can also be stored directly
-            st.dataframe(msg["content"], hide_index=True, use_container_width=True)
-
-# Main chat input
-if user_input := st.chat_input("Contoh: tren tml desa siomeda"):
+    with st.expander("Statistik Inferensi"):
+        st.json({"cache": intent_cache.stats(), "cascade": intent_cascade.stats(), "batcher": intent_batcher.stats()})
+
+    with st.expander("Statistik Cache Hasil"):
+        st.json(result_cache.stats())
+
+    with st.expander("Memori Riwayat Chat"):
+        st.json({"sesi_ini": artifact_store.session_stats(st.session_state.session_id), "total": artifact_store.stats()})
+
+    with st.expander("Profil Startup"):
+        st.json(profiler.report())
+
+    with st.expander("Waktu Render Peta"):
+        st.json(plotter.map_render_report())
+
+# Display chat history from session_state (windowed: older turns are collapsed). Messages
+# added later by the chat fragment are shown by the fragment itself until the next full rerun.
+st.session_state.rendered_upto = len(st.session_state.messages)
+render_history(st.session_state.messages)
+
+def respond(user_input):
+    """Answers one message and appends the exchange to the session history."""
     # Add and display user message
     st.session_state.messages.append({"role": "user", "type": "text", "content": user_input})
     with st.chat_message("user"):
@@ -298,7 +527,7 @@ if user_input := st.chat_input("Contoh: tren tml desa siomeda"):
 
     # Process and display assistant response
     with st.chat_message("assistant"):
-        tag, confidence = predict_intent(user_input, tokenizer, model, id2label)
+        tag, confidence = predict_intent(user_input, intent_cascade, intent_cache)
 
         if confidence > 0.6:
             response_found = False
@@ -321,7 +550,7 @@ if user_input := st.chat_input("Contoh: tren tml desa siomeda"):
                         progress_bar.progress(33, text=progress_text)
                         time.sleep(0.5) # Jeda kecil untuk efek visual
 
-                        result = handle_function_call(tag, function_name, user_input, entities)
+                        result = handle_function_call(tag, function_name, user_input, entities, result_cache)
                         progress_bar.progress(66, text=progress_text)
                         time.sleep(0.5) # Jeda kecil untuk efek visual
                         
@@ -333,10 +562,12 @@ if user_input := st.chat_input("Contoh: tren tml desa siomeda"):
                             st.warning(result["warning"])
                         if "figure" in result:
                             st.plotly_chart(result["figure"], use_container_width=True)
-                            st.session_state.messages.append({"role": "assistant", "type": "chart", "content": result["figure"]})
+                            ref = artifact_store.put(st.session_state.session_id, "chart", result["figure"])
+                            st.session_state.messages.append({"role": "assistant", "type": "chart", "ref": ref})
                         if "dataframe" in result:
                             st.dataframe(result["dataframe"], hide_index=True, use_container_width=True)
-                            st.session_state.messages.append({"role": "assistant", "type": "dataframe", "content": result["dataframe"]})
+                            ref = artifact_store.put(st.session_state.session_id, "dataframe", result["dataframe"])
+                            st.session_state.messages.append({"role": "assistant", "type": "dataframe", "ref": ref})
                         if "narration" in result:
                             st.info(result["narration"])
                             st.session_state.messages.append({"role": "assistant", "type": "text", "content": result["narration"]})
@@ -354,4 +585,24 @@ if user_input := st.chat_input("Contoh: tren tml desa siomeda"):
             # Fallback response for low confidence
             fallback_text = f"Maaf, saya kurang yakin memahami maksud Anda (keyakinan: {confidence:.0%}). Mohon coba tanyakan dengan lebih spesifik, misalnya 'tren tml nasional' atau 'bandingkan provinsi jawa timur dan jawa barat'."
             st.warning(fallback_text)
-            st.session_state.messages.append({"role": "assistant", "type": "text", "content": fallback_text})
\ No newline at end of file
+            st.session_state.messages.append({"role": "assistant", "type": "text", "content": fallback_text})
+
+@st.fragment
+def chat_area():
+    """
+    New-message area as a fragment: sending a message reruns only this part, not the
+    history above it. The input is written into st.bottom so it stays pinned to the
+    bottom of the page. Once the fragment holds more than HISTORY_FULL_TURNS turns,
+    one full rerun moves them into the windowed history.
+    """
+    for msg in st.session_state.messages[st.session_state.rendered_upto:]:
+        render_message(msg)
+
+    with st.bottom:
+        user_input = st.chat_input("Contoh: tren tml desa siomeda")
+    if user_input:
+        respond(user_input)
+        if len(group_turns(st.session_state.messages[st.session_state.rendered_upto:])) > HISTORY_FULL_TURNS:
+            st.rerun()
+
+chat_area()
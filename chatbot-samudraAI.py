@@ -1,13 +1,11 @@
 import streamlit as st
 import random
 import json
-import pickle
 import numpy as np
-import nltk
 # import nltk_downloader
-from nltk.stem import LancasterStemmer
-from tensorflow.keras.models import load_model
 from functions import sla_plotter
+from functions.bow_encoder import BowEncoder
+from functions.numpy_model import load_intent_model
 from functions import narrative  # pada folder functions yg sama dengan sla_plotter
 import re
 import time
@@ -18,30 +16,15 @@ import time
 st.title("🤖 Chatbot SAMUDRA-AI 🌊")
 st.markdown("Tanyakan apa saja tentang tinggi muka laut (TML), proyeksi, atau kondisi per desa!")
 
-stemmer = LancasterStemmer()
-
 # Load resources
 with open("samudra.json") as f:
     intents = json.load(f)
 
-words = pickle.load(open("words-samudraAI_new.pkl", "rb"))
-classes = pickle.load(open("classes-samudraAI_new.pkl", "rb"))
-model = load_model("chatbot_samudra_new.keras")
+encoder = BowEncoder.load("words-samudraAI_new.pkl", "classes-samudraAI_new.pkl")
+classes = encoder.classes
+model = load_intent_model("chatbot_samudra_new.npz", "chatbot_samudra_new.keras")  # .npz dari export-keras-npz.py
 
 # Utility functions
-def clean_up_sentence(sentence):
-    sentence_words = nltk.word_tokenize(sentence)
-    sentence_words = [stemmer.stem(word.lower()) for word in sentence_words]
-    return sentence_words
-
-def bow(sentence, words):
-    sentence_words = clean_up_sentence(sentence)
-    bag = [0] * len(words)
-    for s in sentence_words:
-        for i, w in enumerate(words):
-            if w == s:
-                bag[i] = 1
-    return np.array(bag)
 
 def stream_response(text, delay=0.03):
     for word in text.split():
@@ -75,8 +58,8 @@ if user_input:
         st.markdown(user_input)
 
     with st.chat_message("assistant"):
-        input_bow = bow(user_input, words)
-        res = model.predict(np.array([input_bow]))[0]
+        input_bow = encoder.encode(user_input)
+        res = model.predict(input_bow[np.newaxis, :])[0]
         idx = np.argmax(res)
         tag = classes[idx]
 
@@ -47,92 +47,158 @@
 # final_df.to_csv("hasil_sla_proj.csv", index=False)
 # print("✅ Berhasil disimpan.")
 
+import hashlib
+import os
+import time
 import geopandas as gpd
 import xarray as xr
 import pandas as pd
-from shapely.geometry import Point
+import pyarrow as pa
+import pyarrow.parquet as pq
 import numpy as np
+from regrid import load_regridder
+
+ADMIN_FILE = "chatbot/38_prov_indo_kab.json"
+NC_FILE = "chatbot/data/predicted_ssh_monthly_1993-2014_9_canesm5_ssp245_2025-01-16_2100-12-16_indo.nc"
+OUTPUT_FILE = "chatbot/data/canesm5_tml_proj245_by_wilayah.parquet"
+GRID_ADMIN_DIR = "chatbot/data/grid_admin"  # cache tabel sel grid -> wilayah admin
+REGRID_DIR = "chatbot/data/regrid"  # cache matriks bobot luas wilayah x sel grid
+# "wilayah": rata-rata berbobot luas per desa (matriks sparse, satu baris per desa per waktu)
+# "titik"  : nilai sel grid yang jatuh di dalam poligon (satu baris per titik per waktu)
+EXTRACT_MODE = "wilayah"
+TIME_CHUNK = 24  # jumlah timestamp yang dibaca & ditulis per chunk (batas memori)
+cols_admin = ["WADMPR", "WADMKK", "WADMKC", "WADMKD"]
 
-# 1. Load GeoJSON batas admin
-gdf = gpd.read_file("chatbot/38_prov_indo_kab.json")
 
-# 2. Load dataset NetCDF laut
-ds = xr.open_dataset("chatbot/data/predicted_ssh_monthly_1993-2014_9_canesm5_ssp245_2025-01-16_2100-12-16_indo.nc")
+def grid_admin_key(lat, lon, admin_file):
+    """Kunci cache: hash koordinat grid + isi file batas admin."""
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(lat, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(lon, dtype=np.float64).tobytes())
+    with open(admin_file, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def build_grid_admin_table(lat, lon, admin_file):
+    """
+    Tabel sel grid -> (lat_idx, lon_idx, lat, lon, WADMPR, WADMKK, WADMKC, WADMKD).
+    Titik dibuat sekaligus dengan points_from_xy; indeks grid ikut dari meshgrid,
+    jadi tidak perlu mencari indeks terdekat per baris.
+    """
+    gdf = gpd.read_file(admin_file)
+    lat_idx, lon_idx = np.indices((len(lat), len(lon)))
+    lat_idx, lon_idx = lat_idx.ravel(), lon_idx.ravel()
+    gdf_points = gpd.GeoDataFrame(
+        {"lat_idx": lat_idx, "lon_idx": lon_idx, "lat": lat[lat_idx], "lon": lon[lon_idx]},
+        geometry=gpd.points_from_xy(lon[lon_idx], lat[lat_idx]),
+        crs=gdf.crs,
+    )
+    joined = gpd.sjoin(gdf_points, gdf, how="inner", predicate="intersects")
+    table = joined[["lat_idx", "lon_idx", "lat", "lon", *cols_admin]].reset_index(drop=True)
+    return table.astype({"lat_idx": np.int32, "lon_idx": np.int32})
+
+
+def load_grid_admin_table(lat, lon, admin_file, cache_dir=GRID_ADMIN_DIR):
+    """Tabel sel grid -> admin dari cache; dibangun sekali per kombinasi grid + file admin."""
+    path = os.path.join(cache_dir, f"grid_admin_{grid_admin_key(lat, lon, admin_file)}.parquet")
+    if os.path.exists(path):
+        print(f"♻️ Memakai tabel grid->admin dari cache: {path}")
+        return pd.read_parquet(path)
+
+    print("🔗 Membangun tabel grid->admin (spatial join)...")
+    started = time.perf_counter()
+    table = build_grid_admin_table(lat, lon, admin_file)
+    os.makedirs(cache_dir, exist_ok=True)
+    table.to_parquet(path, index=False)
+    print(f"✅ {len(table)} sel valid dalam {time.perf_counter() - started:.1f} detik, disimpan ke {path}")
+    return table
+
+
+# 1. Load dataset NetCDF laut
+ds = xr.open_dataset(NC_FILE)
 lat = ds.latitude.values
 lon = ds.longitude.values
 sla = ds.zos  # (time, lat, lon)
 
-# 3. Buat daftar titik (lat, lon)
-points = [Point(x, y) for y in lat for x in lon]
-df_points = pd.DataFrame(points, columns=["geometry"])
-df_points["lon"] = df_points.geometry.apply(lambda p: p.x)
-df_points["lat"] = df_points.geometry.apply(lambda p: p.y)
-
-gdf_points = gpd.GeoDataFrame(df_points, geometry="geometry", crs=gdf.crs)
-
-# 4. Spatial Join: cari titik laut yang masuk ke polygon wilayah
-joined = gpd.sjoin(gdf_points, gdf, how="inner", predicate="intersects")
-
-# 5. Simpan titik valid
-cols_admin = ["WADMPR", "WADMKK", "WADMKC", "WADMKD"]
-joined[["lon", "lat", *cols_admin]].to_csv("titik_valid_dengan_admin.csv", index=False)
-
-# 6. Load kembali titik valid
-valid_points = pd.read_csv("titik_valid_dengan_admin.csv")
-
-lat_vals = ds.latitude.values
-lon_vals = ds.longitude.values
-
-valid_points["lat_idx"] = valid_points["lat"].apply(lambda x: np.abs(lat_vals - x).argmin())
-valid_points["lon_idx"] = valid_points["lon"].apply(lambda x: np.abs(lon_vals - x).argmin())
-
-# Ubah ke NumPy array untuk loop lebih cepat (opsional)
-lat_idxs = valid_points["lat_idx"].values.astype(int)
-lon_idxs = valid_points["lon_idx"].values.astype(int)
-lats = valid_points["lat"].values
-lons = valid_points["lon"].values
-prov = valid_points["WADMPR"].values
-kab = valid_points["WADMKK"].values
-kec = valid_points["WADMKC"].values
-des = valid_points["WADMKD"].values
-
-# 7. Ambil waktu NetCDF (langsung, karena sudah dalam datetime64)
+# 2. Pemetaan grid -> wilayah (dipakai ulang untuk setiap NetCDF dengan grid yang sama)
+admin_cols = {"provinsi": "WADMPR", "kabupaten": "WADMKK", "kecamatan": "WADMKC", "desa": "WADMKD"}
+if EXTRACT_MODE == "wilayah":
+    started = time.perf_counter()
+    regridder = load_regridder(ADMIN_FILE, lat, lon, REGRID_DIR)
+    print(f"🧮 Matriks bobot {regridder.weights.shape}, {regridder.weights.nnz} sel beririsan "
+          f"({time.perf_counter() - started:.1f} detik)")
+    valid_points = regridder.regions.rename(columns=admin_cols)
+else:
+    valid_points = load_grid_admin_table(lat, lon, ADMIN_FILE)
+
+# Kolom admin di-encode sekali menjadi (kode, kamus); per chunk cukup ambil kodenya
+admin_codes, admin_dicts = {}, {}
+for col, src in admin_cols.items():
+    codes, uniques = pd.factorize(valid_points[src])  # NaN -> kode -1 (tetap null di parquet)
+    admin_codes[col] = codes.astype(np.int32)
+    admin_dicts[col] = pa.array(uniques.astype(str), type=pa.string())
+
+# 3. Ambil waktu NetCDF (langsung, karena sudah dalam datetime64)
 # time_values = pd.to_datetime(ds.time.values) # buka utk data reanalysis / obs
 time_values = ds.time.to_index()
-
-# 8. Loop ekstraksi
-results = []
+if not isinstance(time_values, pd.DatetimeIndex):  # kalender cftime (noleap, 360_day) pada CMIP6
+    time_values = pd.to_datetime(time_values.astype(str))
+time_array = time_values.values.astype("datetime64[ns]")
+
+point_fields = [("latitude", pa.float64()), ("longitude", pa.float64())] if EXTRACT_MODE == "titik" else []
+schema = pa.schema([
+    ("time", pa.timestamp("ns")),
+    *point_fields,
+    ("sla", pa.from_numpy_dtype(sla.dtype)),
+    ("provinsi", pa.string()),
+    ("kabupaten", pa.string()),
+    ("kecamatan", pa.string()),
+    ("desa", pa.string()),
+])
+
+
+def extract_block(t0, t1):
+    """Nilai (waktu, baris_output) untuk satu chunk: rata-rata wilayah (W @ field) atau nilai per titik."""
+    if EXTRACT_MODE == "wilayah":
+        return regridder.means_chunk(sla[t0:t1].values).astype(sla.dtype)
+    return sla[t0:t1].values[:, valid_points["lat_idx"].values, valid_points["lon_idx"].values]
+
+
+# 4. Ekstraksi per chunk waktu: blok (waktu, baris_output) -> mask NaN -> tulis parquet
 missing_counter, valid_counter = 0, 0
-
-for t, timestamp in enumerate(time_values):
-    sla_t = sla[t].values
-    for i in range(len(lat_idxs)):
-        sla_val = sla_t[lat_idxs[i], lon_idxs[i]]
-        if np.isnan(sla_val):
-            missing_counter += 1
-            continue
-
-        valid_counter += 1
-        results.append({
-            "time": timestamp,
-            "latitude": lats[i],
-            "longitude": lons[i],
-            "sla": sla_val,
-            "provinsi": prov[i],
-            "kabupaten": kab[i],
-            "kecamatan": kec[i],
-            "desa": des[i]
-        })
-
-# 9. Output
+started = time.perf_counter()
+
+with pq.ParquetWriter(OUTPUT_FILE, schema, compression="zstd") as writer:
+    for t0 in range(0, len(time_array), TIME_CHUNK):
+        t1 = min(t0 + TIME_CHUNK, len(time_array))
+        block = extract_block(t0, t1)  # (waktu, wilayah/titik)
+        valid = ~np.isnan(block)
+        t_idx, p_idx = np.nonzero(valid)  # urutan sama dengan loop lama: waktu, lalu titik
+
+        columns = {"time": pa.array(time_array[t0:t1][t_idx], type=pa.timestamp("ns"))}
+        if EXTRACT_MODE == "titik":
+            columns["latitude"] = pa.array(valid_points["lat"].values[p_idx].astype(np.float64))
+            columns["longitude"] = pa.array(valid_points["lon"].values[p_idx].astype(np.float64))
+        columns["sla"] = pa.array(block[t_idx, p_idx])
+        for col in admin_cols:
+            codes = admin_codes[col][p_idx]
+            indices = pa.array(codes, type=pa.int32(), mask=codes < 0)
+            columns[col] = pa.DictionaryArray.from_arrays(indices, admin_dicts[col]).dictionary_decode()
+        writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+
+        valid_counter += len(t_idx)
+        missing_counter += valid.size - len(t_idx)
+        elapsed = time.perf_counter() - started
+        print(f"⏱️ {t1}/{len(time_array)} timestamp, {valid_counter} baris, {valid_counter / elapsed:,.0f} baris/detik")
+
+# 5. Output
+elapsed = time.perf_counter() - started
 print("📌 ATTRS TIME:", ds.time.attrs)
 print("📌 First raw TIME value:", ds.time.values[0])
 print("🕓 Waktu awal:", time_values[0])
 print("🕓 Waktu akhir:", time_values[-1])
-print(f"✅ Total data ditulis: {valid_counter}")
+print(f"✅ Total data ditulis: {valid_counter} ({valid_counter / elapsed:,.0f} baris/detik, {elapsed:.1f} detik)")
 print(f"🚫 Data kosong dilewati: {missing_counter}")
-
-# 10. Simpan CSV
-final_df = pd.DataFrame(results)
-final_df.to_csv("chatbot/data/canesm5_tml_proj245_by_wilayah.csv", index=False)
-print("✅ Ekstraksi selesai dan disimpan.")
\ No newline at end of file
+print(f"✅ Ekstraksi selesai dan disimpan ke {OUTPUT_FILE}.")
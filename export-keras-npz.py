@@ -0,0 +1,50 @@
+import sys
+import numpy as np
+import tensorflow as tf
+from functions.numpy_model import NumpyDenseModel
+
+# Ekspor bobot model intent Keras (Dense/Dropout) ke file .npz yang bisa
+# dijalankan NumpyDenseModel tanpa TensorFlow, lalu cek kesamaan probabilitasnya.
+
+models = {
+    "chatbot_samudra_new.keras": "chatbot_samudra_new.npz",
+    "chatbot_PI_new.keras": "chatbot_PI_new.npz",
+}
+atol = 1e-5  # toleransi selisih probabilitas antara TF dan NumPy
+rng = np.random.default_rng(42)
+
+failed = False
+for keras_path, npz_path in models.items():
+    model = tf.keras.models.load_model(keras_path)
+
+    kernels, biases, activations = [], [], []
+    for layer in model.layers:
+        if isinstance(layer, tf.keras.layers.Dropout):
+            continue
+        if not isinstance(layer, tf.keras.layers.Dense):
+            raise TypeError(f"Layer {layer.name} ({type(layer).__name__}) belum didukung.")
+        kernel, bias = layer.get_weights()
+        kernels.append(kernel)
+        biases.append(bias)
+        activations.append(layer.get_config()["activation"])
+
+    np_model = NumpyDenseModel(kernels, biases, activations)
+    np_model.save(npz_path)
+
+    # Cek parity pada input bag-of-words acak (biner) + vektor kosong
+    x = (rng.random((512, np_model.input_dim)) < 0.02).astype(np.float32)
+    x[0] = 0.0
+    tf_probs = model.predict(x, verbose=0)
+    np_probs = NumpyDenseModel.load(npz_path).predict(x)
+    max_diff = float(np.abs(tf_probs - np_probs).max())
+    same_argmax = float((tf_probs.argmax(axis=1) == np_probs.argmax(axis=1)).mean())
+
+    print(f"📦 {keras_path} -> {npz_path} ({' -> '.join(activations)})")
+    print(f"   Selisih maks probabilitas: {max_diff:.2e} | argmax sama: {same_argmax:.2%}")
+    if max_diff > atol:
+        print(f"❌ Selisih melebihi toleransi {atol:.0e}")
+        failed = True
+
+if failed:
+    sys.exit(1)
+print("✅ Ekspor selesai.")
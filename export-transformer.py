@@ -0,0 +1,73 @@
+import os
+import sys
+import json
+import torch
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from onnxruntime.quantization import quantize_dynamic, QuantType
+
+from functions.intent_service import (
+    ONNX_DIR, ONNX_FP32_FILE, ONNX_INT8_FILE,
+    load_intent_runtime, check_parity
+)
+
+# Ekspor model hasil train-transformer.py ke ONNX int8 untuk host CPU,
+# lalu cek apakah tag yang dipilih masih sama dengan model PyTorch asli.
+
+model_path = "bert-samudra-model"
+min_agreement = 0.99  # batas minimal kesepakatan tag antara PyTorch dan ONNX int8
+
+# === 1. LOAD TOKENIZER & MODEL ===
+tokenizer = AutoTokenizer.from_pretrained(model_path)
+model = AutoModelForSequenceClassification.from_pretrained(model_path)
+model.eval()
+model.config.return_dict = False
+
+# === 2. EKSPOR KE ONNX (fp32) ===
+onnx_dir = os.path.join(model_path, ONNX_DIR)
+os.makedirs(onnx_dir, exist_ok=True)
+fp32_path = os.path.join(onnx_dir, ONNX_FP32_FILE)
+int8_path = os.path.join(onnx_dir, ONNX_INT8_FILE)
+
+dummy = tokenizer(["tren tml nasional", "ranking tml provinsi"], return_tensors="pt", padding=True)
+input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in dummy]
+dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+dynamic_axes["logits"] = {0: "batch"}
+
+torch.onnx.export(
+    model,
+    tuple(dummy[name] for name in input_names),
+    fp32_path,
+    input_names=input_names,
+    output_names=["logits"],
+    dynamic_axes=dynamic_axes,
+    opset_version=14,
+    do_constant_folding=True,
+)
+print(f"📦 ONNX fp32 disimpan ke {fp32_path}")
+
+# === 3. KUANTISASI DINAMIS INT8 ===
+quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+print(f"📦 ONNX int8 disimpan ke {int8_path}")
+print(f"   Ukuran: {os.path.getsize(fp32_path) / 1e6:.1f} MB -> {os.path.getsize(int8_path) / 1e6:.1f} MB")
+
+# === 4. CEK AKURASI (PARITY) TERHADAP label_map.json ===
+with open("samudra.json", encoding="utf-8") as f:
+    intents = json.load(f)
+with open("label_map.json", "r") as f:
+    label_map = json.load(f)
+
+reference = load_intent_runtime(model_path, "torch")
+for backend in ("torch-int8", "onnx-int8"):
+    report = check_parity(tokenizer, reference, load_intent_runtime(model_path, backend), intents, label_map)
+    print(f"\n=== Parity torch vs {backend} ({report['n_patterns']} pattern) ===")
+    print(f"Akurasi torch      : {report['reference_accuracy']:.2%}")
+    print(f"Akurasi {backend:<11}: {report['candidate_accuracy']:.2%}")
+    print(f"Kesepakatan tag    : {report['agreement']:.2%}")
+    for m in report["mismatches"]:
+        print(f"  - '{m['text']}' ({m['label']}): torch={m['reference']} {backend}={m['candidate']}")
+
+    if backend == "onnx-int8" and report["agreement"] < min_agreement:
+        print(f"❌ Kesepakatan di bawah {min_agreement:.0%}, jangan gunakan backend {backend}.")
+        sys.exit(1)
+
+print("\n✅ Ekspor selesai. Set INTENT_BACKEND = \"onnx-int8\" di chatbot-samudra-new.py untuk memakainya.")
@@ -0,0 +1,159 @@
+# functions/gazetteer.py
+
+import re
+
+import numpy as np
+
+# =============================================================================
+# GAZETTEER: RESOLUSI NAMA WILAYAH (FUZZY) KE NAMA KANONIK + HIERARKI
+# =============================================================================
+
+ADMIN_LEVELS = ["provinsi", "kabupaten", "kecamatan", "desa"]
+_KEY_RE = re.compile(r"[^a-z0-9]")
+
+
+def _key(name):
+    """Kunci pencarian: huruf kecil tanpa spasi/tanda baca ("Jawa  Timur" == "jawatimur")."""
+    return _KEY_RE.sub("", str(name).lower())
+
+
+def _trigrams(key):
+    padded = f"${key}$"
+    return {padded[i:i + 3] for i in range(max(1, len(padded) - 2))}
+
+
+class _LevelIndex:
+    """Inverted index trigram -> id nama untuk satu level administratif."""
+
+    def __init__(self, names):
+        self.names = list(names)
+        self.by_key = {}
+        postings = {}
+        self.n_grams = np.zeros(len(self.names), dtype=np.int32)
+        for i, name in enumerate(self.names):
+            key = _key(name)
+            self.by_key.setdefault(key, i)
+            grams = _trigrams(key)
+            self.n_grams[i] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(i)
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+    def search(self, text, limit=5, allowed=None):
+        """
+        Daftar (id, skor) terbaik; skor 1.0 untuk kecocokan kunci persis.
+        `allowed` (array id) membatasi kandidat, mis. hanya nama di bawah induk tertentu.
+        """
+        key = _key(text)
+        if not key:
+            return []
+        mask = None
+        if allowed is not None:
+            mask = np.zeros(len(self.names), dtype=bool)
+            mask[allowed] = True
+        if key in self.by_key and (mask is None or mask[self.by_key[key]]):
+            return [(self.by_key[key], 1.0)]
+
+        grams = _trigrams(key)
+        hits = [self.postings[g] for g in grams if g in self.postings]
+        if not hits:
+            return []
+        common = np.bincount(np.concatenate(hits), minlength=len(self.names))
+        if mask is not None:
+            common[~mask] = 0
+        candidates = np.flatnonzero(common)
+        shared = common[candidates]
+        sizes = self.n_grams[candidates]
+
+        # Dice untuk typo; containment (nama utuh ada di dalam query) untuk kata tambahan
+        dice = 2.0 * shared / (len(grams) + sizes)
+        containment = np.where(sizes >= 4, shared / sizes, 0.0) * 0.95
+        scores = np.maximum(dice, containment)
+
+        order = np.argsort(-scores, kind="stable")[:limit]
+        return [(int(candidates[j]), float(scores[j])) for j in order]
+
+
+class Gazetteer:
+    """
+    Dibangun sekali dari tabel wilayah unik (kolom provinsi/kabupaten/kecamatan/desa).
+    `resolve()` memetakan hasil tangkapan regex ke nama kanonik beserta hierarki induknya.
+    """
+
+    def __init__(self, regions, min_score=0.6):
+        self.min_score = min_score
+        self.levels = [level for level in ADMIN_LEVELS if level in regions.columns]
+        regions = regions[self.levels].astype(str).drop_duplicates()
+
+        self._indexes = {}
+        self._parents = {}
+        self._children = {}  # level -> {(kolom induk, nama induk): array id nama di level tsb}
+        for depth, level in enumerate(self.levels):
+            parent_cols = self.levels[:depth]
+            unique = regions[self.levels[:depth + 1]].drop_duplicates()
+            parents = {}
+            for row in unique.itertuples(index=False):
+                values = dict(zip(self.levels, row))
+                parents.setdefault(values[level], []).append({col: values[col] for col in parent_cols})
+            self._parents[level] = parents
+            self._indexes[level] = _LevelIndex(sorted(parents))
+            children = {}
+            for i, name in enumerate(self._indexes[level].names):
+                for hierarchy in parents[name]:
+                    for item in hierarchy.items():
+                        children.setdefault(item, set()).add(i)
+            self._children[level] = {item: np.array(sorted(ids), dtype=np.int32) for item, ids in children.items()}
+
+    def _ranked(self, index, text, limit, allowed=None):
+        ranked = [(index.names[i], score) for i, score in index.search(text, limit=limit, allowed=allowed)]
+        return [(name, score) for name, score in ranked if score >= self.min_score]
+
+    def _allowed_ids(self, level, parents):
+        """Id nama pada `level` yang berada di bawah semua induk `parents`; None jika tidak ada filter."""
+        allowed = None
+        for item in (parents or {}).items():
+            if item[0] not in self.levels[:self.levels.index(level)]:
+                continue
+            ids = self._children[level].get(item, np.array([], dtype=np.int32))
+            allowed = ids if allowed is None else np.intersect1d(allowed, ids)
+        return allowed
+
+    def hierarchies(self, level, name):
+        """Semua hierarki induk (list dict) yang memuat nama kanonik `name` pada `level`."""
+        return self._parents.get(level, {}).get(str(name), [])
+
+    def resolve(self, level, text, parents=None, limit=5):
+        """
+        Mengembalikan dict: name (kanonik atau None), score, matches (hierarki induk yang
+        memuat nama tersebut), ambiguous (True jika nama ada di lebih dari satu induk),
+        dan alternatives (kandidat nama lain dengan skor tertinggi).
+        `parents` (mis. {"provinsi": "jawa timur"}) mempersempit kandidat sebelum nama dipilih;
+        jika tidak ada kandidat di bawah induk tersebut, nama terbaik secara global yang dipakai.
+        """
+        result = {"query": text, "level": level, "name": None, "score": 0.0,
+                  "matches": [], "ambiguous": False, "alternatives": []}
+        index = self._indexes.get(level)
+        if index is None:
+            return result
+
+        allowed = self._allowed_ids(level, parents)
+        ranked = self._ranked(index, text, limit, allowed) if allowed is not None else []
+        global_best = not ranked  # tidak ada kandidat di bawah induk: pakai nama terbaik secara global
+        if global_best:
+            ranked = self._ranked(index, text, limit)
+        if not ranked:
+            return result
+
+        name, score = ranked[0]
+        matches = self._parents[level][name]
+        if parents and not global_best:
+            matches = [m for m in matches if all(m.get(col) == val for col, val in parents.items() if col in m)]
+
+        result.update({
+            "name": name,
+            "score": round(score, 3),
+            "matches": matches,
+            "ambiguous": len(matches) > 1,
+            "alternatives": [(alt, round(s, 3)) for alt, s in ranked[1:]],
+        })
+        return result
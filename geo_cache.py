@@ -0,0 +1,127 @@
+# functions/geo_cache.py
+
+import hashlib
+import json
+import os
+import sys
+import time
+
+# =============================================================================
+# CACHE GEOPARQUET UNTUK SHAPEFILE YANG SUDAH DIPROYEKSI / DI-BUFFER
+# =============================================================================
+#
+# Build manual:
+#   python -m functions.geo_cache build                  (geometri persis)
+#   python -m functions.geo_cache build --simplify 0.005 (simplifikasi, derajat)
+#   python -m functions.geo_cache status
+#
+# Setiap layer disimpan sebagai <out_dir>/<nama>.parquet (GeoParquet, EPSG:4326)
+# dengan <nama>.meta.json berisi signature dan hash seluruh file pendamping shapefile.
+
+GEO_CACHE_DIR = "data/geo_cache"
+SHAPEFILE_SIDECARS = (".shp", ".shx", ".dbf", ".prj", ".cpg")
+
+
+def _paths(name, out_dir=GEO_CACHE_DIR):
+    return {
+        "data": os.path.join(out_dir, f"{name}.parquet"),
+        "meta": os.path.join(out_dir, f"{name}.meta.json"),
+    }
+
+
+def shapefile_files(shp_path):
+    """File pendamping shapefile (.shp, .shx, .dbf, ...) yang benar-benar ada."""
+    stem = os.path.splitext(shp_path)[0]
+    return [stem + ext for ext in SHAPEFILE_SIDECARS if os.path.exists(stem + ext)]
+
+
+def shapefile_signature(shp_path):
+    return {path: [os.stat(path).st_mtime, os.stat(path).st_size] for path in shapefile_files(shp_path)}
+
+
+def shapefile_sha256(shp_path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    for path in shapefile_files(shp_path):
+        digest.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_meta(name, out_dir=GEO_CACHE_DIR):
+    path = _paths(name, out_dir)["meta"]
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def is_current(name, shp_path, out_dir=GEO_CACHE_DIR):
+    """
+    True jika cache layer ada dan dibuat dari shapefile saat ini.
+    Signature (mtime/ukuran) dicek dulu; jika berbeda, hash isi file yang menentukan.
+    """
+    meta = _read_meta(name, out_dir)
+    if meta is None or not os.path.exists(_paths(name, out_dir)["data"]):
+        return False
+    signature = shapefile_signature(shp_path)
+    if signature == meta.get("signature"):
+        return True
+    if shapefile_sha256(shp_path) != meta.get("sha256"):
+        return False
+
+    # Shapefile hanya di-touch/disalin ulang: isi sama, perbarui signature saja
+    meta["signature"] = signature
+    with open(_paths(name, out_dir)["meta"], "w") as f:
+        json.dump(meta, f, indent=2)
+    return True
+
+
+def write_layer(name, gdf, shp_path, simplify=None, out_dir=GEO_CACHE_DIR):
+    """Menyimpan GeoDataFrame hasil pra-proses `shp_path` sebagai GeoParquet."""
+    os.makedirs(out_dir, exist_ok=True)
+    started = time.perf_counter()
+    if simplify:
+        gdf = gdf.copy()
+        gdf["geometry"] = gdf.geometry.simplify(simplify, preserve_topology=True)
+    paths = _paths(name, out_dir)
+    gdf.to_parquet(paths["data"], index=False)
+
+    meta = {
+        "source": shp_path,
+        "signature": shapefile_signature(shp_path),
+        "sha256": shapefile_sha256(shp_path),
+        "simplify": simplify,
+        "n_features": int(len(gdf)),
+        "built_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "build_seconds": round(time.perf_counter() - started, 2),
+    }
+    with open(paths["meta"], "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def read_layer(name, out_dir=GEO_CACHE_DIR):
+    import geopandas as gpd
+
+    return gpd.read_parquet(_paths(name, out_dir)["data"])
+
+
+if __name__ == "__main__":
+    from functions import plotter
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    if command == "build":
+        simplify = float(sys.argv[sys.argv.index("--simplify") + 1]) if "--simplify" in sys.argv else None
+        layers = plotter.prepare_geospatial_layers()
+        for name, gdf in layers.items():
+            print(f"🔧 Menulis {name} ke {_paths(name)['data']}...")
+            meta = write_layer(name, gdf, plotter.SHAPEFILE_PATHS[name], simplify=simplify)
+            print(f"✅ {meta['n_features']} fitur dalam {meta['build_seconds']} detik.")
+    elif command == "status":
+        for name, shp_path in plotter.SHAPEFILE_PATHS.items():
+            print(json.dumps({"layer": name, "current": is_current(name, shp_path), "meta": _read_meta(name)}, indent=2))
+    else:
+        print(f"Perintah tidak dikenal: {command}. Gunakan 'build' atau 'status'.")
+        sys.exit(1)
@@ -0,0 +1,131 @@
+# functions/grid_store.py
+
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+
+# =============================================================================
+# STORE GRID RATA-RATA TAHUNAN & TREN (NUMPY MEMORY-MAPPED) UNTUK PETA
+# =============================================================================
+#
+# Build manual:
+#   python -m functions.grid_store build              (semua dataset NetCDF)
+#   python -m functions.grid_store build observasi
+#
+# Layout: <out_dir>/grids.npy (layer x lat x lon, float32), index.npy (tahun per layer;
+# kosong untuk grid tren yang hanya satu layer), latitude.npy, longitude.npy, _meta.json.
+# grids.npy dibuka dengan mmap_mode="r", jadi satu peta hanya membaca satu slice 2-D.
+
+GRID_DIR = "data/grids"
+GRID_FILE = "grids.npy"
+INDEX_FILE = "index.npy"
+META_FILE = "_meta.json"
+
+
+def grid_path(data_type, base_dir=GRID_DIR):
+    return os.path.join(base_dir, data_type)
+
+
+def _source_signature(source_path):
+    stat = os.stat(source_path)
+    return {"source": source_path, "mtime": stat.st_mtime, "size": stat.st_size}
+
+
+def write_grid_store(out_dir, layers, index, latitude, longitude, source_path, variable=None):
+    """
+    Menulis `layers` (iterable array 2-D lat x lon, satu per entri `index`) ke store baru.
+    Layer ditulis satu per satu ke memmap sehingga cube penuh tidak perlu ada di memori.
+    """
+    started = time.perf_counter()
+    if os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    os.makedirs(out_dir)
+
+    index = np.asarray(index)
+    n_layers = max(len(index), 1)
+    shape = (n_layers, len(latitude), len(longitude))
+    grids = np.lib.format.open_memmap(os.path.join(out_dir, GRID_FILE), mode="w+", dtype=np.float32, shape=shape)
+    for i, layer in enumerate(layers):
+        grids[i] = np.asarray(layer, dtype=np.float32).reshape(shape[1:])
+    grids.flush()
+    del grids
+
+    np.save(os.path.join(out_dir, INDEX_FILE), index)
+    np.save(os.path.join(out_dir, "latitude.npy"), np.asarray(latitude, dtype=np.float64))
+    np.save(os.path.join(out_dir, "longitude.npy"), np.asarray(longitude, dtype=np.float64))
+
+    meta = _source_signature(source_path)
+    meta.update({
+        "variable": variable,
+        "shape": list(shape),
+        "build_seconds": round(time.perf_counter() - started, 2),
+    })
+    with open(os.path.join(out_dir, META_FILE), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def build_yearly_grids(data_array, out_dir, source_path):
+    """Rata-rata tahunan `data_array` (time x lat x lon), dihitung per tahun lalu ditulis ke store."""
+    years = np.unique(data_array["time.year"].values)
+    layers = (data_array.sel(time=data_array["time.year"] == year).mean("time").values for year in years)
+    return write_grid_store(out_dir, layers, years, data_array["latitude"].values,
+                            data_array["longitude"].values, source_path, variable=data_array.name)
+
+
+def build_trend_grid(data_array, out_dir, source_path):
+    """Grid tren (lat x lon) sebagai store satu layer."""
+    return write_grid_store(out_dir, [data_array.values], [], data_array["latitude"].values,
+                            data_array["longitude"].values, source_path, variable=data_array.name)
+
+
+def is_current(out_dir, source_path):
+    """True jika store ada dan dibangun dari versi NetCDF sumber saat ini."""
+    meta_path = os.path.join(out_dir, META_FILE)
+    if not os.path.exists(meta_path) or not os.path.exists(source_path):
+        return False
+    with open(meta_path, "r") as f:
+        meta = json.load(f)
+    signature = _source_signature(source_path)
+    return all(meta.get(k) == signature[k] for k in ("mtime", "size"))
+
+
+class GridStore:
+    """Pembaca store grid; `get(year)` mengembalikan view 2-D (lat x lon) tanpa menyalin cube."""
+
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        self.grids = np.load(os.path.join(out_dir, GRID_FILE), mmap_mode="r")
+        self.index = np.load(os.path.join(out_dir, INDEX_FILE))
+        self.latitude = np.load(os.path.join(out_dir, "latitude.npy"))
+        self.longitude = np.load(os.path.join(out_dir, "longitude.npy"))
+        self._position = {int(key): i for i, key in enumerate(self.index)}
+
+    @property
+    def years(self):
+        return self.index.astype(int).tolist()
+
+    def get(self, year=None):
+        """Grid untuk `year`; tanpa `year` mengembalikan layer tunggal (grid tren). None jika tidak ada."""
+        if year is None:
+            return self.grids[0] if not len(self.index) else None
+        position = self._position.get(int(year))
+        return None if position is None else self.grids[position]
+
+
+if __name__ == "__main__":
+    from functions import plotter
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "build"
+    if command != "build":
+        print(f"Perintah tidak dikenal: {command}. Gunakan 'build'.")
+        sys.exit(1)
+
+    for data_type in sys.argv[2:] or list(plotter.NETCDF_PATHS):
+        print(f"🔧 Menulis store grid {data_type} ke {grid_path(data_type)}...")
+        meta = plotter.build_grid_store(data_type)
+        print(f"✅ {meta['shape']} dalam {meta['build_seconds']} detik.")
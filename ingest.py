@@ -0,0 +1,186 @@
+# functions/ingest.py
+
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from functions.regrid import extract_region_means, load_regridder
+
+# =============================================================================
+# INGEST INKREMENTAL: TIMESTAMP BARU DARI NETCDF -> FILE PARQUET TAMBAHAN
+# =============================================================================
+#
+# Pemakaian:
+#   python -m functions.ingest observasi          (sea_level_obs.nc -> data/increments/observasi)
+#   python -m functions.ingest status
+#
+# Parquet sumber (TIMESERIES_PATHS) tidak pernah ditulis ulang. Setiap ingest menulis satu
+# file part-<awal>-<akhir>.parquet berisi timestamp yang belum ada, lalu artefak turunan
+# (agregat, dataset terpartisi, cube wilayah) diperbarui hanya dengan baris baru tersebut.
+# Setiap artefak mencatat daftar increment yang sudah diterapkan di metadata-nya.
+#
+# Parquet sumber berisi rata-rata per wilayah (tanpa kolom latitude) diekstrak dengan
+# matriks bobot luas (regrid.py); parquet per titik tetap memakai indeks grid terdekat.
+
+INCREMENT_DIR = "data/increments"
+ADMIN_COLUMNS = ["provinsi", "kabupaten", "kecamatan", "desa"]
+TIME_CHUNK = 24
+
+
+def increment_dir(data_type, base_dir=INCREMENT_DIR):
+    return os.path.join(base_dir, data_type)
+
+
+def list_increments(data_type, base_dir=INCREMENT_DIR):
+    """Path file increment `data_type`, urut nama (= urut waktu)."""
+    return sorted(glob.glob(os.path.join(increment_dir(data_type, base_dir), "part-*.parquet")))
+
+
+def increment_names(data_type, base_dir=INCREMENT_DIR):
+    return [os.path.basename(path) for path in list_increments(data_type, base_dir)]
+
+
+def source_version(source_path, data_type, base_dir=INCREMENT_DIR):
+    """Versi data (mtime terbaru parquet sumber & increment) untuk kunci cache di plotter."""
+    paths = [source_path, *list_increments(data_type, base_dir)]
+    return max(os.path.getmtime(path) for path in paths)
+
+
+def pending_increments(applied, data_type, base_dir=INCREMENT_DIR):
+    """
+    Increment yang belum diterapkan ke sebuah artefak (daftar path), atau None jika
+    artefak memuat increment yang sudah tidak ada sehingga harus dibangun ulang.
+    """
+    applied = list(applied or [])
+    current = list_increments(data_type, base_dir)
+    names = [os.path.basename(path) for path in current]
+    if names[:len(applied)] != applied:
+        return None
+    return current[len(applied):]
+
+
+def known_timestamps(paths):
+    """Timestamp unik (datetime64[ns]) yang sudah ada di file-file parquet `paths`."""
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    seen = [pc.unique(pq.read_table(path, columns=["time"])["time"]) for path in paths]
+    if not seen:
+        return np.array([], dtype="datetime64[ns]")
+    values = np.concatenate([np.asarray(pd.to_datetime(s.to_pandas())) for s in seen])
+    return np.unique(values.astype("datetime64[ns]"))
+
+
+def nearest_index(grid, values):
+    """Indeks sel `grid` terdekat untuk setiap nilai (searchsorted, grid naik maupun turun)."""
+    grid = np.asarray(grid, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    order = np.argsort(grid, kind="stable")
+    sorted_grid = grid[order]
+    pos = np.clip(np.searchsorted(sorted_grid, values), 1, len(grid) - 1)
+    closer_left = (values - sorted_grid[pos - 1]) <= (sorted_grid[pos] - values)
+    return order[pos - closer_left]
+
+
+def point_table(source_path, latitude, longitude):
+    """Titik valid + wilayah admin dari parquet sumber, dipetakan ke indeks grid NetCDF."""
+    points = pd.read_parquet(source_path, columns=["latitude", "longitude", *ADMIN_COLUMNS])
+    points = points.drop_duplicates().reset_index(drop=True)
+    points["lat_idx"] = nearest_index(latitude, points["latitude"].to_numpy())
+    points["lon_idx"] = nearest_index(longitude, points["longitude"].to_numpy())
+    return points
+
+
+def extract_rows(data_array, time_values, positions, points, chunk=TIME_CHUNK):
+    """
+    Baris (time, latitude, longitude, sla, admin...) untuk posisi waktu `positions`,
+    dibaca per chunk dengan advanced indexing dan NaN dibuang secara vektor.
+    """
+    lat_idxs = points["lat_idx"].to_numpy()
+    lon_idxs = points["lon_idx"].to_numpy()
+    frames = []
+    for start in range(0, len(positions), chunk):
+        block_pos = positions[start:start + chunk]
+        block = data_array.isel(time=block_pos).values[:, lat_idxs, lon_idxs]  # (waktu, titik)
+        t_idx, p_idx = np.nonzero(~np.isnan(block))
+        frame = points.iloc[p_idx][["latitude", "longitude", *ADMIN_COLUMNS]].reset_index(drop=True)
+        frame.insert(0, "time", time_values[block_pos][t_idx])
+        frame.insert(3, "sla", block[t_idx, p_idx])
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def is_region_source(source_path):
+    """True jika parquet sumber berisi rata-rata wilayah (hasil regrid), bukan baris per titik."""
+    import pyarrow.parquet as pq
+
+    return "latitude" not in pq.read_schema(source_path).names
+
+
+def ingest(data_type, nc_path, variable, source_path, admin_path=None, base_dir=INCREMENT_DIR, chunk=TIME_CHUNK):
+    """
+    Mengekstrak timestamp `nc_path` yang belum ada di parquet sumber/increment dan menulisnya
+    sebagai satu file increment baru. Mengembalikan (path_increment, frame_baru) atau (None, None).
+    `admin_path` (batas wilayah) hanya dipakai untuk sumber rata-rata wilayah.
+    """
+    import xarray as xr
+
+    started = time.perf_counter()
+    ds = xr.open_dataset(nc_path)
+    time_values = ds.time.to_index()
+    if not isinstance(time_values, pd.DatetimeIndex):  # kalender cftime
+        time_values = pd.to_datetime(time_values.astype(str))
+    time_values = time_values.values.astype("datetime64[ns]")
+
+    existing = known_timestamps([source_path, *list_increments(data_type, base_dir)])
+    positions = np.flatnonzero(~np.isin(time_values, existing))
+    if not len(positions):
+        return None, None
+
+    if is_region_source(source_path):
+        regridder = load_regridder(admin_path, ds.latitude.values, ds.longitude.values)
+        df_new = extract_region_means(ds[variable], time_values, positions, regridder, chunk)
+    else:
+        points = point_table(source_path, ds.latitude.values, ds.longitude.values)
+        df_new = extract_rows(ds[variable], time_values, positions, points, chunk)
+
+    first, last = pd.Timestamp(time_values[positions[0]]), pd.Timestamp(time_values[positions[-1]])
+    out_dir = increment_dir(data_type, base_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"part-{first:%Y%m%d}-{last:%Y%m%d}.parquet")
+    df_new.to_parquet(path, index=False, compression="zstd")
+
+    elapsed = time.perf_counter() - started
+    print(f"⏱️ {len(positions)} timestamp baru, {len(df_new)} baris, {len(df_new) / max(elapsed, 1e-9):,.0f} baris/detik")
+    return path, df_new
+
+
+if __name__ == "__main__":
+    from functions import plotter
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    if command == "status":
+        for data_type, source_path in plotter.TIMESERIES_PATHS.items():
+            print(f"{data_type}: {source_path} + {len(list_increments(data_type))} increment")
+            for name in increment_names(data_type):
+                print(f"  - {name}")
+        sys.exit(0)
+
+    data_type = command
+    if data_type not in plotter.TIMESERIES_PATHS or data_type not in plotter.NETCDF_PATHS:
+        print(f"Tipe data tidak dikenal: {data_type}. Gunakan 'observasi', 'proyeksi', atau 'status'.")
+        sys.exit(1)
+
+    print(f"🔎 Mencari timestamp baru di {plotter.NETCDF_PATHS[data_type]}...")
+    path, df_new = ingest(data_type, plotter.NETCDF_PATHS[data_type], plotter.NETCDF_VARIABLES[data_type],
+                          plotter.TIMESERIES_PATHS[data_type], admin_path=plotter.ADMIN_BOUNDARY_PATH)
+    if path is None:
+        print("✅ Tidak ada timestamp baru.")
+        sys.exit(0)
+    print(f"💾 Increment ditulis ke {path}")
+    for name, seconds in plotter.apply_increments(data_type).items():
+        print(f"✅ {name} diperbarui dalam {seconds:.2f} detik")
@@ -0,0 +1,504 @@
+# functions/intent_service.py
+
+import os
+import queue
+import re
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+
+import numpy as np
+
+# Lokasi artefak hasil export-transformer.py (relatif terhadap folder model)
+ONNX_DIR = "onnx"
+ONNX_FP32_FILE = "model.onnx"
+ONNX_INT8_FILE = "model.int8.onnx"
+
+INTENT_BACKENDS = ("torch", "torch-int8", "onnx-int8")
+
+# =============================================================================
+# 1. RUNTIME CLASSIFIER (PyTorch penuh / terkuantisasi / ONNX)
+# =============================================================================
+
+class TorchIntentRuntime:
+    """Menjalankan AutoModelForSequenceClassification PyTorch (fp32 atau int8 dinamis)."""
+
+    def __init__(self, model):
+        self.model = model
+
+    def logits(self, inputs):
+        import torch
+
+        tensors = {name: torch.from_numpy(values) for name, values in inputs.items()}
+        with torch.no_grad():
+            return self.model(**tensors).logits.numpy()
+
+
+class OnnxIntentRuntime:
+    """Menjalankan model hasil ekspor ONNX lewat onnxruntime (CPU)."""
+
+    def __init__(self, onnx_path):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {node.name for node in self.session.get_inputs()}
+
+    def logits(self, inputs):
+        feed = {name: values.astype(np.int64) for name, values in inputs.items() if name in self.input_names}
+        return self.session.run(["logits"], feed)[0]
+
+
+def load_intent_runtime(model_path, backend="torch"):
+    """
+    Memuat classifier intent sesuai backend:
+    - 'torch'      : checkpoint PyTorch full-precision (perilaku lama)
+    - 'torch-int8' : checkpoint yang sama, Linear dikuantisasi dinamis ke int8
+    - 'onnx-int8'  : model ONNX int8 dari export-transformer.py (tanpa memuat bobot PyTorch)
+    """
+    if backend == "onnx-int8":
+        onnx_path = os.path.join(model_path, ONNX_DIR, ONNX_INT8_FILE)
+        if not os.path.exists(onnx_path):
+            raise FileNotFoundError(f"{onnx_path} belum ada. Jalankan export-transformer.py terlebih dahulu.")
+        return OnnxIntentRuntime(onnx_path)
+
+    if backend not in ("torch", "torch-int8"):
+        raise ValueError(f"Backend intent tidak valid: {backend}. Pilih salah satu dari {INTENT_BACKENDS}.")
+
+    import torch
+    from transformers import AutoModelForSequenceClassification
+
+    model = AutoModelForSequenceClassification.from_pretrained(model_path)
+    model.eval()
+    if backend == "torch-int8":
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return TorchIntentRuntime(model)
+
+
+def predict_tags(tokenizer, runtime, id2label, texts, batch_size=32, max_length=512):
+    """Prediksi (tag, confidence) untuk banyak teks sekaligus, dipecah per batch."""
+    results = []
+    for start in range(0, len(texts), batch_size):
+        chunk = list(texts[start:start + batch_size])
+        inputs = tokenizer(chunk, return_tensors="np", truncation=True, padding=True, max_length=max_length)
+        results.extend(_decode_logits(runtime.logits(dict(inputs)), id2label))
+    return results
+
+
+def _decode_logits(logits, id2label):
+    logits = logits - logits.max(axis=1, keepdims=True)
+    probs = np.exp(logits)
+    probs /= probs.sum(axis=1, keepdims=True)
+    class_ids = probs.argmax(axis=1)
+    return [
+        (id2label.get(int(class_id), "fallback"), float(probs[i, class_id]))
+        for i, class_id in enumerate(class_ids)
+    ]
+
+
+def check_parity(tokenizer, reference, candidate, intents, label_map):
+    """
+    Membandingkan dua runtime pada semua pattern samudra.json.
+    Mengembalikan akurasi masing-masing terhadap tag asli, tingkat kesepakatan
+    tag antar runtime, dan daftar pattern yang hasilnya berbeda.
+    """
+    id2label = {v: k for k, v in label_map.items()}
+    texts, labels = [], []
+    for intent in intents["intents"]:
+        if intent["tag"] not in label_map:
+            continue
+        for pattern in intent["patterns"]:
+            texts.append(pattern)
+            labels.append(intent["tag"])
+
+    ref_tags = [tag for tag, _ in predict_tags(tokenizer, reference, id2label, texts)]
+    cand_tags = [tag for tag, _ in predict_tags(tokenizer, candidate, id2label, texts)]
+
+    n = len(texts)
+    mismatches = [
+        {"text": text, "label": label, "reference": ref, "candidate": cand}
+        for text, label, ref, cand in zip(texts, labels, ref_tags, cand_tags)
+        if ref != cand
+    ]
+    return {
+        "n_patterns": n,
+        "reference_accuracy": sum(r == l for r, l in zip(ref_tags, labels)) / n if n else 0.0,
+        "candidate_accuracy": sum(c == l for c, l in zip(cand_tags, labels)) / n if n else 0.0,
+        "agreement": 1.0 - len(mismatches) / n if n else 1.0,
+        "mismatches": mismatches,
+    }
+
+# =============================================================================
+# 2. MICRO-BATCHING UNTUK INFERENSI INTENT
+# =============================================================================
+
+class _IntentRequest:
+    """Satu permintaan prediksi yang menunggu hasil dari worker batch."""
+
+    __slots__ = ("text", "enqueued_at", "done", "result", "error")
+
+    def __init__(self, text):
+        self.text = text
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class IntentBatcher:
+    """
+    Antrian inferensi satu-proses untuk classifier BERT.
+
+    Permintaan yang datang dalam jendela `max_wait_ms` digabung, di-padding
+    bersama, lalu dijalankan dalam satu forward pass. Setiap pemanggil
+    menerima (tag, confidence) miliknya sendiri.
+    """
+
+    def __init__(self, tokenizer, runtime, id2label, max_batch_size=16, max_wait_ms=5.0, max_length=512):
+        self.tokenizer = tokenizer
+        self.runtime = runtime
+        self.id2label = id2label
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_length = max_length
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._queue_waits = deque(maxlen=2000)
+        self._forward_times = deque(maxlen=2000)
+        self._n_requests = 0
+
+        self._worker = threading.Thread(target=self._run_forever, name="intent-batcher", daemon=True)
+        self._worker.start()
+
+    def predict(self, text, timeout=30.0):
+        """Mengirim satu teks ke antrian dan menunggu hasil (tag, confidence)."""
+        request = _IntentRequest(text)
+        self._queue.put(request)
+        if not request.done.wait(timeout):
+            raise TimeoutError("Inferensi intent melebihi batas waktu.")
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run_forever(self):
+        while True:
+            batch = self._collect_batch()
+            started = time.perf_counter()
+            try:
+                results = self._predict_batch([r.text for r in batch])
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+                    request.done.set()
+                continue
+            finished = time.perf_counter()
+
+            for request, result in zip(batch, results):
+                request.result = result
+                request.done.set()
+            self._record(batch, started, finished)
+
+    def _predict_batch(self, texts):
+        inputs = self.tokenizer(texts, return_tensors="np", truncation=True, padding=True, max_length=self.max_length)
+        return _decode_logits(self.runtime.logits(dict(inputs)), self.id2label)
+
+    def _record(self, batch, started, finished):
+        with self._stats_lock:
+            self._n_requests += len(batch)
+            self._batch_sizes[len(batch)] += 1
+            self._forward_times.append(finished - started)
+            self._queue_waits.extend(started - r.enqueued_at for r in batch)
+
+    def stats(self):
+        """Ringkasan ukuran batch dan waktu tunggu antrian (ms)."""
+        with self._stats_lock:
+            n_batches = sum(self._batch_sizes.values())
+            waits = np.array(self._queue_waits) * 1000.0
+            forwards = np.array(self._forward_times) * 1000.0
+            return {
+                "requests": self._n_requests,
+                "batches": n_batches,
+                "mean_batch_size": self._n_requests / n_batches if n_batches else 0.0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "queue_wait_p50_ms": float(np.percentile(waits, 50)) if waits.size else 0.0,
+                "queue_wait_p99_ms": float(np.percentile(waits, 99)) if waits.size else 0.0,
+                "forward_mean_ms": float(forwards.mean()) if forwards.size else 0.0,
+                "pending": self._queue.qsize(),
+            }
+
+# =============================================================================
+# 3. CACHE INTENT BERBASIS TEKS TERNORMALISASI
+# =============================================================================
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_YEAR_RE = re.compile(r"^\d{4}$")
+
+_REGION_LEVELS = ("desa", "kecamatan", "kabupaten", "provinsi")
+# Kata penghubung yang selalu mengakhiri nama wilayah
+_NAME_BOUNDARIES = {
+    "dan", "vs", "dengan", "di", "ke", "dari", "pada", "untuk", "yang", "mana", "berdasarkan",
+    "tahun", "selama", "sejak", "hingga", "sampai", "saat", "per", "apakah", "bagaimana",
+    "<tahun>", *_REGION_LEVELS,
+}
+# Kata kunci intent yang bisa menempel di depan/belakang nama ("desa proyeksi tml X", "desa X
+# paling tinggi"). Hanya dikupas dari kedua ujung nama, jadi kata seperti "laut" di dalam nama
+# ("tanah laut") tetap bagian nama. Lebih baik mengupas terlalu banyak (kunci cache berbeda)
+# daripada menelan kata kunci intent ke dalam placeholder (dua intent berbagi kunci).
+_EDGE_KEYWORDS = {
+    "ini", "nya", "tml", "proyeksi", "diproyeksikan", "tren", "grafik", "data", "peta", "bulanan", "tahunan",
+    "rata", "nasional", "kenaikan", "naik", "turun", "lebih", "tinggi", "rendah", "indonesia", "paling",
+    "tertinggi", "terendah", "teratas", "terbawah", "terdampak", "terparah", "terkini", "ekstrem", "rentan",
+    "berisiko", "berpotensi", "memiliki", "ranking", "top", "urutan", "daftar",
+}
+_EDGE_PHRASES = (("tinggi", "muka", "laut"), ("muka", "laut"))
+# Kata/frasa kunci intent yang tidak pernah menjadi bagian nama wilayah: nama selalu berhenti di
+# sini, di posisi mana pun ("kecamatan X diproyeksikan mengalami ...", "desa X masa depan").
+# Kata yang bisa muncul di nama ("tinggi" di "tebing tinggi", "laut" di "tanah laut") hanya
+# dikupas dari ujung nama lewat _EDGE_KEYWORDS.
+_INTENT_STOPS = {
+    "tml", "proyeksi", "diproyeksikan", "prediksi", "diprediksi", "mengalami", "mengalaminya", "terjadi",
+    "akan", "tren", "trend", "grafik", "peta", "bulanan", "tahunan", "kenaikan", "penurunan", "ranking",
+    "bandingkan", "dibandingkan", "perbandingan", "dampak", "berapa", "seberapa",
+}
+_INTENT_STOP_PHRASES = (("masa", "depan"), ("muka", "laut"))
+
+
+def _stop_length(tokens, i):
+    """Panjang kata/frasa kunci intent yang dimulai di tokens[i], 0 jika bukan kata kunci."""
+    for phrase in _INTENT_STOP_PHRASES:
+        if tuple(tokens[i:i + len(phrase)]) == phrase:
+            return len(phrase)
+    return 1 if tokens[i] in _INTENT_STOPS else 0
+
+
+def _edge_length(tokens, start, end, trailing):
+    """Panjang kata kunci (frasa atau satu kata) di ujung tokens[start:end], 0 jika bukan kata kunci."""
+    for phrase in _EDGE_PHRASES:
+        n = len(phrase)
+        if end - start >= n and tuple(tokens[end - n:end] if trailing else tokens[start:start + n]) == phrase:
+            return n
+    return 1 if tokens[end - 1 if trailing else start] in _EDGE_KEYWORDS else 0
+
+
+def _take_name(tokens, start):
+    """
+    (awal, akhir) nama wilayah setelah kata level di `start`: rentang sampai kata penghubung
+    atau kata kunci intent berikutnya, dikurangi kata kunci intent di kedua ujungnya.
+    """
+    # kata kunci di depan nama ("desa proyeksi tml X") tetap di luar placeholder
+    while start < len(tokens) and (n := _stop_length(tokens, start) or _edge_length(tokens, start, len(tokens), False)):
+        start += n
+    end = start
+    while end < len(tokens) and tokens[end] not in _NAME_BOUNDARIES and not _stop_length(tokens, end):
+        end += 1
+    while start < end and (n := _edge_length(tokens, start, end, trailing=True)):
+        end -= n
+    return start, end
+
+
+def normalize_text(text):
+    """
+    Kunci cache untuk sebuah pesan: huruf kecil, tanpa tanda baca, spasi
+    dirapikan, lalu tahun dan nama wilayah diganti placeholder sehingga
+    "tren tml desa A" dan "tren tml desa B" berbagi satu entri.
+    """
+    tokens = ["<tahun>" if _YEAR_RE.match(tok) else tok for tok in _PUNCT_RE.sub(" ", text.lower()).split()]
+
+    out, i = [], 0
+    while i < len(tokens):
+        tok = tokens[i]
+        out.append(tok)
+        i += 1
+        if tok not in _REGION_LEVELS:
+            continue
+        start, end = _take_name(tokens, i)
+        if start == end:
+            continue
+        out.extend(tokens[i:start])
+        out.append(f"<{tok}>")
+        i = end
+        # Pola perbandingan: "desa A dan B" / "provinsi A vs B"
+        if i + 1 < len(tokens) and tokens[i] in ("dan", "vs"):
+            start, end = _take_name(tokens, i + 1)
+            if start == i + 1 and end > start:
+                out.extend([tokens[i], f"<{tok}>"])
+                i = end
+    return " ".join(out)
+
+
+def _pattern_tags(intents, label_map):
+    """Kunci ternormalisasi -> himpunan tag dari pattern samudra.json yang menghasilkan kunci tersebut."""
+    tags = {}
+    for intent in intents["intents"]:
+        if intent["tag"] not in label_map:
+            continue
+        for pattern in intent["patterns"]:
+            tags.setdefault(normalize_text(pattern), set()).add(intent["tag"])
+    return tags
+
+
+def build_exact_match_table(intents, label_map):
+    """
+    Memetakan setiap pattern samudra.json (setelah dinormalisasi) langsung ke tag-nya.
+    Pattern yang ternormalisasi sama tetapi milik tag berbeda dibuang agar tetap ditangani model.
+    """
+    return {key: next(iter(tags)) for key, tags in _pattern_tags(intents, label_map).items() if len(tags) == 1}
+
+
+def build_ambiguous_keys(intents, label_map):
+    """Kunci ternormalisasi yang dipakai pattern dari lebih dari satu tag (tidak boleh masuk cache LRU)."""
+    return {key for key, tags in _pattern_tags(intents, label_map).items() if len(tags) > 1}
+
+
+class IntentCache:
+    """
+    Cache LRU terbatas untuk hasil (tag, confidence), dengan tabel exact-match
+    pattern training yang dibangun saat load. Kunci di `uncached_keys` (kunci yang
+    dipakai pattern beberapa tag) selalu diprediksi ulang. Thread-safe.
+    """
+
+    def __init__(self, exact_table=None, maxsize=4096, uncached_keys=None):
+        self.exact_table = exact_table or {}
+        self.uncached_keys = frozenset(uncached_keys or ())
+        self.maxsize = max(1, int(maxsize))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.hits = 0
+        self.misses = 0
+        self.uncached = 0
+
+    def get_or_predict(self, text, predict_fn):
+        """Mengembalikan hasil dari tabel/cache, atau memanggil `predict_fn(text)` jika belum ada."""
+        key = normalize_text(text)
+        if key in self.uncached_keys:
+            with self._lock:
+                self.uncached += 1
+            return predict_fn(text)
+        with self._lock:
+            tag = self.exact_table.get(key)
+            if tag is not None:
+                self.exact_hits += 1
+                return tag, 1.0
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        result = predict_fn(text)
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return result
+
+    def stats(self):
+        with self._lock:
+            total = self.exact_hits + self.hits + self.misses + self.uncached
+            return {
+                "exact_hits": self.exact_hits,
+                "hits": self.hits,
+                "misses": self.misses,
+                "uncached": self.uncached,
+                "hit_rate": (self.exact_hits + self.hits) / total if total else 0.0,
+                "size": len(self._entries),
+                "exact_table_size": len(self.exact_table),
+            }
+
+# =============================================================================
+# 4. CASCADE: MODEL BAG-OF-WORDS DULU, BERT HANYA JIKA RAGU
+# =============================================================================
+
+class BowIntentClassifier:
+    """Classifier murah: BowEncoder + NumpyDenseModel (chatbot_samudra_new)."""
+
+    def __init__(self, encoder, model):
+        self.encoder = encoder
+        self.model = model
+
+    def predict(self, text):
+        probs = self.model.predict(self.encoder.encode(text)[np.newaxis, :])[0]
+        idx = int(probs.argmax())
+        return self.encoder.classes[idx], float(probs[idx])
+
+
+class IntentCascade:
+    """
+    Menjawab dengan classifier murah jika confidence-nya >= `threshold` dan tag-nya
+    dikenal classifier mahal (`allowed_tags`); selain itu diteruskan ke classifier mahal (BERT).
+    Tanpa `cheap_predict` semua pesan langsung ke classifier mahal; error dari classifier
+    murah juga diteruskan ke classifier mahal (dihitung sebagai "cheap_error").
+    """
+
+    def __init__(self, cheap_predict, expensive_predict, threshold=0.9, allowed_tags=None, disabled_reason=None):
+        self.cheap_predict = cheap_predict
+        self.expensive_predict = expensive_predict
+        self.threshold = threshold
+        self.allowed_tags = set(allowed_tags) if allowed_tags is not None else None
+        self.disabled_reason = disabled_reason
+        self._lock = threading.Lock()
+        self._latencies = {"cheap": deque(maxlen=2000), "escalated": deque(maxlen=2000)}
+        self._counts = Counter()
+
+    def predict(self, text):
+        started = time.perf_counter()
+        failed = False
+        try:
+            tag, confidence = self.cheap_predict(text) if self.cheap_predict else (None, 0.0)
+        except Exception:
+            failed = True
+            tag, confidence = None, 0.0
+        unknown = tag is not None and self.allowed_tags is not None and tag not in self.allowed_tags
+        if confidence >= self.threshold and not unknown:
+            tier = "cheap"
+        else:
+            tier = "escalated"
+            tag, confidence = self.expensive_predict(text)
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self._counts["unknown_tag"] += unknown
+            self._counts["cheap_error"] += failed
+            self._counts[tier] += 1
+            self._latencies[tier].append(elapsed)
+        return tag, confidence
+
+    def stats(self):
+        """Proporsi pesan yang dijawab tiap tier dan latensinya (ms)."""
+        with self._lock:
+            total = self._counts["cheap"] + self._counts["escalated"]
+            report = {
+                "threshold": self.threshold,
+                "requests": total,
+                "unknown_tag": self._counts["unknown_tag"],
+                "cheap_error": self._counts["cheap_error"],
+            }
+            if self.disabled_reason:
+                report["cheap_disabled"] = self.disabled_reason
+            for tier, latencies in self._latencies.items():
+                values = np.array(latencies) * 1000.0
+                report[tier] = {
+                    "count": self._counts[tier],
+                    "rate": self._counts[tier] / total if total else 0.0,
+                    "latency_mean_ms": float(values.mean()) if values.size else 0.0,
+                    "latency_p95_ms": float(np.percentile(values, 95)) if values.size else 0.0,
+                }
+            return report
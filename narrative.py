@@ -1,4 +1,14 @@
 
+def _ranking_scope(kwargs):
+    """Cakupan ranking untuk kalimat narasi: "di Provinsi X" atau "di Indonesia", plus periode jika difilter."""
+    provinsi = kwargs.get("filter_provinsi")
+    cakupan = f"di Provinsi {provinsi.title()}" if provinsi else "di Indonesia"
+    year_range = kwargs.get("year_range")
+    if year_range:
+        start, end = year_range
+        cakupan += f" pada tahun {start}" if start == end else f" pada periode {start}-{end}"
+    return cakupan
+
 def generate_narrative(tag, **kwargs):
     
     if tag == "plot_tml_desa":
@@ -112,13 +122,27 @@ def generate_narrative(tag, **kwargs):
 
     elif "ranking_tml" in tag: # Mencakup ranking desa dan provinsi
         df = kwargs.get("df")
-        level = "Provinsi" if "Provinsi" in df.columns else "Desa"
+        level = df.columns[1] if df is not None else "Wilayah"  # kolom setelah "Peringkat"
+        cakupan = _ranking_scope(kwargs)
+        ascending = kwargs.get("ascending", False)
+        if df is not None and not df.empty and "Tren TML (mm/tahun)" in df.columns:
+            teratas = df.iloc[0]
+            laju = "paling lambat" if ascending else "paling cepat"
+            return (
+                f"Berikut adalah daftar {level} {cakupan} dengan laju tren TML {laju}. **{teratas[level]}** mengalami tren **{teratas['Tren TML (mm/tahun)']:.2f} milimeter per tahun** (R² {teratas['R²']:.2f}). "
+                "Nilai R² yang mendekati 1 berarti perubahan tersebut konsisten dari tahun ke tahun, bukan sekadar fluktuasi sesaat."
+            )
         if df is None or df.empty: return f"Peringkat {level} tidak dapat dibuat."
         
-        tertinggi = df.iloc[0]
+        teratas = df.iloc[0]
         rata_rata_top_n = df["Rata-rata TML (m)"].mean()
+        if ascending:
+            return (
+                f"Berikut adalah daftar {level} dengan rata-rata TML paling rendah {cakupan}. **{teratas[level]}** tercatat sebagai wilayah dengan TML terendah, yaitu **{teratas['Rata-rata TML (m)']:.2f} meter**. "
+                f"Sebagai perbandingan, rata-rata TML dari semua wilayah di daftar ini adalah **{rata_rata_top_n:.2f} meter**. TML yang lebih rendah tidak berarti bebas risiko; laju kenaikannya dari tahun ke tahun tetap perlu dipantau."
+            )
         return (
-            f"Berikut adalah daftar {level} dengan rata-rata TML paling tinggi di Indonesia. **{tertinggi[level]}** tercatat sebagai wilayah dengan TML tertinggi, yaitu **{tertinggi['Rata-rata TML (m)']:.2f} meter**. "
+            f"Berikut adalah daftar {level} dengan rata-rata TML paling tinggi {cakupan}. **{teratas[level]}** tercatat sebagai wilayah dengan TML tertinggi, yaitu **{teratas['Rata-rata TML (m)']:.2f} meter**. "
             f"Sebagai perbandingan, rata-rata TML dari semua wilayah di daftar ini adalah **{rata_rata_top_n:.2f} meter**. {level} yang berada di peringkat atas secara alami lebih rentan terhadap dampak naiknya air laut, seperti abrasi dan intrusi air asin ke sumur warga."
         )
 
@@ -1,3 +1,13 @@
+def _ranking_scope(kwargs):
+    """Cakupan ranking untuk kalimat narasi: "di Provinsi X" atau "di Indonesia", plus periode jika difilter."""
+    provinsi = kwargs.get("filter_provinsi")
+    cakupan = f"di Provinsi {provinsi.title()}" if provinsi else "di Indonesia"
+    year_range = kwargs.get("year_range")
+    if year_range:
+        start, end = year_range
+        cakupan += f" pada tahun {start}" if start == end else f" pada periode {start}-{end}"
+    return cakupan
+
 def generate_narrative(tag, **kwargs):
 
     if tag == "plot_proyeksi_tml_desa":
@@ -111,14 +121,28 @@ def generate_narrative(tag, **kwargs):
 
     elif "ranking_proyeksi" in tag: # Mencakup ranking desa dan provinsi
         df = kwargs.get("df")
-        level = "Provinsi" if "Provinsi" in df.columns else "Desa"
+        level = df.columns[1] if df is not None else "Wilayah"  # kolom setelah "Peringkat"
+        cakupan = _ranking_scope(kwargs)
+        ascending = kwargs.get("ascending", False)
+        if df is not None and not df.empty and "Tren TML (mm/tahun)" in df.columns:
+            teratas = df.iloc[0]
+            laju = "paling lambat" if ascending else "paling cepat"
+            return (
+                f"Berdasarkan proyeksi, berikut adalah daftar {level} {cakupan} dengan laju tren TML {laju}. **{teratas[level]}** diproyeksikan mengalami tren **{teratas['Tren TML (mm/tahun)']:.2f} milimeter per tahun** (R² {teratas['R²']:.2f}). "
+                "Nilai R² yang mendekati 1 berarti perubahan tersebut diperkirakan konsisten dari tahun ke tahun."
+            )
         if df is None or df.empty: return f"Peringkat proyeksi {level} tidak dapat dibuat."
         
-        tertinggi = df.iloc[0]
-        terendah = df.iloc[-1]
-        selisih = tertinggi['Rata-rata TML (m)'] - terendah['Rata-rata TML (m)']
+        teratas = df.iloc[0]
+        terakhir = df.iloc[-1]
+        selisih = abs(teratas['Rata-rata TML (m)'] - terakhir['Rata-rata TML (m)'])
+        if ascending:
+            return (
+                f"Berdasarkan proyeksi, berikut adalah daftar {level} {cakupan} yang diperkirakan akan memiliki TML paling rendah. **{teratas[level]}** diproyeksikan memiliki TML terendah, yaitu **{teratas['Rata-rata TML (m)']:.2f} meter**. "
+                f"Selisihnya mencapai **{selisih:.2f} meter** dengan {level} di urutan terakhir daftar ini. TML proyeksi yang lebih rendah tidak berarti bebas risiko; wilayah ini tetap perlu dimasukkan dalam rencana adaptasi jangka panjang."
+            )
         return (
-            f"Berdasarkan proyeksi, berikut adalah daftar {level} yang diperkirakan akan memiliki TML paling tinggi. **{tertinggi[level]}** diproyeksikan memiliki TML tertinggi, yaitu **{tertinggi['Rata-rata TML (m)']:.2f} meter**. "
+            f"Berdasarkan proyeksi, berikut adalah daftar {level} {cakupan} yang diperkirakan akan memiliki TML paling tinggi. **{teratas[level]}** diproyeksikan memiliki TML tertinggi, yaitu **{teratas['Rata-rata TML (m)']:.2f} meter**. "
             f"Adanya potensi selisih yang mencapai **{selisih:.2f} meter** dengan {level} lain menunjukkan adanya potensi ketimpangan dampak perubahan iklim. Wilayah di peringkat atas ini adalah prioritas untuk program adaptasi masa depan."
         )
 
@@ -0,0 +1,77 @@
+# functions/numpy_model.py
+
+import os
+import numpy as np
+
+# Runner NumPy untuk model intent Dense->Dropout->Dense->softmax hasil export-keras-npz.py.
+# Tidak membutuhkan TensorFlow saat aplikasi dijalankan.
+
+def _relu(x):
+    return np.maximum(x, 0.0)
+
+def _softmax(x):
+    e = np.exp(x - x.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": _relu,
+    "softmax": _softmax,
+    "sigmoid": _sigmoid,
+    "tanh": np.tanh,
+}
+
+class NumpyDenseModel:
+    """
+    Forward pass model Dense bertumpuk dengan NumPy murni.
+    Dropout tidak disimpan karena tidak aktif saat inferensi.
+    """
+
+    def __init__(self, kernels, biases, activations):
+        for act in activations:
+            if act not in ACTIVATIONS:
+                raise ValueError(f"Aktivasi '{act}' belum didukung oleh NumpyDenseModel.")
+        self.kernels = [np.ascontiguousarray(k, dtype=np.float32) for k in kernels]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+        self.activations = list(activations)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            activations = [str(a) for a in data["activations"]]
+            kernels = [data[f"kernel_{i}"] for i in range(len(activations))]
+            biases = [data[f"bias_{i}"] for i in range(len(activations))]
+        return cls(kernels, biases, activations)
+
+    def save(self, path):
+        arrays = {"activations": np.array(self.activations)}
+        for i, (kernel, bias) in enumerate(zip(self.kernels, self.biases)):
+            arrays[f"kernel_{i}"] = kernel
+            arrays[f"bias_{i}"] = bias
+        np.savez_compressed(path, **arrays)
+
+    @property
+    def input_dim(self):
+        return self.kernels[0].shape[0]
+
+    def predict(self, x, verbose=0):
+        """Probabilitas kelas untuk input (n, input_dim); signature mengikuti `model.predict` Keras."""
+        h = np.asarray(x, dtype=np.float32)
+        for kernel, bias, act in zip(self.kernels, self.biases, self.activations):
+            h = ACTIVATIONS[act](h @ kernel + bias)
+        return h
+
+def load_intent_model(npz_path, keras_path):
+    """
+    NumpyDenseModel dari `npz_path`; jika export-keras-npz.py belum dijalankan, model Keras
+    `keras_path` dimuat apa adanya (TensorFlow hanya di-import pada jalur ini).
+    """
+    if os.path.exists(npz_path):
+        return NumpyDenseModel.load(npz_path)
+    if not os.path.exists(keras_path):
+        raise FileNotFoundError(f"Model '{npz_path}' maupun '{keras_path}' tidak ditemukan.")
+    import tensorflow as tf
+    return tf.keras.models.load_model(keras_path)
@@ -2,78 +2,453 @@
 
 import streamlit as st
 import pandas as pd
-import geopandas as gpd
-import xarray as xr
 import numpy as np
 import re
-import plotly.express as px
-import plotly.graph_objects as go
-from matplotlib import cm
-from matplotlib.colors import to_hex
-from shapely.geometry import Point
+import os
+import threading
+import time
+from collections import deque
+from functions.startup_profiler import lazy_import, timed
+from functions import aggregates, geo_cache, grid_store, ingest, region_stats, timeseries_store
+from functions.gazetteer import Gazetteer
+from functions.region_lookup import RegionLookup
+
+# geopandas, xarray, plotly, matplotlib, dan shapely sengaja tidak di-import di sini.
+# Semuanya dimuat lewat lazy_import() saat fungsi yang membutuhkannya pertama kali dipanggil,
+# sehingga intent teks (definisi_tml, dampak_tml, dst.) tidak menanggung biaya stack geospasial.
 
 # =============================================================================
 # 1. SETUP DAN PEMUATAN DATA UTAMA (DI-CACHE)
 # =============================================================================
 
-# FUNGSI BARU YANG SUDAH DIPERBAIKI
-@st.cache_data(show_spinner=False)
-def load_geospatial_data():
-    prov_gdf = gpd.read_file("shapefile/OSM/Batas_Provinsi_Laut_2024_OSM_LapakGIS.shp")
-    iho_gdf = gpd.read_file("shapefile/IHO/World_Seas_IHO_v3.shp").to_crs("EPSG:4326")
+# Level administratif dari yang terbesar ke terkecil
+ADMIN_LEVELS = ["provinsi", "kabupaten", "kecamatan", "desa"]
+
+# Mode compact: kolom wilayah categorical, sla float32, year int16, dan koordinat titik
+# dipindah ke tabel lookup terpisah (load_point_table) lewat kolom point_id
+COMPACT_TIMESERIES = True
 
-    # PERBAIKAN: Terapkan buffer hanya pada kolom 'geometry'
-    # Ini memastikan 'prov_gdf' tetap menjadi GeoDataFrame
-    original_crs = prov_gdf.crs
-    prov_gdf['geometry'] = prov_gdf.to_crs(epsg=3857).geometry.buffer(100000).to_crs(original_crs)
+TIMESERIES_PATHS = {
+    'observasi': "hasil_tml_obs_by_wilayah.parquet",
+    'proyeksi': "data/canesm5_tml_proj245_by_wilayah.parquet",
+}
+
+NETCDF_PATHS = {
+    'observasi': "sea_level_obs.nc",
+    'proyeksi': "data/predicted_ssh_monthly_1993-2014_9_canesm5_ssp245_2025-01-16_2100-12-16_indo.nc",
+    'tren_observasi': "SSH_trend_indo_1993_2024.nc",
+    'tren_proyeksi': "data/SSH_trend_canesm5_ssp245_2025_2100_CNN_LSTM.nc",
+}
+NETCDF_VARIABLES = {'observasi': 'sla', 'proyeksi': 'zos', 'tren_observasi': 'trend', 'tren_proyeksi': 'trend'}
 
-    return prov_gdf, iho_gdf
+# Batas wilayah admin (desa) untuk matriks bobot regrid NetCDF -> wilayah (lihat regrid.py)
+ADMIN_BOUNDARY_PATH = "38_prov_indo_kab.json"
 
-@st.cache_data(show_spinner=False)
-def load_timeseries_data(data_type: str):
+SHAPEFILE_PATHS = {
+    'provinsi': "shapefile/OSM/Batas_Provinsi_Laut_2024_OSM_LapakGIS.shp",
+    'laut': "shapefile/IHO/World_Seas_IHO_v3.shp",
+}
+
+# Mode render peta: "single" = satu trace dengan colorscale kontinu dan hovertemplate,
+# "binned" = satu trace per kelas warna dengan label hover per titik (cara lama)
+MAP_RENDER_MODE = "single"
+MAP_DEFAULT_ZOOM = 3.3
+# Pada zoom ini (dan lebih dekat) grid ditampilkan penuh; setiap 1 level zoom lebih jauh,
+# sel digabung 2x2 (rata-rata) jika peta diminta dengan parameter zoom
+MAP_FULL_RES_ZOOM = 5.0
+# Durasi build figure peta disimpan per mode, hanya N render terakhir (terpisah dari
+# profiler startup, yang hanya untuk biaya sekali jalan saat proses mulai)
+MAP_RENDER_WINDOW = 200
+
+# FUNGSI BARU YANG SUDAH DIPERBAIKI
+def prepare_geospatial_layers():
+    """Membaca shapefile mentah: IHO diproyeksi ke EPSG:4326, provinsi di-buffer 100 km."""
+    gpd = lazy_import("geopandas")
+    with timed("shapefile provinsi + IHO"):
+        prov_gdf = gpd.read_file(SHAPEFILE_PATHS['provinsi'])
+        iho_gdf = gpd.read_file(SHAPEFILE_PATHS['laut']).to_crs("EPSG:4326")
+
+        # PERBAIKAN: Terapkan buffer hanya pada kolom 'geometry'
+        # Ini memastikan 'prov_gdf' tetap menjadi GeoDataFrame
+        original_crs = prov_gdf.crs
+        prov_gdf['geometry'] = prov_gdf.to_crs(epsg=3857).geometry.buffer(100000).to_crs(original_crs)
+
+    return {'provinsi': prov_gdf, 'laut': iho_gdf}
+
+# cache_resource: GeoDataFrame dipakai read-only, jadi tidak perlu disalin di setiap panggilan
+@st.cache_resource(show_spinner=False)
+def load_geospatial_data():
     """
-    Memuat data timeseries dari file Parquet berdasarkan tipe (observasi/proyeksi).
-    Fungsi ini di-cache, sehingga setiap file hanya dibaca dari disk sekali.
+    (PROVINSI_GDF, IHO_GDF) dari cache GeoParquet jika masih sesuai dengan shapefile-nya.
+    Jika cache belum ada atau shapefile berubah, layer dihitung ulang lalu cache ditulis ulang.
     """
-    if data_type == 'observasi':
-        path = "hasil_tml_obs_by_wilayah.parquet"
-    elif data_type == 'proyeksi':
-        path = "data/canesm5_tml_proj245_by_wilayah.parquet"
-    else:
-        raise ValueError("Tipe data tidak valid. Pilih 'observasi' atau 'proyeksi'.")
-        
-    df = pd.read_parquet(path)
+    if all(geo_cache.is_current(name, path) for name, path in SHAPEFILE_PATHS.items()):
+        lazy_import("geopandas")
+        with timed("geoparquet provinsi + IHO"):
+            return geo_cache.read_layer('provinsi'), geo_cache.read_layer('laut')
+
+    layers = prepare_geospatial_layers()
+    for name, gdf in layers.items():
+        geo_cache.write_layer(name, gdf, SHAPEFILE_PATHS[name])
+    return layers['provinsi'], layers['laut']
+
+@st.cache_resource(show_spinner=False)
+def load_region_lookups():
+    """Index spasial laut (IHO) dan provinsi ber-buffer, dibangun sekali per proses."""
+    PROVINSI_GDF, IHO_GDF = load_geospatial_data()
+    with timed("index spasial laut + provinsi"):
+        return {
+            "laut": RegionLookup(IHO_GDF, ['NAME'], "Wilayah Tidak Diketahui"),
+            "provinsi": RegionLookup(PROVINSI_GDF, ['name_id', 'name'], "Jauh dari Daratan"),
+        }
+
+def _normalize_frame(df):
+    """time -> datetime, kolom year, nama wilayah huruf kecil tanpa spasi tepi."""
     df["time"] = pd.to_datetime(df["time"])
     df["year"] = df["time"].dt.year
 
     # Cast kolom teks penting
-    for col in ["provinsi", "kabupaten", "kecamatan", "desa"]:
+    for col in ADMIN_LEVELS:
         if col in df.columns:
             df[col] = df[col].astype(str).str.lower().str.strip()
+    return df
+
+def _source_version(data_type: str):
+    """mtime terbaru parquet sumber + file increment; kunci cache semua artefak turunan."""
+    return ingest.source_version(TIMESERIES_PATHS[data_type], data_type)
+
+def data_version():
+    """
+    Versi gabungan semua sumber data (parquet + increment, NetCDF, shapefile) untuk kunci
+    cache hasil di aplikasi; berubah setiap ada file sumber yang berubah.
+    """
+    mtimes = [_source_version(data_type) for data_type in TIMESERIES_PATHS]
+    for path in [*NETCDF_PATHS.values(), *SHAPEFILE_PATHS.values()]:
+        mtimes.append(os.path.getmtime(path) if os.path.exists(path) else None)
+    return ",".join(str(mtime) for mtime in mtimes)
+
+def _read_increment(path):
+    return _normalize_frame(pd.read_parquet(path))
+
+@st.cache_data(show_spinner=False)
+def _load_timeseries_frame(data_type: str, compact: bool, source_version: float):
+    path = TIMESERIES_PATHS[data_type]
+
+    with timed(f"parquet {data_type}"):
+        # Parquet sumber + increment hasil `python -m functions.ingest`
+        df = pd.concat([pd.read_parquet(p) for p in [path, *ingest.list_increments(data_type)]], ignore_index=True)
+        df = _normalize_frame(df)
+
+        # Urutkan hierarkis (provinsi, kabupaten, kecamatan, desa, time) sehingga setiap
+        # wilayah di level mana pun menempati baris yang bersebelahan (lihat RegionIndex)
+        keys = [df["time"].values.astype("int64")]
+        keys += [pd.factorize(df[col])[0] for col in reversed(ADMIN_LEVELS) if col in df.columns]
+        df = df.iloc[np.lexsort(keys)].reset_index(drop=True)
+
+        if compact:
+            df = _compact_frame(df)
 
     return df
 
-# Memuat data geospasial sekali di awal
-PROVINSI_GDF, IHO_GDF = load_geospatial_data()
+def load_timeseries_data(data_type: str, compact: bool = COMPACT_TIMESERIES):
+    """
+    Memuat data timeseries dari file Parquet berdasarkan tipe (observasi/proyeksi).
+    Fungsi ini di-cache, sehingga setiap file hanya dibaca dari disk sekali (dan dibaca ulang
+    hanya jika parquet sumber atau increment-nya berubah).
+    Dengan `compact=True` frame disimpan dalam representasi hemat memori (lihat _compact_frame).
+    """
+    if data_type not in TIMESERIES_PATHS:
+        raise ValueError("Tipe data tidak valid. Pilih 'observasi' atau 'proyeksi'.")
+    return _load_timeseries_frame(data_type, compact, _source_version(data_type))
+
+def _point_ids(df):
+    """ID titik grid yang stabil: urutan (latitude, longitude) unik, tidak tergantung urutan baris."""
+    return df.groupby(["latitude", "longitude"], sort=True).ngroup().astype("int32")
+
+def _compact_frame(df):
+    """Kolom wilayah -> category, sla -> float32, year -> int16, latitude/longitude -> point_id."""
+    out = pd.DataFrame(index=df.index)
+    for col in df.columns:
+        if col in ("latitude", "longitude"):
+            continue
+        if col in ADMIN_LEVELS:
+            out[col] = df[col].astype("category")
+        elif col == "sla":
+            out[col] = df[col].astype("float32")
+        elif col == "year":
+            out[col] = df[col].astype("int16")
+        else:
+            out[col] = df[col]
+    if "latitude" in df.columns and "longitude" in df.columns:
+        out["point_id"] = _point_ids(df)
+    return out
+
+@st.cache_data(show_spinner=False)
+def load_point_table(data_type: str):
+    """
+    Tabel lookup point_id -> (latitude, longitude) untuk frame compact.
+    Parquet hasil rata-rata wilayah (regrid) tidak punya kolom titik: tabel kosong.
+    """
+    import pyarrow.parquet as pq
+
+    if "latitude" not in pq.read_schema(TIMESERIES_PATHS[data_type]).names:
+        return pd.DataFrame({"point_id": pd.Series(dtype="int64"), "latitude": pd.Series(dtype="float64"),
+                             "longitude": pd.Series(dtype="float64")})
+    points = pd.read_parquet(TIMESERIES_PATHS[data_type], columns=["latitude", "longitude"])
+    points = points.drop_duplicates().sort_values(["latitude", "longitude"]).reset_index(drop=True)
+    points.index.name = "point_id"
+    return points.reset_index()
+
+def timeseries_memory_report(data_type: str):
+    """
+    Perbandingan memori per kolom (bytes) antara frame biasa dan compact,
+    termasuk tabel lookup titik pada sisi compact.
+    """
+    before = load_timeseries_data(data_type, compact=False).memory_usage(deep=True, index=False)
+    after = load_timeseries_data(data_type, compact=True).memory_usage(deep=True, index=False)
+    after["point_table"] = load_point_table(data_type).memory_usage(deep=True, index=False).sum()
+
+    report = pd.DataFrame({"bytes_sebelum": before, "bytes_sesudah": after}).fillna(0).astype("int64")
+    report.loc["TOTAL"] = report.sum()
+    report["rasio"] = (report["bytes_sesudah"] / report["bytes_sebelum"].where(report["bytes_sebelum"] > 0)).round(3)
+    return report
+
+class RegionIndex:
+    """
+    Indeks nama wilayah -> rentang baris pada frame hasil load_timeseries_data.
+    Karena frame terurut hierarkis, satu wilayah = satu atau beberapa slice
+    (beberapa jika nama yang sama muncul di induk berbeda).
+    """
+
+    def __init__(self, df):
+        self.n_rows = len(df)
+        self.ranges = {}
+        levels = [col for col in ADMIN_LEVELS if col in df.columns]
+        changed = np.zeros(len(df), dtype=bool)
+        if len(df):
+            changed[0] = True
+        for level in levels:
+            codes, uniques = pd.factorize(df[level])
+            changed[1:] |= codes[1:] != codes[:-1]
+            starts = np.flatnonzero(changed)
+            stops = np.append(starts[1:], len(df))
+            level_ranges = {}
+            for name_code, start, stop in zip(codes[starts], starts, stops):
+                level_ranges.setdefault(uniques[name_code], []).append((int(start), int(stop)))
+            self.ranges[level] = level_ranges
+
+    def lookup(self, level, name):
+        return self.ranges.get(level, {}).get(str(name).lower().strip(), [])
+
+    def select(self, df, level, name):
+        """Baris milik wilayah `name` pada `level` (tanpa scan string seluruh kolom)."""
+        if len(df) != self.n_rows:
+            raise ValueError("RegionIndex tidak cocok dengan frame yang diberikan.")
+        ranges = self.lookup(level, name)
+        if not ranges:
+            return df.iloc[0:0]
+        if len(ranges) == 1:
+            start, stop = ranges[0]
+            return df.iloc[start:stop]
+        return pd.concat([df.iloc[start:stop] for start, stop in ranges])
+
+@st.cache_resource(show_spinner=False)
+def _load_region_index(data_type: str, source_version: float):
+    with timed(f"region index {data_type}"):
+        return RegionIndex(load_timeseries_data(data_type))
+
+def load_region_index(data_type: str):
+    """RegionIndex untuk frame `data_type`, dibangun sekali per versi data."""
+    return _load_region_index(data_type, _source_version(data_type))
+
+def _sync_aggregates(data_type: str):
+    """
+    Menyelaraskan agregat tersimpan dengan data: build penuh jika belum ada atau parquet
+    sumber berubah, selain itu hanya increment yang belum diterapkan yang digabungkan.
+    """
+    source_path = TIMESERIES_PATHS[data_type]
+    pending = None if aggregates.is_stale(data_type, source_path) else \
+        ingest.pending_increments(aggregates.applied_increments(data_type), data_type)
+    if pending is None:
+        with timed(f"rebuild agregat {data_type}"):
+            aggregates.build_aggregates(data_type, load_timeseries_data(data_type), source_path,
+                                        increments=ingest.increment_names(data_type))
+        return
+    for path in pending:
+        with timed(f"increment agregat {data_type}"):
+            aggregates.apply_increment(data_type, _read_increment(path), os.path.basename(path))
+
+@st.cache_resource(show_spinner=False)
+def _load_aggregate_store(data_type: str, source_version: float):
+    """
+    AggregateStore untuk `data_type`. Agregat dibangun ulang otomatis jika belum ada
+    atau parquet sumber berubah, dan diperbarui per increment; `source_version` membuat
+    cache ini ikut kedaluwarsa.
+    """
+    _sync_aggregates(data_type)
+    with timed(f"agregat {data_type}"):
+        return aggregates.AggregateStore.load(data_type)
+
+def load_aggregates(data_type: str):
+    """Agregat bulanan/tahunan (nasional & per wilayah) yang selalu sinkron dengan parquet sumber."""
+    return _load_aggregate_store(data_type, _source_version(data_type))
+
+def _sync_partitioned(data_type: str):
+    """
+    True jika dataset terpartisi bisa dipakai untuk versi data saat ini. Increment yang belum
+    ada ditambahkan sebagai file baru; dataset yang dibangun dari parquet sumber lama
+    (atau memuat increment yang sudah dihapus) harus dibangun ulang secara manual.
+    """
+    out_dir = timeseries_store.partition_path(data_type)
+    if not timeseries_store.is_current(out_dir, TIMESERIES_PATHS[data_type]):
+        return False
+    pending = ingest.pending_increments(timeseries_store.applied_increments(out_dir), data_type)
+    if pending is None:
+        return False
+    for path in pending:
+        with timed(f"increment dataset terpartisi {data_type}"):
+            timeseries_store.append_partitioned(_read_increment(path), out_dir, os.path.basename(path))
+    return True
+
+@st.cache_resource(show_spinner=False)
+def _load_partitioned_store(data_type: str, source_version: float):
+    """Pembaca dataset terpartisi jika sudah dibangun dari parquet sumber saat ini, selain itu None."""
+    if not _sync_partitioned(data_type):
+        return None
+    with timed(f"dataset terpartisi {data_type}"):
+        return timeseries_store.PartitionedTimeseries(timeseries_store.partition_path(data_type))
+
+def load_partitioned_store(data_type: str):
+    return _load_partitioned_store(data_type, _source_version(data_type))
+
+def _sync_region_cubes(data_type: str):
+    """
+    Cube wilayah x tahun dari file tersimpan, diperbarui dengan increment yang belum diterapkan.
+    Dibangun penuh dari frame lengkap hanya jika belum ada atau parquet sumber berubah.
+    """
+    source_path = TIMESERIES_PATHS[data_type]
+    stat = os.stat(source_path)
+    meta = region_stats.read_cube_meta(data_type)
+    pending = None
+    if meta and meta.get("mtime") == stat.st_mtime and meta.get("size") == stat.st_size:
+        pending = ingest.pending_increments(meta.get("increments"), data_type)
+
+    if pending is None:
+        with timed(f"region cube {data_type}"):
+            cubes = region_stats.build_cubes(load_timeseries_data(data_type))
+        increments = ingest.increment_names(data_type)
+    else:
+        with timed(f"region cube {data_type}"):
+            cubes = region_stats.load_cubes(data_type)
+        if not pending:
+            return cubes
+        for path in pending:
+            with timed(f"increment region cube {data_type}"):
+                cubes = region_stats.merge_cubes(cubes, region_stats.build_cubes(_read_increment(path)))
+        increments = meta["increments"] + [os.path.basename(path) for path in pending]
+
+    region_stats.save_cubes(data_type, cubes, {"source": source_path, "mtime": stat.st_mtime,
+                                               "size": stat.st_size, "increments": increments})
+    return cubes
+
+@st.cache_resource(show_spinner=False)
+def _load_region_cubes(data_type: str, source_version: float):
+    """Matriks jumlah/cacah SLA wilayah x tahun per level; dasar tabel ranking dan tren."""
+    return _sync_region_cubes(data_type)
+
+def load_region_cubes(data_type: str):
+    """RegionYearCube per level untuk `data_type`, ikut kedaluwarsa jika parquet sumber/increment berubah."""
+    return _load_region_cubes(data_type, _source_version(data_type))
+
+@st.cache_resource(show_spinner=False)
+def _load_region_trends(data_type: str, source_version: float):
+    """Tren OLS (mm/tahun, intercept, r2, galat baku) semua wilayah + nasional, sekali per versi data."""
+    cubes = _load_region_cubes(data_type, source_version)
+    with timed(f"tren wilayah {data_type}"):
+        trends = region_stats.build_trends(cubes)
+        trends["nasional"] = region_stats.national_trend(cubes)
+        return trends
+
+def load_region_trends(data_type: str):
+    return _load_region_trends(data_type, _source_version(data_type))
+
+def apply_increments(data_type: str):
+    """
+    Menerapkan increment baru ke semua artefak turunan (agregat, dataset terpartisi,
+    cube wilayah untuk ranking & tren). Mengembalikan durasi per artefak dalam detik.
+    """
+    durations = {}
+    for name, sync in (("agregat", _sync_aggregates), ("dataset terpartisi", _sync_partitioned),
+                       ("cube wilayah", _sync_region_cubes)):
+        started = time.perf_counter()
+        sync(data_type)
+        durations[name] = time.perf_counter() - started
+    return durations
+
+@st.cache_resource(show_spinner=False)
+def _load_gazetteer(data_type: str, source_version: float):
+    with timed(f"gazetteer {data_type}"):
+        store = load_partitioned_store(data_type)
+        if store is not None:
+            regions = store.catalog
+        else:
+            df = load_timeseries_data(data_type)
+            regions = df[[col for col in ADMIN_LEVELS if col in df.columns]].drop_duplicates()
+        return Gazetteer(regions)
+
+def load_gazetteer(data_type: str):
+    """Gazetteer nama wilayah untuk `data_type`, dari katalog dataset terpartisi atau frame lengkap."""
+    return _load_gazetteer(data_type, _source_version(data_type))
+
+def _select_region(data_type, level, names, tahun=None, parents=None):
+    """
+    Baris untuk satu atau beberapa wilayah (opsional satu tahun).
+    `parents` = dict induk (mis. {"kabupaten": ..., "provinsi": ...}) untuk satu nama, atau list
+    sejajar dengan `names` (None untuk nama yang unik); hanya baris di induk tersebut yang diambil.
+    Jika dataset terpartisi tersedia, hanya partisi/row group yang cocok yang dibaca;
+    jika belum, frame lengkap dipakai dengan RegionIndex.
+    """
+    names = (names,) if isinstance(names, str) else tuple(names)
+    if isinstance(parents, dict) or parents is None:
+        parents = [parents] * len(names)
+    # dict -> tuple agar bisa di-hash oleh st.cache_data
+    parents = tuple(tuple(sorted(p.items())) if p else None for p in parents)
+    return _select_region_cached(data_type, level, names, tahun, parents, _source_version(data_type))
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _select_region_cached(data_type, level, names, tahun, parents, source_version):
+    store = load_partitioned_store(data_type)
+    if store is not None:
+        if not any(parents):
+            return store.read(level=level, names=list(names), tahun=tahun)
+        return pd.concat([store.read(level=level, names=name, tahun=tahun, parents=dict(p or ()))
+                          for name, p in zip(names, parents)], ignore_index=True)
+
+    df = load_timeseries_data(data_type)
+    index = load_region_index(data_type)
+    frames = []
+    for name, p in zip(names, parents):
+        df_name = index.select(df, level, name)
+        for col, value in p or ():
+            if col in df_name.columns:
+                df_name = df_name[df_name[col] == value]
+        frames.append(df_name)
+    df_region = pd.concat(frames)
+    if tahun:
+        df_region = df_region[df_region["year"] == int(tahun)]
+    return df_region
+
+# Data geospasial (PROVINSI_GDF/IHO_GDF) tidak lagi dimuat saat import;
+# load_region_lookups() memuatnya saat peta pertama kali membutuhkan label wilayah.
 
 # =============================================================================
 # 2. FUNGSI-FUNGSI HELPER INTERNAL
 # =============================================================================
 
-def _get_region(gdf, lat, lon, region_col_names, default_val):
-    """Fungsi generik untuk mendapatkan wilayah dari koordinat."""
-    point = Point(lon, lat)
-    point_gdf = gpd.GeoDataFrame(index=[0], geometry=[point], crs="EPSG:4326")
-    match = gpd.sjoin(point_gdf, gdf, how="left", predicate="within")
-    
-    if match.empty or match.iloc[0].isnull().any():
-        return default_val
-        
-    for col in region_col_names:
-        if col in match.columns and pd.notna(match.iloc[0][col]):
-            return match.iloc[0][col]
-            
-    return default_val
+def _get_region(layer, lat, lon):
+    """Nama wilayah ("laut" atau "provinsi") untuk satu titik atau array titik."""
+    labels = load_region_lookups()[layer].query(lat, lon)
+    return labels if np.ndim(lat) else labels[0]
 
 # Dictionary terjemahan nama laut
 SEA_NAME_TRANSLATION = {
@@ -92,120 +467,174 @@ def _translate_sea_name(name):
     return SEA_NAME_TRANSLATION.get(name, name)
 
 def _extract_top_n(text, default=10):
-    match = re.search(r"(\d+)", text)
+    # Angka 4 digit adalah tahun, bukan jumlah baris
+    match = re.search(r"(?<!\d)(\d{1,3})(?!\d)", text or "")
     return int(match.group(1)) if match else default
 
+_YEAR_RANGE_RE = re.compile(r"((?:19|20)\d{2})\s*(?:-|–|sampai|hingga|s/d|sd|ke)\s*((?:19|20)\d{2})")
+_YEAR_RE = re.compile(r"(?<!\d)((?:19|20)\d{2})(?!\d)")
+_RANKING_PROVINCE_RE = re.compile(
+    r"provinsi\s+([a-z][a-z\s\.\-]*?)(?=\s+(?:tahun|periode|dari|antara|sejak|selama|pada|berdasarkan)\b|\s*\d|[?,!]|$)"
+)
+_RANKING_LEVEL_RE = re.compile(
+    r"(?:ranking|peringkat|daftar|top|urutan|urutkan|tampilkan)\s+(?:\d+\s+)?(kabupaten|kecamatan)\b"
+)
+_ASCENDING_WORDS = ("terendah", "terbawah", "paling rendah", "paling bawah")
+_TREND_RANKING_RE = re.compile(r"\b(?:tren|laju|tercepat|paling cepat|terlambat|paling lambat)\b")
+_TREND_ASCENDING_WORDS = ("terlambat", "paling lambat")
+
+def _extract_year_range(text):
+    """(awal, akhir) dari "2000-2010", "2000 sampai 2010", atau satu tahun; None jika tidak ada."""
+    text = text or ""
+    match = _YEAR_RANGE_RE.search(text)
+    if match:
+        start, end = sorted((int(match.group(1)), int(match.group(2))))
+        return start, end
+    match = _YEAR_RE.search(text)
+    return (int(match.group(1)),) * 2 if match else None
+
+def _extract_ranking_filters(data_type, level, text):
+    """Filter ranking dari teks pengguna: level (kabupaten/kecamatan), provinsi, rentang tahun, arah urutan."""
+    text = (text or "").lower()
+    level_match = _RANKING_LEVEL_RE.search(text)
+    if level == "desa" and level_match:
+        level = level_match.group(1)
+
+    filters = {}
+    province_match = _RANKING_PROVINCE_RE.search(text)
+    if level != "provinsi" and province_match:
+        resolved = load_gazetteer(data_type).resolve("provinsi", province_match.group(1))
+        if resolved["name"]:
+            filters["provinsi"] = resolved["name"]
+
+    ascending = any(word in text for word in _ASCENDING_WORDS + _TREND_ASCENDING_WORDS)
+    return level, filters, _extract_year_range(text), ascending
+
+def ranking_context(data_type, level, text):
+    """Arah urutan dan filter aktif untuk narasi ranking, dari teks yang sama dengan tabelnya."""
+    _, filters, year_range, ascending = _extract_ranking_filters(data_type, level, text)
+    is_trend = bool(_TREND_RANKING_RE.search((text or "").lower()))
+    return {
+        "ascending": ascending,
+        "filter_provinsi": filters.get("provinsi"),
+        "year_range": None if is_trend else year_range, # ranking tren selalu memakai seluruh periode
+    }
+
 # =============================================================================
 # 3. FUNGSI PLOTTING PUBLIK (Dipanggil oleh Chatbot)
 # =============================================================================
 
 ### ----- FUNGSI PLOT TIME SERIES & TREN ----- ###
 
-def _generic_timeseries_plot(data_type, level, name, tahun=None, return_df=False):
+def _generic_timeseries_plot(data_type, level, name, tahun=None, return_df=False, parents=None):
     """Fungsi internal generik untuk plot time series per lokasi."""
-    df = load_timeseries_data(data_type)
-    df_filtered = df[df[level].str.lower() == name.lower()]
-    if tahun:
-        df_filtered = df_filtered[df_filtered["year"] == int(tahun)]
+    df_filtered = _select_region(data_type, level, name, int(tahun) if tahun else None, parents)
     if df_filtered.empty: return None, None
     
     df_grouped = df_filtered.groupby("time")["sla"].mean().reset_index()
     data_type_title = "Proyeksi " if data_type == 'proyeksi' else ""
     title = f"{data_type_title}TML {level.title()} {name.title()}" + (f" Tahun {tahun}" if tahun else "")
+    px = lazy_import("plotly.express")
     fig = px.line(df_grouped, x="time", y="sla", title=title, labels={"sla": "Tinggi Muka Laut (m)", "time": "Waktu"})
     return (fig, df_grouped) if return_df else fig
 
-def _generic_trend_plot(data_type, level, name, return_df=False):
+def _generic_trend_plot(data_type, level, name, return_df=False, parents=None):
     """Fungsi internal generik untuk membuat plot tren."""
-    df_full = load_timeseries_data(data_type)
-    df_filtered = df_full[df_full[level].str.lower() == name.lower()]
-    if df_filtered.empty: return (None, None, None) if return_df else None
+    if parents: # nama dipakai di beberapa induk: seri tahunan hanya dari wilayah di induk yang diminta
+        df_region = _select_region(data_type, level, name, parents=parents)
+        df_yearly = df_region.groupby("year")["sla"].mean().reset_index()
+    else:
+        df_yearly = load_aggregates(data_type).yearly(level, name)
+    if df_yearly.empty: return (None, None, None) if return_df else None
         
-    df_yearly = df_filtered.groupby("year")["sla"].mean().reset_index()
-    slope = np.polyfit(df_yearly["year"], df_yearly["sla"], 1)[0] * 1000 # konversi ke mm/tahun
+    trend = load_region_trends(data_type)[level].lookup(name, parents)
+    if trend is not None:
+        slope = trend["tren_mm"]
+    else: # nama dipakai di beberapa induk: seri agregat menggabungkan semuanya
+        slope = np.polyfit(df_yearly["year"], df_yearly["sla"], 1)[0] * 1000 # konversi ke mm/tahun
     
     data_type_title = "Proyeksi " if data_type == 'proyeksi' else ""
     title = f"Tren {data_type_title}TML {level.title()} {name.title()}"
+    px = lazy_import("plotly.express")
     fig = px.line(df_yearly, x="year", y="sla", title=title, markers=True, labels={"sla": "Tinggi Muka Laut (m)", "year": "Tahun"})
     
     return (fig, df_yearly, slope) if return_df else fig
 
-def plot_tml_desa(desa, tahun=None, return_df=False):
-    return _generic_timeseries_plot('observasi', 'desa', desa, tahun, return_df)
+def plot_tml_desa(desa, tahun=None, return_df=False, parents=None):
+    return _generic_timeseries_plot('observasi', 'desa', desa, tahun, return_df, parents)
 
-def plot_proyeksi_tml_desa(desa, tahun=None, return_df=False):
-    return _generic_timeseries_plot('proyeksi', 'desa', desa, tahun, return_df)
+def plot_proyeksi_tml_desa(desa, tahun=None, return_df=False, parents=None):
+    return _generic_timeseries_plot('proyeksi', 'desa', desa, tahun, return_df, parents)
 
-def tren_tml_desa(desa, return_df=False):
-    return _generic_trend_plot('observasi', 'desa', desa, return_df)
+def tren_tml_desa(desa, return_df=False, parents=None):
+    return _generic_trend_plot('observasi', 'desa', desa, return_df, parents)
 
-def tren_proyeksi_tml_desa(desa, return_df=False):
-    return _generic_trend_plot('proyeksi', 'desa', desa, return_df)
+def tren_proyeksi_tml_desa(desa, return_df=False, parents=None):
+    return _generic_trend_plot('proyeksi', 'desa', desa, return_df, parents)
 
-def tren_tml_kecamatan(kecamatan, return_df=False):
-    return _generic_trend_plot('observasi', 'kecamatan', kecamatan, return_df)
+def tren_tml_kecamatan(kecamatan, return_df=False, parents=None):
+    return _generic_trend_plot('observasi', 'kecamatan', kecamatan, return_df, parents)
 
-def tren_proyeksi_tml_kecamatan(kecamatan, return_df=False):
-    return _generic_trend_plot('proyeksi', 'kecamatan', kecamatan, return_df)
+def tren_proyeksi_tml_kecamatan(kecamatan, return_df=False, parents=None):
+    return _generic_trend_plot('proyeksi', 'kecamatan', kecamatan, return_df, parents)
 
-def tren_tml_kabupaten(kabupaten, return_df=False):
-    return _generic_trend_plot('observasi', 'kabupaten', kabupaten, return_df)
+def tren_tml_kabupaten(kabupaten, return_df=False, parents=None):
+    return _generic_trend_plot('observasi', 'kabupaten', kabupaten, return_df, parents)
 
-def tren_proyeksi_tml_kabupaten(kabupaten, return_df=False):
-    return _generic_trend_plot('proyeksi', 'kabupaten', kabupaten, return_df)
+def tren_proyeksi_tml_kabupaten(kabupaten, return_df=False, parents=None):
+    return _generic_trend_plot('proyeksi', 'kabupaten', kabupaten, return_df, parents)
 
 ### ----- FUNGSI PLOT BAR CHART ----- ###
 
-def _create_yearly_timeseries_chart(data_type, level, name, tahun, return_df=False):
+def _create_yearly_timeseries_chart(data_type, level, name, tahun, return_df=False, parents=None):
     """
     Fungsi internal generik untuk membuat LINE CHART rata-rata bulanan
     untuk satu wilayah (kabupaten/kecamatan) pada tahun tertentu.
     """
-    df_full = load_timeseries_data(data_type)
-    
-    df_filtered = df_full[
-        (df_full[level] == name.lower()) &
-        (df_full["year"] == int(tahun))
-    ]
+    if parents: # nama dipakai di beberapa induk: rata-rata hanya dari wilayah di induk yang diminta
+        df_region = _select_region(data_type, level, name, int(tahun), parents)
+        df_avg = df_region.groupby("time")["sla"].mean().reset_index()
+    else:
+        # Rata-rata TML seluruh wilayah per tanggal (bulanan) diambil dari cube agregat
+        df_monthly = load_aggregates(data_type).monthly(level, name)
+        df_avg = df_monthly[df_monthly["time"].dt.year == int(tahun)].reset_index(drop=True)
     
-    if df_filtered.empty:
+    if df_avg.empty:
         return None, None
-        
-    # Agregasi: Hitung rata-rata TML untuk seluruh wilayah per tanggal (bulanan)
-    df_avg = df_filtered.groupby("time")["sla"].mean().reset_index()
     
     title_prefix = "Proyeksi " if data_type == 'proyeksi' else ""
     title = f"Rata-rata Bulanan {title_prefix}TML di {level.title()} {name.title()} ({tahun})"
+    px = lazy_import("plotly.express")
     fig = px.line(df_avg, x="time", y="sla", title=title, labels={"sla": "TML Rata-rata (m)", "time": "Bulan"}, markers=True)
     
     return (fig, df_avg) if return_df else fig
 
-def grafik_tahunan_kabupaten(kabupaten, tahun, return_df=False):
-    return _create_yearly_timeseries_chart('observasi', 'kabupaten', kabupaten, tahun, return_df)
+def grafik_tahunan_kabupaten(kabupaten, tahun, return_df=False, parents=None):
+    return _create_yearly_timeseries_chart('observasi', 'kabupaten', kabupaten, tahun, return_df, parents)
 
-def grafik_proyeksi_tahunan_kabupaten(kabupaten, tahun, return_df=False):
-    return _create_yearly_timeseries_chart('proyeksi', 'kabupaten', kabupaten, tahun, return_df)
+def grafik_proyeksi_tahunan_kabupaten(kabupaten, tahun, return_df=False, parents=None):
+    return _create_yearly_timeseries_chart('proyeksi', 'kabupaten', kabupaten, tahun, return_df, parents)
 
-def grafik_tahunan_kecamatan(kecamatan, tahun, return_df=False):
-    return _create_yearly_timeseries_chart('observasi', 'kecamatan', kecamatan, tahun, return_df)
+def grafik_tahunan_kecamatan(kecamatan, tahun, return_df=False, parents=None):
+    return _create_yearly_timeseries_chart('observasi', 'kecamatan', kecamatan, tahun, return_df, parents)
 
-def grafik_proyeksi_tahunan_kecamatan(kecamatan, tahun, return_df=False):
-    return _create_yearly_timeseries_chart('proyeksi', 'kecamatan', kecamatan, tahun, return_df)
+def grafik_proyeksi_tahunan_kecamatan(kecamatan, tahun, return_df=False, parents=None):
+    return _create_yearly_timeseries_chart('proyeksi', 'kecamatan', kecamatan, tahun, return_df, parents)
 
 ### ----- FUNGSI PLOT TREN NASIONAL ----- ###
 
 def _generic_national_trend_plot(data_type, return_df=False):
     """Fungsi internal generik untuk membuat plot tren nasional."""
-    df_full = load_timeseries_data(data_type)
-    if df_full.empty: return (None, None, None) if return_df else None
+    df_yearly = load_aggregates(data_type).yearly()
+    if df_yearly.empty: return (None, None, None) if return_df else None
     
-    df_yearly = df_full.groupby("year")["sla"].mean().reset_index()
-    slope = np.polyfit(df_yearly["year"], df_yearly["sla"], 1)[0] * 1000 # konversi ke mm/tahun
+    slope = load_region_trends(data_type)["nasional"]["tren_mm"]
     
     data_type_title = "Proyeksi " if data_type == 'proyeksi' else ""
     period = "2025-2100" if data_type == 'proyeksi' else "1993-2023"
     title = f"Tren {data_type_title}TML Rata-Rata Nasional ({period})"
     
+    px = lazy_import("plotly.express")
     fig = px.line(df_yearly, x="year", y="sla", title=title, markers=True, labels={"sla": "Tinggi Muka Laut (m)", "year": "Tahun"})
     
     return (fig, df_yearly, slope) if return_df else fig
@@ -219,57 +648,64 @@ def tren_proyeksi_tml_nasional(return_df=False):
 ### ----- FUNGSI PLOT TAHUNAN & PERBANDINGAN ----- ###
 
 def plot_tml_tahunan(tahun, return_df=False):
-    df = load_timeseries_data('observasi')
-    df_tahun = df[df["year"] == int(tahun)]
-    if df_tahun.empty: return (None, None) if return_df else None
-    df_grouped = df_tahun.groupby("time")["sla"].mean().reset_index()
+    df_monthly = load_aggregates('observasi').monthly()
+    df_grouped = df_monthly[df_monthly["time"].dt.year == int(tahun)].reset_index(drop=True)
+    if df_grouped.empty: return (None, None) if return_df else None
     title = f"TML Rata-Rata Nasional Tahun {tahun}"
+    px = lazy_import("plotly.express")
     fig = px.line(df_grouped, x="time", y="sla", title=title, labels={"sla": "Tinggi Muka Laut (m)", "time": "Bulan"})
     return (fig, df_grouped) if return_df else fig
 
 def plot_proyeksi_tml_tahunan(tahun, return_df=False):
-    df = load_timeseries_data('proyeksi')
-    df_tahun = df[df["year"] == int(tahun)]
-    if df_tahun.empty: return (None, None) if return_df else None
-    df_grouped = df_tahun.groupby("time")["sla"].mean().reset_index()
+    df_monthly = load_aggregates('proyeksi').monthly()
+    df_grouped = df_monthly[df_monthly["time"].dt.year == int(tahun)].reset_index(drop=True)
+    if df_grouped.empty: return (None, None) if return_df else None
     title = f"Proyeksi TML Rata-Rata Nasional Tahun {tahun}"
+    px = lazy_import("plotly.express")
     fig = px.line(df_grouped, x="time", y="sla", title=title, labels={"sla": "Tinggi Muka Laut (m)", "time": "Bulan"})
     return (fig, df_grouped) if return_df else fig
 
-def _generic_comparison_plot(data_type, level, name1, name2, return_df=False):
+def _generic_comparison_plot(data_type, level, name1, name2, return_df=False, parents=None):
     """Fungsi internal generik untuk membandingkan dua wilayah."""
-    df_full = load_timeseries_data(data_type)
-    df_filtered = df_full[df_full[level].str.lower().isin([name1.lower(), name2.lower()])]
+    df_filtered = _select_region(data_type, level, (name1, name2), parents=parents or [None, None])
     if df_filtered.empty: return (None, None) if return_df else None
 
-    df_agg = df_filtered.groupby(["time", level])["sla"].mean().reset_index()
+    df_agg = df_filtered.groupby(["time", level], observed=True)["sla"].mean().reset_index()
     data_type_title = "Proyeksi " if data_type == 'proyeksi' else ""
     title = f"Perbandingan {data_type_title}TML: {name1.title()} vs {name2.title()}"
+    px = lazy_import("plotly.express")
     fig = px.line(df_agg, x="time", y="sla", color=level, title=title, labels={"sla": "Tinggi Muka Laut (m)", "time": "Waktu"})
     return (fig, df_agg) if return_df else fig
 
-def plot_bandingkan_desa(desa1, desa2, return_df=False):
-    return _generic_comparison_plot('observasi', 'desa', desa1, desa2, return_df)
+def plot_bandingkan_desa(desa1, desa2, return_df=False, parents=None):
+    return _generic_comparison_plot('observasi', 'desa', desa1, desa2, return_df, parents)
 
-def plot_proyeksi_bandingkan_desa(desa1, desa2, return_df=False):
-    return _generic_comparison_plot('proyeksi', 'desa', desa1, desa2, return_df)
+def plot_proyeksi_bandingkan_desa(desa1, desa2, return_df=False, parents=None):
+    return _generic_comparison_plot('proyeksi', 'desa', desa1, desa2, return_df, parents)
 
-def plot_bandingkan_provinsi(provinsi1, provinsi2, return_df=False):
-    return _generic_comparison_plot('observasi', 'provinsi', provinsi1, provinsi2, return_df)
+def plot_bandingkan_provinsi(provinsi1, provinsi2, return_df=False, parents=None):
+    return _generic_comparison_plot('observasi', 'provinsi', provinsi1, provinsi2, return_df, parents)
 
-def plot_proyeksi_bandingkan_provinsi(provinsi1, provinsi2, return_df=False):
-    return _generic_comparison_plot('proyeksi', 'provinsi', provinsi1, provinsi2, return_df)
+def plot_proyeksi_bandingkan_provinsi(provinsi1, provinsi2, return_df=False, parents=None):
+    return _generic_comparison_plot('proyeksi', 'provinsi', provinsi1, provinsi2, return_df, parents)
 
 ### ----- FUNGSI RANKING ----- ###
 
 def _generic_ranking_table(data_type, level, text, ascending=False):
-    """Fungsi internal generik untuk membuat tabel ranking."""
-    df_full = load_timeseries_data(data_type)
+    """
+    Fungsi internal generik untuk membuat tabel ranking.
+    Rata-rata per wilayah sudah dihitung dan diurutkan sekali per dataset (load_region_cubes);
+    filter provinsi/rentang tahun/level kabupaten-kecamatan dari `text` dilayani lewat
+    seleksi parsial atas matriks tersebut, bukan groupby ulang.
+    """
+    if _TREND_RANKING_RE.search((text or "").lower()):
+        return _generic_trend_ranking_table(data_type, level, text, ascending)
+
     top_n = _extract_top_n(text)
-    
-    group_cols = ['desa', 'kecamatan', 'kabupaten', 'provinsi'] if level == 'desa' else ['provinsi']
-    df_rank = df_full.groupby(group_cols)["sla"].mean().reset_index()
-    df_rank = df_rank.sort_values(by="sla", ascending=ascending).head(top_n)
+    level, filters, year_range, text_ascending = _extract_ranking_filters(data_type, level, text)
+
+    cube = load_region_cubes(data_type)[level]
+    df_rank = cube.top(top_n, ascending=ascending or text_ascending, filters=filters, year_range=year_range)
     
     # Formatting
     df_rank.columns = [col.title() for col in df_rank.columns]
@@ -279,6 +715,24 @@ def _generic_ranking_table(data_type, level, text, ascending=False):
     
     return df_rank.reset_index(drop=True)
 
+def _generic_trend_ranking_table(data_type, level, text, ascending=False):
+    """Tabel ranking wilayah berdasarkan laju tren (mm/tahun), langsung dari tren yang sudah dihitung."""
+    top_n = _extract_top_n(text)
+    level, filters, _, text_ascending = _extract_ranking_filters(data_type, level, text)
+
+    trends = load_region_trends(data_type)[level]
+    df_rank = trends.top(top_n, ascending=ascending or text_ascending, filters=filters)
+    df_rank = df_rank[[*region_stats.LEVEL_COLUMNS[level], "tren_mm", "r2"]]
+
+    # Formatting
+    df_rank.columns = [col.title() for col in df_rank.columns]
+    df_rank = df_rank.rename(columns={"Tren_Mm": "Tren TML (mm/tahun)", "R2": "R²"})
+    df_rank["Tren TML (mm/tahun)"] = df_rank["Tren TML (mm/tahun)"].round(2)
+    df_rank["R²"] = df_rank["R²"].round(2)
+    df_rank.insert(0, "Peringkat", range(1, len(df_rank) + 1))
+
+    return df_rank.reset_index(drop=True)
+
 def ranking_tml_desa(text=None):
     return _generic_ranking_table('observasi', 'desa', text)
 
@@ -291,6 +745,30 @@ def ranking_tml_provinsi(text=None):
 def ranking_proyeksi_tml_provinsi(text=None):
     return _generic_ranking_table('proyeksi', 'provinsi', text)
 
+def ranking_tml_kabupaten(text=None):
+    return _generic_ranking_table('observasi', 'kabupaten', text)
+
+def ranking_proyeksi_tml_kabupaten(text=None):
+    return _generic_ranking_table('proyeksi', 'kabupaten', text)
+
+def ranking_tml_kecamatan(text=None):
+    return _generic_ranking_table('observasi', 'kecamatan', text)
+
+def ranking_proyeksi_tml_kecamatan(text=None):
+    return _generic_ranking_table('proyeksi', 'kecamatan', text)
+
+def ranking_tren_tml_desa(text=None):
+    return _generic_trend_ranking_table('observasi', 'desa', text)
+
+def ranking_tren_proyeksi_tml_desa(text=None):
+    return _generic_trend_ranking_table('proyeksi', 'desa', text)
+
+def ranking_tren_tml_provinsi(text=None):
+    return _generic_trend_ranking_table('observasi', 'provinsi', text)
+
+def ranking_tren_proyeksi_tml_provinsi(text=None):
+    return _generic_trend_ranking_table('proyeksi', 'provinsi', text)
+
 # =============================================================================
 # 4. FUNGSI PLOTTING PETA (Logikanya berbeda, jadi dipisah)
 # =============================================================================
@@ -298,87 +776,209 @@ def ranking_proyeksi_tml_provinsi(text=None):
 @st.cache_data(show_spinner=False)
 def _load_netcdf_data(data_type: str):
     """Memuat data NetCDF untuk peta."""
-    if data_type == 'observasi':
-        return xr.open_dataset("sea_level_obs.nc")
-    elif data_type == 'proyeksi':
-        return xr.open_dataset("data/predicted_ssh_monthly_1993-2014_9_canesm5_ssp245_2025-01-16_2100-12-16_indo.nc")
-    elif data_type == 'tren_observasi':
-        return xr.open_dataset("SSH_trend_indo_1993_2024.nc")
-    elif data_type == 'tren_proyeksi':
-        return xr.open_dataset("data/SSH_trend_canesm5_ssp245_2025_2100_CNN_LSTM.nc")
-    raise ValueError("Tipe data NetCDF tidak valid.")
-
-def _generic_map_plotter(data_type, year=None, return_regions=False):
-    """Fungsi generik terpusat untuk membuat semua jenis peta."""
+    if data_type not in NETCDF_PATHS:
+        raise ValueError("Tipe data NetCDF tidak valid.")
+    xr = lazy_import("xarray")
+    with timed(f"netcdf {data_type}"):
+        return xr.open_dataset(NETCDF_PATHS[data_type])
+
+def build_grid_store(data_type: str):
+    """Menulis grid rata-rata tahunan (atau grid tren) `data_type` ke store memory-mapped."""
     ds = _load_netcdf_data(data_type)
-    
-    # Ekstraksi variabel berdasarkan tipe data
+    data_array = ds[NETCDF_VARIABLES[data_type]]
+    out_dir = grid_store.grid_path(data_type)
     if 'tren' in data_type:
-        sla_var = ds['trend']
-        title = f"Peta Tren {'Proyeksi ' if 'proyeksi' in data_type else ''}TML"
-        hover_text = "Tren TML: {z:.2f} mm/year"
-        colorbar_label = "Tren (mm/year)"
-        zmin, zmax = -5, 5
-    else:
-        var_name = 'zos' if 'proyeksi' in data_type else 'sla'
-        sla_agg = ds[var_name].groupby("time.year").mean("time")
-        if year not in sla_agg.year.values: return (None,)*5 if return_regions else None
-        sla_var = sla_agg.sel(year=year)
-        title = f"Peta {'Proyeksi ' if 'proyeksi' in data_type else ''}TML Tahun {year}"
-        hover_text = "TML: {z:.3f} m"
-        colorbar_label = "Tinggi Muka Laut (m)"
-        zmin, zmax = -0.25, 0.25
-
-    lat_flat = np.repeat(ds['latitude'].values, len(ds['longitude'].values))
-    lon_flat = np.tile(ds['longitude'].values, len(ds['latitude'].values))
-    sla_flat = sla_var.values.flatten()
+        return grid_store.build_trend_grid(data_array, out_dir, NETCDF_PATHS[data_type])
+    return grid_store.build_yearly_grids(data_array, out_dir, NETCDF_PATHS[data_type])
 
+@st.cache_resource(show_spinner=False)
+def _load_grid_store(data_type: str, source_mtime: float):
+    """
+    GridStore untuk `data_type`. Store dibangun sekali jika belum ada atau NetCDF sumber
+    berubah; setelah itu setiap peta hanya membaca satu slice 2-D dari memmap.
+    """
+    if data_type not in NETCDF_PATHS:
+        raise ValueError("Tipe data NetCDF tidak valid.")
+    out_dir = grid_store.grid_path(data_type)
+    if not grid_store.is_current(out_dir, NETCDF_PATHS[data_type]):
+        with timed(f"rebuild grid {data_type}"):
+            build_grid_store(data_type)
+    return grid_store.GridStore(out_dir)
+
+def load_grid_store(data_type: str):
+    return _load_grid_store(data_type, os.path.getmtime(NETCDF_PATHS[data_type]))
+
+def _grid_stride(zoom):
+    """Faktor penggabungan sel untuk level zoom (1 = resolusi penuh)."""
+    if zoom is None or zoom >= MAP_FULL_RES_ZOOM:
+        return 1
+    return int(2 ** np.floor(MAP_FULL_RES_ZOOM - zoom))
+
+def _coarsen_grid(latitude, longitude, grid, stride):
+    """Rata-rata blok stride x stride (NaN diabaikan) beserta koordinat pusat bloknya."""
+    if stride <= 1:
+        return latitude, longitude, np.asarray(grid)
+    n_lat = -(-len(latitude) // stride) * stride
+    n_lon = -(-len(longitude) // stride) * stride
+    padded = np.full((n_lat, n_lon), np.nan, dtype=np.float32)
+    padded[:len(latitude), :len(longitude)] = grid
+    blocks = padded.reshape(n_lat // stride, stride, n_lon // stride, stride)
+    counts = (~np.isnan(blocks)).sum(axis=(1, 3))
+    sums = np.nansum(blocks, axis=(1, 3))
+    coarse = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+    lat = np.pad(latitude, (0, n_lat - len(latitude)), mode="edge").reshape(-1, stride).mean(axis=1)
+    lon = np.pad(longitude, (0, n_lon - len(longitude)), mode="edge").reshape(-1, stride).mean(axis=1)
+    return lat, lon, coarse
+
+def _flatten_valid(latitude, longitude, grid):
+    lat_flat = np.repeat(latitude, len(longitude))
+    lon_flat = np.tile(longitude, len(latitude))
+    sla_flat = np.asarray(grid).ravel()
     mask = ~np.isnan(sla_flat)
-    lat_valid, lon_valid, sla_valid = lat_flat[mask], lon_flat[mask], sla_flat[mask]
-
-    # Ekstrak info wilayah
-    if return_regions:
-        max_idx, min_idx = np.argmax(sla_valid), np.argmin(sla_valid)
-        region_max = _translate_sea_name(_get_region(IHO_GDF, lat_valid[max_idx], lon_valid[max_idx], ['NAME'], "Wilayah Tidak Diketahui"))
-        region_min = _translate_sea_name(_get_region(IHO_GDF, lat_valid[min_idx], lon_valid[min_idx], ['NAME'], "Wilayah Tidak Diketahui"))
-        prov_max = _get_region(PROVINSI_GDF, lat_valid[max_idx], lon_valid[max_idx], ['name_id', 'name'], "Jauh dari Daratan")
-        prov_min = _get_region(PROVINSI_GDF, lat_valid[min_idx], lon_valid[min_idx], ['name_id', 'name'], "Jauh dari Daratan")
-    
-    # Pengaturan warna dan binning
+    return lat_flat[mask], lon_flat[mask], sla_flat[mask]
+
+def _coolwarm(n):
+    cm = lazy_import("matplotlib.cm")
+    to_hex = lazy_import("matplotlib.colors").to_hex
+    cmap = cm.get_cmap('coolwarm', n)
+    return [to_hex(cmap(i)) for i in range(cmap.N)]
+
+def _binned_map_traces(lat_valid, lon_valid, sla_valid, style):
+    """Satu trace per kelas warna, label hover diformat per titik di Python."""
+    go = lazy_import("plotly.graph_objects")
+    zmin, zmax = style["zmin"], style["zmax"]
     bins = np.linspace(zmin, zmax, 11)
-    cmap = cm.get_cmap('coolwarm', 10)
-    colors = [to_hex(cmap(i)) for i in range(cmap.N)]
-    colors_ext = [to_hex(cmap(0))] + colors + [to_hex(cmap(cmap.N - 1))]
+    colors = _coolwarm(10)
+    colors_ext = [colors[0]] + colors + [colors[-1]]
     bin_indices = np.digitize(sla_valid, bins)
     
-    # Membuat plot
-    fig = go.Figure()
+    traces = []
     for i in range(len(colors_ext)):
         mask_i = bin_indices == i
         if not np.any(mask_i): continue
-        fig.add_trace(go.Scattermapbox(
+        traces.append(go.Scattermapbox(
             lat=lat_valid[mask_i], lon=lon_valid[mask_i], mode="markers",
             marker=dict(size=3.5, color=colors_ext[i]),
             hoverinfo="text",
-            text=[f"Lat: {lt:.2f}<br>Lon: {ln:.2f}<br>" + hover_text.format(z=z) 
+            text=[f"Lat: {lt:.2f}<br>Lon: {ln:.2f}<br>" + style["hover_text"].format(z=z) 
                   for lt, ln, z in zip(lat_valid[mask_i], lon_valid[mask_i], sla_valid[mask_i])],
             showlegend=False
         ))
+    return traces
+
+def _single_map_trace(lat_valid, lon_valid, sla_valid, style, marker_size=3.5):
+    """Satu trace: warna kontinu dari nilai numerik, hover dirender oleh plotly di browser."""
+    go = lazy_import("plotly.graph_objects")
+    colors = _coolwarm(11)
+    colorscale = [[i / (len(colors) - 1), c] for i, c in enumerate(colors)]
+    return [go.Scattermapbox(
+        lat=lat_valid, lon=lon_valid, mode="markers",
+        marker=dict(
+            size=marker_size, color=sla_valid, colorscale=colorscale,
+            cmin=style["zmin"], cmax=style["zmax"],
+            colorbar=dict(title=style["colorbar_label"], thickness=12),
+        ),
+        customdata=sla_valid,
+        hovertemplate="Lat: %{lat:.2f}<br>Lon: %{lon:.2f}<br>" + style["hover_template"] + "<extra></extra>",
+        showlegend=False
+    )]
+
+_RENDER_TIMINGS = {}  # mode -> deque durasi (detik), maksimal MAP_RENDER_WINDOW
+_RENDER_LOCK = threading.Lock()
+
+def _record_render(mode, seconds):
+    with _RENDER_LOCK:
+        _RENDER_TIMINGS.setdefault(mode, deque(maxlen=MAP_RENDER_WINDOW)).append(seconds)
+
+def map_render_report():
+    """Statistik durasi build figure peta per mode (ms) atas MAP_RENDER_WINDOW render terakhir."""
+    with _RENDER_LOCK:
+        samples = {mode: np.array(values) * 1000.0 for mode, values in _RENDER_TIMINGS.items()}
+    return {
+        mode: {
+            "n": len(ms),
+            "rata_ms": round(float(ms.mean()), 1),
+            "p50_ms": round(float(np.percentile(ms, 50)), 1),
+            "p95_ms": round(float(np.percentile(ms, 95)), 1),
+            "maks_ms": round(float(ms.max()), 1),
+        }
+        for mode, ms in samples.items() if len(ms)
+    }
+
+def _generic_map_plotter(data_type, year=None, return_regions=False, mode=None, zoom=None):
+    """
+    Fungsi generik terpusat untuk membuat semua jenis peta.
+    `mode` memilih "single" atau "binned" (default MAP_RENDER_MODE); `zoom` mengaktifkan
+    penggabungan sel grid sesuai level zoom (lihat MAP_FULL_RES_ZOOM).
+    """
+    mode = mode or MAP_RENDER_MODE
+    store = load_grid_store(data_type)
+    
+    # Ekstraksi variabel berdasarkan tipe data
+    if 'tren' in data_type:
+        sla_var = store.get()
+        title = f"Peta Tren {'Proyeksi ' if 'proyeksi' in data_type else ''}TML"
+        style = {"hover_text": "Tren TML: {z:.2f} mm/year", "hover_template": "Tren TML: %{customdata:.2f} mm/year",
+                 "colorbar_label": "Tren (mm/year)", "zmin": -5, "zmax": 5}
+    else:
+        sla_var = store.get(year)
+        if sla_var is None: return (None,)*5 if return_regions else None
+        title = f"Peta {'Proyeksi ' if 'proyeksi' in data_type else ''}TML Tahun {year}"
+        style = {"hover_text": "TML: {z:.3f} m", "hover_template": "TML: %{customdata:.3f} m",
+                 "colorbar_label": "Tinggi Muka Laut (m)", "zmin": -0.25, "zmax": 0.25}
+
+    lat_valid, lon_valid, sla_valid = _flatten_valid(store.latitude, store.longitude, sla_var)
+
+    # Ekstrak info wilayah (selalu dari grid resolusi penuh)
+    if return_regions:
+        extremes = [np.argmax(sla_valid), np.argmin(sla_valid)]
+        region_max, region_min = map(_translate_sea_name, _get_region("laut", lat_valid[extremes], lon_valid[extremes]))
+        prov_max, prov_min = _get_region("provinsi", lat_valid[extremes], lon_valid[extremes])
+
+    stride = _grid_stride(zoom)
+    if stride > 1:
+        lat_valid, lon_valid, sla_valid = _flatten_valid(*_coarsen_grid(store.latitude, store.longitude, sla_var, stride))
+    
+    # Membuat plot
+    go = lazy_import("plotly.graph_objects")
+    started = time.perf_counter()
+    if mode == "binned":
+        traces = _binned_map_traces(lat_valid, lon_valid, sla_valid, style)
+    else:
+        traces = _single_map_trace(lat_valid, lon_valid, sla_valid, style, marker_size=3.5 * min(stride, 3))
+    fig = go.Figure(data=traces)
+    _record_render(mode, time.perf_counter() - started)
 
     fig.update_layout(
         title={'text': title, 'x': 0.5},
         mapbox_style="carto-positron",
-        mapbox_zoom=3.3,
+        mapbox_zoom=MAP_DEFAULT_ZOOM if zoom is None else zoom,
         mapbox_center={"lat": -2, "lon": 118},
         margin={"r":0,"t":40,"l":0,"b":0}
     )
-    
-    # (Kode untuk colorbar bisa ditambahkan di sini jika diinginkan)
 
     if return_regions:
         return fig, region_max, region_min, prov_max, prov_min
     return fig
 
+def compare_map_modes(data_type, year=None, zoom=None):
+    """Waktu build figure dan ukuran JSON-nya untuk mode "binned" dan "single"."""
+    rows = []
+    for mode in ("binned", "single"):
+        started = time.perf_counter()
+        fig = _generic_map_plotter(data_type, year, mode=mode, zoom=zoom)
+        build_ms = (time.perf_counter() - started) * 1000.0
+        if fig is None:
+            continue
+        rows.append({
+            "mode": mode,
+            "trace": len(fig.data),
+            "titik": int(sum(len(trace.lat) for trace in fig.data)),
+            "build_ms": round(build_ms, 1),
+            "json_kb": round(len(fig.to_json()) / 1024.0, 1),
+        })
+    return pd.DataFrame(rows)
+
 def peta_tml_tahun(year, return_regions=False): return _generic_map_plotter('observasi', year, return_regions)
 def peta_proyeksi_tml_tahun(year, return_regions=False): return _generic_map_plotter('proyeksi', year, return_regions)
 def peta_tren_tml_nasional(return_regions=False): return _generic_map_plotter('tren_observasi', None, return_regions)
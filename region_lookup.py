@@ -0,0 +1,54 @@
+# functions/region_lookup.py
+
+import numpy as np
+
+# =============================================================================
+# LOOKUP WILAYAH DARI KOORDINAT (STRtree + PREPARED GEOMETRY)
+# =============================================================================
+
+
+class RegionLookup:
+    """
+    Index spasial untuk satu layer poligon (laut IHO, provinsi ber-buffer, dst.).
+    STRtree dan geometri prepared dibangun sekali; query titik tunggal maupun batch
+    hanya menguji poligon kandidat dari bounding box-nya.
+    """
+
+    def __init__(self, gdf, name_columns, default):
+        import shapely
+
+        self._shapely = shapely
+        self.default = default
+        self.geometries = np.asarray(gdf.geometry.values, dtype=object)
+        shapely.prepare(self.geometries)
+        self._tree = shapely.STRtree(self.geometries)
+
+        # Label per poligon: kolom nama pertama yang terisi, selain itu `default`
+        labels = np.full(len(gdf), default, dtype=object)
+        for col in reversed([c for c in name_columns if c in gdf.columns]):
+            values = gdf[col].to_numpy(dtype=object)
+            filled = ~gdf[col].isna().to_numpy()
+            labels[filled] = values[filled]
+        self.labels = labels
+
+    def query(self, lat, lon):
+        """
+        Label wilayah untuk array (lat, lon). Jika titik berada di beberapa poligon,
+        poligon dengan urutan baris terkecil yang dipakai (sama seperti sjoin sebelumnya).
+        """
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        points = self._shapely.points(lon, lat)
+        point_idx, geom_idx = self._tree.query(points, predicate="within")
+
+        out = np.full(len(points), self.default, dtype=object)
+        if len(point_idx):
+            order = np.lexsort((geom_idx, point_idx))
+            point_idx, geom_idx = point_idx[order], geom_idx[order]
+            first = np.unique(point_idx, return_index=True)[1]
+            out[point_idx[first]] = self.labels[geom_idx[first]]
+        return out
+
+    def lookup(self, lat, lon):
+        """Label wilayah untuk satu titik."""
+        return self.query([lat], [lon])[0]
@@ -0,0 +1,300 @@
+# functions/region_stats.py
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# =============================================================================
+# MATRIKS WILAYAH x TAHUN (JUMLAH & CACAH SLA) UNTUK RANKING DAN TREN
+# =============================================================================
+
+# Cube tersimpan di samping agregat: <data_type>_cubes.npz + <data_type>_cubes.meta.json
+CUBE_DIR = "data/aggregates"
+
+# Kolom identitas wilayah per level ranking (level itu sendiri + induknya)
+LEVEL_COLUMNS = {
+    "desa": ["desa", "kecamatan", "kabupaten", "provinsi"],
+    "kecamatan": ["kecamatan", "kabupaten", "provinsi"],
+    "kabupaten": ["kabupaten", "provinsi"],
+    "provinsi": ["provinsi"],
+}
+
+
+class RegionYearCube:
+    """
+    Jumlah dan cacah SLA per (wilayah, tahun) untuk satu level administratif.
+    Rata-rata untuk rentang tahun mana pun = jumlah / cacah pada kolom tahun tersebut,
+    sehingga sama persis dengan groupby pada data mentah.
+    """
+
+    def __init__(self, level, regions, years, sums, counts):
+        self.level = level
+        self.regions = regions
+        self.years = np.asarray(years)
+        self.sums = sums
+        self.counts = counts
+
+        # Rata-rata seluruh periode, diurutkan sekali (descending) untuk permintaan tanpa filter
+        self.overall_mean = self._mean(self.sums.sum(axis=1), self.counts.sum(axis=1))
+        self.order_desc = np.argsort(-self.overall_mean, kind="stable")
+        self.order_desc = self.order_desc[~np.isnan(self.overall_mean[self.order_desc])]
+
+    @classmethod
+    def from_frame(cls, df, level):
+        """Cube dari frame timeseries (kolom wilayah, year, sla)."""
+        cols = [col for col in LEVEL_COLUMNS[level] if col in df.columns]
+        region_codes = df.groupby(cols, observed=True, sort=True).ngroup().to_numpy()
+        # Baris pertama tiap kode grup -> tabel wilayah yang urutannya sama dengan kode
+        _, first_rows = np.unique(region_codes, return_index=True)
+        regions = df[cols].iloc[first_rows].astype(str).reset_index(drop=True)
+        years, year_codes = np.unique(df["year"].to_numpy(), return_inverse=True)
+
+        n_regions, n_years = len(regions), len(years)
+        flat = region_codes * n_years + year_codes
+        sla = df["sla"].to_numpy(dtype=np.float64)
+        sums = np.bincount(flat, weights=sla, minlength=n_regions * n_years).reshape(n_regions, n_years)
+        counts = np.bincount(flat, minlength=n_regions * n_years).reshape(n_regions, n_years)
+        return cls(level, regions, years, sums, counts)
+
+    def merge(self, other):
+        """Cube gabungan (jumlah & cacah dijumlahkan) dengan `other`, mis. cube dari baris increment."""
+        cols = list(self.regions.columns)
+        regions = (
+            pd.concat([self.regions, other.regions], ignore_index=True)
+            .drop_duplicates().sort_values(cols).reset_index(drop=True)
+        )
+        index = pd.MultiIndex.from_frame(regions)
+        years = np.union1d(self.years, other.years)
+        sums = np.zeros((len(regions), len(years)), dtype=np.float64)
+        counts = np.zeros((len(regions), len(years)), dtype=np.int64)
+        for cube in (self, other):
+            rows = index.get_indexer(pd.MultiIndex.from_frame(cube.regions[cols]))
+            year_cols = np.searchsorted(years, cube.years)
+            sums[np.ix_(rows, year_cols)] += cube.sums
+            counts[np.ix_(rows, year_cols)] += cube.counts
+        return RegionYearCube(self.level, regions, years, sums, counts)
+
+    @staticmethod
+    def _mean(sums, counts):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+    def year_mask(self, year_range=None):
+        if year_range is None:
+            return np.ones(len(self.years), dtype=bool)
+        start, end = year_range
+        return (self.years >= int(start)) & (self.years <= int(end))
+
+    def region_mask(self, filters=None):
+        """Mask wilayah untuk filter induk, mis. {"provinsi": "jawa timur"}."""
+        mask = np.ones(len(self.regions), dtype=bool)
+        for col, value in (filters or {}).items():
+            if col in self.regions.columns and value:
+                mask &= self.regions[col].to_numpy() == str(value).lower().strip()
+        return mask
+
+    def yearly_mean(self):
+        """Matriks rata-rata tahunan (wilayah x tahun), NaN jika tidak ada data."""
+        return self._mean(self.sums, self.counts)
+
+    def top(self, n, ascending=False, filters=None, year_range=None):
+        """
+        N wilayah dengan rata-rata SLA tertinggi (atau terendah). Tanpa filter cukup slice
+        dari urutan yang sudah dihitung; dengan filter memakai argpartition pada subset.
+        """
+        if not filters and year_range is None:
+            order = self.order_desc[::-1] if ascending else self.order_desc
+            idx = order[:n]
+            means = self.overall_mean[idx]
+        else:
+            cols = self.year_mask(year_range)
+            means_all = self._mean(self.sums[:, cols].sum(axis=1), self.counts[:, cols].sum(axis=1))
+            candidates = np.flatnonzero(self.region_mask(filters) & ~np.isnan(means_all))
+            if candidates.size == 0:
+                return self._frame(np.array([], dtype=int), np.array([]))
+            values = means_all[candidates] if ascending else -means_all[candidates]
+            if n < candidates.size:
+                part = np.argpartition(values, n - 1)[:n]
+            else:
+                part = np.arange(candidates.size)
+            part = part[np.argsort(values[part], kind="stable")]
+            idx = candidates[part]
+            means = means_all[idx]
+        return self._frame(idx, means)
+
+    def _frame(self, idx, means):
+        out = self.regions.iloc[idx].reset_index(drop=True)
+        out["sla"] = means
+        return out
+
+
+def build_cubes(df, levels=("desa", "kecamatan", "kabupaten", "provinsi")):
+    """RegionYearCube untuk setiap level yang kolomnya tersedia di `df`."""
+    return {level: RegionYearCube.from_frame(df, level) for level in levels if level in df.columns}
+
+
+def merge_cubes(cubes, other):
+    """Menggabungkan cube per level (mis. cube tersimpan + cube dari increment baru)."""
+    return {level: cube.merge(other[level]) if level in other else cube for level, cube in cubes.items()}
+
+
+def _cube_paths(data_type, out_dir=CUBE_DIR):
+    return {
+        "data": os.path.join(out_dir, f"{data_type}_cubes.npz"),
+        "meta": os.path.join(out_dir, f"{data_type}_cubes.meta.json"),
+    }
+
+
+def read_cube_meta(data_type, out_dir=CUBE_DIR):
+    path = _cube_paths(data_type, out_dir)["meta"]
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_cubes(data_type, cubes, meta, out_dir=CUBE_DIR):
+    """Menyimpan jumlah/cacah/tahun/wilayah setiap level ke satu .npz beserta metadata-nya."""
+    os.makedirs(out_dir, exist_ok=True)
+    arrays = {}
+    for level, cube in cubes.items():
+        arrays[f"{level}__sums"] = cube.sums
+        arrays[f"{level}__counts"] = cube.counts
+        arrays[f"{level}__years"] = cube.years
+        for col in cube.regions.columns:
+            arrays[f"{level}__region__{col}"] = cube.regions[col].to_numpy(dtype=str)
+    paths = _cube_paths(data_type, out_dir)
+    np.savez(paths["data"], **arrays)
+    with open(paths["meta"], "w") as f:
+        json.dump(dict(meta, levels=list(cubes)), f, indent=2)
+
+
+def load_cubes(data_type, out_dir=CUBE_DIR):
+    paths = _cube_paths(data_type, out_dir)
+    with open(paths["meta"], "r") as f:
+        levels = json.load(f)["levels"]
+    cubes = {}
+    with np.load(paths["data"]) as data:
+        for level in levels:
+            cols = [col for col in LEVEL_COLUMNS[level] if f"{level}__region__{col}" in data]
+            regions = pd.DataFrame({col: data[f"{level}__region__{col}"].astype(object) for col in cols})
+            cubes[level] = RegionYearCube(level, regions, data[f"{level}__years"],
+                                          data[f"{level}__sums"], data[f"{level}__counts"])
+    return cubes
+
+
+# =============================================================================
+# TREN LINEAR (OLS) SEMUA WILAYAH SEKALIGUS
+# =============================================================================
+
+def fit_trends(years, yearly):
+    """
+    OLS bentuk tertutup y = intercept + slope * tahun untuk setiap baris `yearly`
+    (wilayah x tahun, NaN = tahun tanpa data). Mengembalikan dict array:
+    slope (m/tahun), intercept, r2, stderr (galat baku slope), n_years.
+    """
+    yearly = np.atleast_2d(np.asarray(yearly, dtype=np.float64))
+    x0 = float(np.mean(years))
+    x = np.asarray(years, dtype=np.float64) - x0  # dipusatkan agar stabil secara numerik
+    mask = ~np.isnan(yearly)
+    y = np.where(mask, yearly, 0.0)
+
+    n = mask.sum(axis=1).astype(np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x_mean = (mask @ x) / n
+        y_mean = y.sum(axis=1) / n
+        sxx = (mask @ (x * x)) - n * x_mean ** 2
+        sxy = (y @ x) - n * x_mean * y_mean
+        syy = (y * y).sum(axis=1) - n * y_mean ** 2
+
+        slope = sxy / sxx
+        intercept = y_mean - slope * (x_mean + x0)
+        ss_res = np.maximum(syy - slope * sxy, 0.0)
+        r2 = np.where(syy > 0, 1.0 - ss_res / syy, np.nan)
+        stderr = np.where(n > 2, np.sqrt(ss_res / (n - 2) / sxx), np.nan)
+
+    valid = (n >= 2) & (sxx > 0)
+    nan = np.full_like(slope, np.nan)
+    return {
+        "slope": np.where(valid, slope, nan),
+        "intercept": np.where(valid, intercept, nan),
+        "r2": np.where(valid, r2, nan),
+        "stderr": np.where(valid, stderr, nan),
+        "n_years": n.astype(np.int32),
+    }
+
+
+class TrendTable:
+    """
+    Tren semua wilayah pada satu level, dihitung sekali dari RegionYearCube.
+    Kolom `tren_mm` dan `stderr_mm` dalam mm/tahun, sama dengan np.polyfit(...)[0] * 1000.
+    """
+
+    def __init__(self, regions, years, yearly, level):
+        self.level = level
+        fit = fit_trends(years, yearly)
+        self.table = regions.reset_index(drop=True).assign(
+            tren_mm=fit["slope"] * 1000,
+            intercept=fit["intercept"],
+            r2=fit["r2"],
+            stderr_mm=fit["stderr"] * 1000,
+            n_tahun=fit["n_years"],
+        )
+        # Nama -> baris; nama yang dipakai di lebih dari satu induk tidak punya entri tunggal
+        names = self.table[level].to_numpy() if level in self.table.columns else np.array([])
+        unique, counts = np.unique(names, return_counts=True)
+        single = set(unique[counts == 1])
+        self._row_of = {name: i for i, name in enumerate(names) if name in single}
+        self._order_desc = self.table["tren_mm"].sort_values(ascending=False, kind="stable").dropna().index.to_numpy()
+
+    @classmethod
+    def from_cube(cls, cube):
+        return cls(cube.regions, cube.years, cube.yearly_mean(), cube.level)
+
+    def lookup(self, name, parents=None):
+        """
+        Baris tren (Series) untuk nama wilayah, None jika tidak ada atau ambigu.
+        `parents` (mis. {"kabupaten": ..., "provinsi": ...}) memilih satu dari nama yang sama di induk berbeda.
+        """
+        name = str(name).lower().strip()
+        if not parents:
+            row = self._row_of.get(name)
+            return None if row is None else self.table.iloc[row]
+        mask = self.table[self.level].to_numpy() == name
+        for col, value in parents.items():
+            if col in self.table.columns and value:
+                mask &= self.table[col].to_numpy() == str(value).lower().strip()
+        rows = np.flatnonzero(mask)
+        return self.table.iloc[rows[0]] if len(rows) == 1 else None
+
+    def top(self, n, ascending=False, filters=None):
+        """N wilayah dengan tren tercepat (atau terlambat), opsional difilter per induk."""
+        order = self._order_desc[::-1] if ascending else self._order_desc
+        if filters:
+            mask = np.ones(len(self.table), dtype=bool)
+            for col, value in filters.items():
+                if col in self.table.columns and value:
+                    mask &= self.table[col].to_numpy() == str(value).lower().strip()
+            order = order[mask[order]]
+        return self.table.iloc[order[:n]].reset_index(drop=True)
+
+
+def national_trend(cubes):
+    """Tren rata-rata nasional (semua titik per tahun) dari cube level mana pun."""
+    cube = next(iter(cubes.values()))
+    yearly = RegionYearCube._mean(cube.sums.sum(axis=0), cube.counts.sum(axis=0))
+    fit = fit_trends(cube.years, yearly[np.newaxis, :])
+    return {
+        "tren_mm": float(fit["slope"][0] * 1000),
+        "intercept": float(fit["intercept"][0]),
+        "r2": float(fit["r2"][0]),
+        "stderr_mm": float(fit["stderr"][0] * 1000),
+        "n_tahun": int(fit["n_years"][0]),
+    }
+
+
+def build_trends(cubes):
+    """TrendTable per level dari hasil build_cubes()."""
+    return {level: TrendTable.from_cube(cube) for level, cube in cubes.items()}
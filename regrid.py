@@ -0,0 +1,151 @@
+# functions/regrid.py
+
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+# =============================================================================
+# MATRIKS BOBOT LUAS (WILAYAH x SEL GRID) UNTUK RATA-RATA SLA PER WILAYAH
+# =============================================================================
+#
+# Setiap baris matriks = satu poligon wilayah, setiap kolom = satu sel grid NetCDF
+# (urutan ravel lat x lon). Nilainya luas irisan poligon-sel dalam km² (EPSG:6933,
+# equal-area). Rata-rata wilayah untuk satu field 2-D:
+#     (W @ where(valid, x, 0)) / (W @ valid)
+# sehingga sel NaN (daratan / data kosong) otomatis keluar dari bobot di setiap timestep.
+
+REGRID_DIR = "data/regrid"
+EQUAL_AREA_CRS = "EPSG:6933"
+ADMIN_RENAME = {"WADMPR": "provinsi", "WADMKK": "kabupaten", "WADMKC": "kecamatan", "WADMKD": "desa"}
+
+
+def _cell_edges(centers):
+    """Batas sel dari koordinat pusat (grid naik maupun turun): array (n, 2) [bawah, atas]."""
+    centers = np.asarray(centers, dtype=np.float64)
+    if len(centers) == 1:
+        return np.array([[centers[0] - 0.5, centers[0] + 0.5]])
+    mid = (centers[:-1] + centers[1:]) / 2.0
+    edges = np.concatenate([[2 * centers[0] - mid[0]], mid, [2 * centers[-1] - mid[-1]]])
+    return np.column_stack([np.minimum(edges[:-1], edges[1:]), np.maximum(edges[:-1], edges[1:])])
+
+
+def grid_key(latitude, longitude, admin_path):
+    """Kunci cache: hash koordinat grid + isi file batas wilayah."""
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(latitude, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(longitude, dtype=np.float64).tobytes())
+    with open(admin_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+class RegionRegridder:
+    """Matriks bobot sparse (CSR) + tabel wilayah per baris + koordinat grid."""
+
+    def __init__(self, weights, regions, latitude, longitude):
+        self.weights = weights.tocsr()
+        self.regions = regions.reset_index(drop=True)
+        self.latitude = np.asarray(latitude)
+        self.longitude = np.asarray(longitude)
+
+    @classmethod
+    def build(cls, admin_gdf, latitude, longitude):
+        """Luas irisan setiap poligon dengan setiap sel grid yang bersinggungan dengannya."""
+        import geopandas as gpd
+        import scipy.sparse as sp
+        import shapely
+
+        lat_edges, lon_edges = _cell_edges(latitude), _cell_edges(longitude)
+        lat_idx, lon_idx = np.indices((len(latitude), len(longitude)))
+        lat_idx, lon_idx = lat_idx.ravel(), lon_idx.ravel()
+        cells = gpd.GeoSeries(
+            shapely.box(lon_edges[lon_idx, 0], lat_edges[lat_idx, 0], lon_edges[lon_idx, 1], lat_edges[lat_idx, 1]),
+            crs="EPSG:4326",
+        )
+        polygons = admin_gdf.to_crs("EPSG:4326").geometry.reset_index(drop=True)
+
+        # Kandidat pasangan dari STRtree, lalu luas irisan di proyeksi equal-area
+        region_ids, cell_ids = shapely.STRtree(cells.values).query(polygons.values, predicate="intersects")
+        poly_area = gpd.GeoSeries(polygons.values[region_ids], crs="EPSG:4326").to_crs(EQUAL_AREA_CRS)
+        cell_area = gpd.GeoSeries(cells.values[cell_ids], crs="EPSG:4326").to_crs(EQUAL_AREA_CRS)
+        areas = shapely.area(shapely.intersection(poly_area.values, cell_area.values)) / 1e6
+        keep = areas > 0
+
+        weights = sp.csr_matrix(
+            (areas[keep], (region_ids[keep], cell_ids[keep])),
+            shape=(len(polygons), len(cells)),
+        )
+        region_cols = [col for col in ADMIN_RENAME if col in admin_gdf.columns]
+        regions = admin_gdf[region_cols].rename(columns=ADMIN_RENAME).reset_index(drop=True)
+        return cls(weights, regions, latitude, longitude)
+
+    def save(self, out_dir, meta=None):
+        import scipy.sparse as sp
+
+        os.makedirs(out_dir, exist_ok=True)
+        sp.save_npz(os.path.join(out_dir, "weights.npz"), self.weights)
+        self.regions.to_parquet(os.path.join(out_dir, "regions.parquet"), index=False)
+        np.save(os.path.join(out_dir, "latitude.npy"), self.latitude)
+        np.save(os.path.join(out_dir, "longitude.npy"), self.longitude)
+        with open(os.path.join(out_dir, "_meta.json"), "w") as f:
+            json.dump(dict(meta or {}, shape=list(self.weights.shape), nnz=int(self.weights.nnz)), f, indent=2)
+
+    @classmethod
+    def load(cls, out_dir):
+        import scipy.sparse as sp
+
+        return cls(
+            sp.load_npz(os.path.join(out_dir, "weights.npz")),
+            pd.read_parquet(os.path.join(out_dir, "regions.parquet")),
+            np.load(os.path.join(out_dir, "latitude.npy")),
+            np.load(os.path.join(out_dir, "longitude.npy")),
+        )
+
+    def means(self, field):
+        """Rata-rata berbobot luas untuk satu field 2-D (lat x lon): array per wilayah, NaN jika kosong."""
+        return self.means_chunk(np.asarray(field)[np.newaxis])[0]
+
+    def means_chunk(self, block):
+        """Rata-rata wilayah untuk satu chunk waktu (waktu x lat x lon): array (waktu, wilayah)."""
+        values = np.asarray(block, dtype=np.float64).reshape(len(block), -1).T  # (sel, waktu)
+        valid = ~np.isnan(values)
+        numerator = self.weights @ np.where(valid, values, 0.0)
+        denominator = self.weights @ valid.astype(np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(denominator > 0, numerator / denominator, np.nan).T
+
+
+def load_regridder(admin_path, latitude, longitude, cache_dir=REGRID_DIR):
+    """Regridder dari cache (per grid + file batas wilayah); dibangun sekali jika belum ada."""
+    out_dir = os.path.join(cache_dir, grid_key(latitude, longitude, admin_path))
+    if os.path.exists(os.path.join(out_dir, "_meta.json")):
+        return RegionRegridder.load(out_dir)
+
+    import geopandas as gpd
+
+    started = time.perf_counter()
+    regridder = RegionRegridder.build(gpd.read_file(admin_path), latitude, longitude)
+    regridder.save(out_dir, {"admin_path": admin_path, "build_seconds": round(time.perf_counter() - started, 2)})
+    return regridder
+
+
+def extract_region_means(data_array, time_values, positions, regridder, chunk=24):
+    """
+    Baris (time, sla, provinsi, kabupaten, kecamatan, desa) untuk posisi waktu `positions`:
+    satu perkalian sparse matriks-matriks per chunk waktu, wilayah tanpa data dibuang.
+    """
+    frames = []
+    for start in range(0, len(positions), chunk):
+        block_pos = positions[start:start + chunk]
+        region_means = regridder.means_chunk(data_array.isel(time=block_pos).values)  # (waktu, wilayah)
+        t_idx, r_idx = np.nonzero(~np.isnan(region_means))
+        frame = regridder.regions.iloc[r_idx].reset_index(drop=True)
+        frame.insert(0, "time", time_values[block_pos][t_idx])
+        frame.insert(1, "sla", region_means[t_idx, r_idx].astype(np.float32))
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,236 @@
+# functions/result_cache.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from functions.artifact_store import dataframe_from_arrow, dataframe_to_arrow, figure_from_json, figure_to_json
+
+# =============================================================================
+# CACHE HASIL handle_function_call: LRU DI MEMORI (BATAS BYTE) + SQLITE DI DISK
+# =============================================================================
+#
+# Kunci = sha256(nama fungsi, tag, entitas kanonik, teks (khusus ranking), versi).
+# Versi = versi data (berubah setiap parquet/increment/NetCDF/shapefile berubah) + versi kode
+# (RESULT_CACHE_VERSION dan hash isi modul yang menghasilkan figure/narasi), jadi entri lama
+# otomatis tidak terpakai lagi; entri dengan versi lain dihapus dari disk saat versi baru
+# pertama kali terlihat. Tier disk menyimpan figure sebagai JSON Plotly dan dataframe
+# sebagai Arrow IPC, sehingga hasil bertahan saat restart dan dibagi antar proses worker.
+
+RESULT_FIELDS = ("figure", "dataframe", "narration", "warning")
+
+# Naikkan jika format hasil/serialisasi berubah tanpa perubahan di file yang di-hash code_version()
+RESULT_CACHE_VERSION = 1
+
+_FILE_DIGESTS = {}  # path -> (mtime, sha256 isi)
+
+
+def code_version(paths):
+    """Hash RESULT_CACHE_VERSION + isi file kode `paths`; file hanya dibaca ulang jika mtime-nya berubah."""
+    digest = hashlib.sha256(str(RESULT_CACHE_VERSION).encode())
+    for path in paths:
+        mtime = os.path.getmtime(path)
+        cached = _FILE_DIGESTS.get(path)
+        if cached is None or cached[0] != mtime:
+            with open(path, "rb") as f:
+                cached = (mtime, hashlib.sha256(f.read()).hexdigest())
+            _FILE_DIGESTS[path] = cached
+        digest.update(cached[1].encode())
+    return digest.hexdigest()[:16]
+
+
+def canonical_entities(entities):
+    """Entitas dengan kunci terurut dan nilai huruf kecil tanpa spasi berlebih (urutan list dipertahankan)."""
+    canonical = {}
+    for key in sorted(entities):
+        values = entities[key] if isinstance(entities[key], (list, tuple)) else [entities[key]]
+        canonical[key] = [" ".join(str(v).lower().split()) for v in values]
+    return canonical
+
+
+def result_key(function_name, tag, entities, version, text=None):
+    payload = [function_name, tag, canonical_entities(entities), " ".join(text.lower().split()) if text else None, version]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def serialize_result(result):
+    """dict hasil -> dict kolom SQLite (figure JSON, dataframe Arrow IPC, teks)."""
+    row = {field: None for field in RESULT_FIELDS}
+    if result.get("figure") is not None:
+        row["figure"] = figure_to_json(result["figure"])
+    if result.get("dataframe") is not None:
+        row["dataframe"] = dataframe_to_arrow(result["dataframe"])
+    row["narration"] = result.get("narration")
+    row["warning"] = result.get("warning")
+    return row
+
+
+def deserialize_result(row):
+    result = {}
+    if row["figure"] is not None:
+        result["figure"] = figure_from_json(row["figure"])
+    if row["dataframe"] is not None:
+        result["dataframe"] = dataframe_from_arrow(row["dataframe"])
+    for field in ("narration", "warning"):
+        if row[field] is not None:
+            result[field] = row[field]
+    return result
+
+
+def _row_size(row):
+    return sum(len(value.encode("utf-8") if isinstance(value, str) else value)
+               for value in row.values() if value is not None)
+
+
+class ResultCache:
+    """
+    Cache dua tingkat untuk hasil handler. Tier memori menyimpan objek hasil (figure,
+    DataFrame) dengan batas total byte hasil serialisasinya; tier SQLite menyimpan bentuk
+    serialisasi dengan batas byte sendiri (LRU berdasarkan waktu akses). Thread-safe.
+    """
+
+    def __init__(self, path, max_memory_bytes=256 << 20, max_disk_bytes=2 << 30):
+        self.path = path
+        self.max_memory_bytes = int(max_memory_bytes)
+        self.max_disk_bytes = int(max_disk_bytes)
+        self._entries = OrderedDict()  # key -> (result, size)
+        self._memory_bytes = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.memory_evictions = 0
+        self.disk_evictions = 0
+        self.invalidations = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY, version TEXT, figure TEXT, dataframe BLOB, narration TEXT,"
+                " warning TEXT, size INTEGER, created REAL, accessed REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+
+    @contextmanager
+    def _connect(self):
+        """Koneksi per operasi (aman dari thread Streamlit mana pun); commit lalu ditutup."""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _check_version(self, version):
+        """Versi data baru: kosongkan tier memori dan hapus entri versi lain dari disk."""
+        with self._lock:
+            if version == self._version:
+                return
+            changed = self._version is not None
+            self._version = version
+            if changed:
+                self._entries.clear()
+                self._memory_bytes = 0
+                self.invalidations += 1
+        with self._connect() as conn:
+            conn.execute("DELETE FROM results WHERE version != ?", (version,))
+
+    def _remember(self, key, result, size):
+        with self._lock:
+            if key in self._entries:
+                self._memory_bytes -= self._entries.pop(key)[1]
+            if size > self.max_memory_bytes:
+                return
+            self._entries[key] = (result, size)
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_memory_bytes:
+                self._memory_bytes -= self._entries.popitem(last=False)[1][1]
+                self.memory_evictions += 1
+
+    def _store(self, key, version, row):
+        size = _row_size(row)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, version, row["figure"], row["dataframe"], row["narration"], row["warning"], size, now, now),
+            )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            evicted = 0
+            while total > self.max_disk_bytes:
+                oldest = conn.execute("SELECT key, size FROM results ORDER BY accessed LIMIT 1").fetchone()
+                if oldest is None or oldest[0] == key:
+                    break
+                conn.execute("DELETE FROM results WHERE key = ?", (oldest[0],))
+                total -= oldest[1]
+                evicted += 1
+        with self._lock:
+            self.disk_evictions += evicted
+        return size
+
+    def get_or_compute(self, key, version, compute_fn):
+        """
+        Hasil untuk `key` dari memori, lalu disk, atau dari `compute_fn()` jika belum ada.
+        Exception dari `compute_fn` diteruskan dan tidak disimpan.
+        """
+        self._check_version(version)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return self._entries[key][0]
+
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM results WHERE key = ? AND version = ?", (key, version)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key))
+        if row is not None:
+            result = deserialize_result(row)
+            self._remember(key, result, row["size"])
+            with self._lock:
+                self.disk_hits += 1
+            return result
+
+        with self._lock:
+            self.misses += 1
+        result = compute_fn()
+        size = self._store(key, version, serialize_result(result))
+        self._remember(key, result, size)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._memory_bytes = 0
+        with self._connect() as conn:
+            conn.execute("DELETE FROM results")
+
+    def stats(self):
+        with self._connect() as conn:
+            disk_entries, disk_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        with self._lock:
+            total = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / total if total else 0.0,
+                "memory_evictions": self.memory_evictions,
+                "disk_evictions": self.disk_evictions,
+                "invalidations": self.invalidations,
+                "memory_entries": len(self._entries),
+                "memory_bytes": self._memory_bytes,
+                "disk_entries": disk_entries,
+                "disk_bytes": disk_bytes,
+                "version": self._version,
+            }
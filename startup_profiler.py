@@ -0,0 +1,58 @@
+# functions/startup_profiler.py
+
+import importlib
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Catatan waktu startup: (kategori, nama, detik). Kategori 'module' untuk import,
+# 'asset' untuk file/model yang dimuat.
+_TIMINGS = []
+_LOCK = threading.Lock()
+_STARTED_AT = time.perf_counter()
+
+
+def record(name, seconds, category="asset"):
+    with _LOCK:
+        _TIMINGS.append((category, name, seconds))
+
+
+@contextmanager
+def timed(name, category="asset"):
+    """Mencatat durasi blok `with` ke laporan startup."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start, category)
+
+
+def lazy_import(module_name):
+    """
+    Import modul saat pertama kali dibutuhkan. Waktu import hanya dicatat
+    jika modul belum pernah dimuat oleh proses ini.
+    """
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+    with timed(module_name, "module"):
+        return importlib.import_module(module_name)
+
+
+def report():
+    """Daftar timing (terlama dulu) beserta total per kategori, dalam milidetik."""
+    with _LOCK:
+        rows = [
+            {"kategori": category, "nama": name, "ms": round(seconds * 1000.0, 1)}
+            for category, name, seconds in _TIMINGS
+        ]
+    rows.sort(key=lambda row: row["ms"], reverse=True)
+    totals = {}
+    for row in rows:
+        totals[row["kategori"]] = round(totals.get(row["kategori"], 0.0) + row["ms"], 1)
+    return {
+        "sejak_proses_mulai_ms": round((time.perf_counter() - _STARTED_AT) * 1000.0, 1),
+        "total_per_kategori_ms": totals,
+        "rincian": rows,
+    }
@@ -0,0 +1,222 @@
+# functions/timeseries_store.py
+
+import json
+import os
+import shutil
+import sys
+import time
+
+import pandas as pd
+
+# =============================================================================
+# DATASET PARQUET TERPARTISI (provinsi/year) DENGAN PREDICATE PUSHDOWN
+# =============================================================================
+#
+# Build manual:
+#   python -m functions.timeseries_store build             (observasi & proyeksi)
+#   python -m functions.timeseries_store build observasi
+#
+# Layout: <out_dir>/provinsi=<nama>/year=<tahun>/part-*.parquet, tiap file terurut
+# (kabupaten, kecamatan, desa, time) dengan statistik row group, ditambah
+# _catalog.parquet (daftar wilayah unik) dan _meta.json (signature sumber).
+
+PARTITION_DIR = "data/partitioned"
+ROW_GROUP_SIZE = 50_000
+SORT_COLUMNS = ["kabupaten", "kecamatan", "desa", "time"]
+CATALOG_FILE = "_catalog.parquet"
+META_FILE = "_meta.json"
+
+
+def partition_path(data_type, base_dir=PARTITION_DIR):
+    return os.path.join(base_dir, data_type)
+
+
+def _source_signature(source_path):
+    stat = os.stat(source_path)
+    return {"source": source_path, "mtime": stat.st_mtime, "size": stat.st_size}
+
+
+def _prepare(df):
+    if "year" not in df.columns:
+        df = df.assign(year=pd.to_datetime(df["time"]).dt.year)
+    df = df.assign(year=df["year"].astype("int16"))
+    # Kolom categorical (frame compact) ditulis sebagai string biasa
+    df = df.astype({col: str for col in df.select_dtypes("category").columns})
+    return df.sort_values(["provinsi", "year", *SORT_COLUMNS], kind="stable")
+
+
+def _write_partitions(df, out_dir, row_group_size, basename_template=None, existing_data_behavior="error"):
+    import pyarrow as pa
+    import pyarrow.dataset as pds
+
+    partitioning = pds.partitioning(pa.schema([("provinsi", pa.string()), ("year", pa.int16())]), flavor="hive")
+    file_format = pds.ParquetFileFormat()
+    pds.write_dataset(
+        pa.Table.from_pandas(df, preserve_index=False),
+        out_dir,
+        format=file_format,
+        partitioning=partitioning,
+        basename_template=basename_template,
+        existing_data_behavior=existing_data_behavior,
+        file_options=file_format.make_write_options(compression="zstd", write_statistics=True),
+        max_rows_per_group=row_group_size,
+        min_rows_per_group=min(row_group_size, 10_000),
+        use_threads=False,  # menjaga urutan baris di dalam setiap file
+    )
+
+
+def _write_meta(out_dir, meta):
+    with open(os.path.join(out_dir, META_FILE), "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def _read_meta(out_dir):
+    meta_path = os.path.join(out_dir, META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r") as f:
+        return json.load(f)
+
+
+def build_partitioned(df, out_dir, source_path, row_group_size=ROW_GROUP_SIZE, increments=()):
+    """
+    Menulis frame ternormalisasi (hasil load_timeseries_data) sebagai dataset
+    terpartisi provinsi/year. Direktori lama dihapus lebih dulu.
+    `increments` adalah nama file increment yang sudah termasuk di dalam `df`.
+    """
+    started = time.perf_counter()
+    if os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    os.makedirs(out_dir)
+
+    df = _prepare(df)
+    _write_partitions(df, out_dir, row_group_size)
+
+    catalog_cols = [col for col in ("provinsi", "kabupaten", "kecamatan", "desa") if col in df.columns]
+    df[catalog_cols].drop_duplicates().to_parquet(os.path.join(out_dir, CATALOG_FILE), index=False)
+
+    meta = _source_signature(source_path)
+    meta.update({
+        "n_rows": int(len(df)),
+        "increments": list(increments),
+        "build_seconds": round(time.perf_counter() - started, 2),
+    })
+    _write_meta(out_dir, meta)
+    return meta
+
+
+def append_partitioned(df_new, out_dir, increment_name, row_group_size=ROW_GROUP_SIZE):
+    """
+    Menambahkan baris increment sebagai file baru di partisi provinsi/year yang sesuai;
+    file yang sudah ada tidak disentuh. Katalog wilayah diperluas jika ada wilayah baru.
+    """
+    started = time.perf_counter()
+    df_new = _prepare(df_new)
+    stem = os.path.splitext(increment_name)[0]
+    _write_partitions(df_new, out_dir, row_group_size, basename_template=f"{stem}-{{i}}.parquet",
+                      existing_data_behavior="overwrite_or_ignore")
+
+    catalog_path = os.path.join(out_dir, CATALOG_FILE)
+    catalog = pd.read_parquet(catalog_path)
+    catalog = pd.concat([catalog, df_new[list(catalog.columns)]], ignore_index=True).drop_duplicates()
+    catalog.to_parquet(catalog_path, index=False)
+
+    meta = _read_meta(out_dir)
+    meta["increments"] = meta.get("increments", []) + [increment_name]
+    meta["n_rows"] = meta.get("n_rows", 0) + int(len(df_new))
+    meta["update_seconds"] = round(time.perf_counter() - started, 2)
+    _write_meta(out_dir, meta)
+    return meta
+
+
+def applied_increments(out_dir):
+    return (_read_meta(out_dir) or {}).get("increments", [])
+
+
+def is_current(out_dir, source_path):
+    """
+    True jika dataset terpartisi ada dan dibangun dari versi parquet sumber saat ini.
+    Increment yang belum diterapkan dicek terpisah (applied_increments).
+    """
+    meta = _read_meta(out_dir)
+    if meta is None or not os.path.exists(source_path):
+        return False
+    signature = _source_signature(source_path)
+    return all(meta.get(k) == signature[k] for k in ("mtime", "size"))
+
+
+class PartitionedTimeseries:
+    """
+    Pembaca dataset terpartisi. Filter wilayah diterjemahkan lewat katalog menjadi
+    daftar partisi provinsi, lalu sisanya (kabupaten/kecamatan/desa, year) di-push
+    ke pyarrow sehingga hanya partisi dan row group yang cocok yang dibaca.
+    """
+
+    def __init__(self, out_dir):
+        import pyarrow as pa
+        import pyarrow.dataset as pds
+
+        self.out_dir = out_dir
+        self.dataset = pds.dataset(
+            out_dir,
+            format="parquet",
+            partitioning=pds.partitioning(pa.schema([("provinsi", pa.string()), ("year", pa.int16())]), flavor="hive"),
+        )
+        self.catalog = pd.read_parquet(os.path.join(out_dir, CATALOG_FILE))
+
+    def _provinces_for(self, level, name):
+        if level == "provinsi":
+            return [name]
+        return self.catalog.loc[self.catalog[level] == name, "provinsi"].unique().tolist()
+
+    def read(self, level=None, names=None, tahun=None, columns=None, parents=None):
+        """
+        Baris untuk wilayah `names` (str atau list) pada `level`, opsional satu `tahun`.
+        `parents` (dict kolom induk -> nama) membatasi ke nama yang berada di induk tersebut.
+        """
+        import pyarrow.dataset as pds
+
+        expr = None
+        if level is not None:
+            names = [names] if isinstance(names, str) else list(names)
+            names = [str(n).lower().strip() for n in names]
+            provinces = sorted({p for n in names for p in self._provinces_for(level, n)})
+            if not provinces:
+                return self._empty(columns)
+            expr = pds.field("provinsi").isin(provinces)
+            if level != "provinsi":
+                expr = expr & pds.field(level).isin(names)
+        for col, value in (parents or {}).items():
+            if value and col in self.dataset.schema.names:
+                parent_expr = pds.field(col) == str(value).lower().strip()
+                expr = parent_expr if expr is None else expr & parent_expr
+        if tahun is not None:
+            year_expr = pds.field("year") == int(tahun)
+            expr = year_expr if expr is None else expr & year_expr
+
+        df = self.dataset.to_table(filter=expr, columns=columns).to_pandas()
+        if "year" in df.columns:
+            df["year"] = df["year"].astype("int64")
+        return df
+
+    def _empty(self, columns=None):
+        df = self.dataset.schema.empty_table().to_pandas()
+        return df[columns] if columns else df
+
+
+if __name__ == "__main__":
+    from functions import ingest, plotter
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "build"
+    if command != "build":
+        print(f"Perintah tidak dikenal: {command}. Gunakan 'build'.")
+        sys.exit(1)
+
+    for data_type in sys.argv[2:] or list(plotter.TIMESERIES_PATHS):
+        source_path = plotter.TIMESERIES_PATHS[data_type]
+        out_dir = partition_path(data_type)
+        print(f"🔧 Menulis dataset terpartisi {data_type} ke {out_dir}...")
+        # Frame non-compact supaya latitude/longitude ikut tersimpan di setiap baris
+        meta = build_partitioned(plotter.load_timeseries_data(data_type, compact=False), out_dir, source_path,
+                                 increments=ingest.increment_names(data_type))
+        print(f"✅ {meta['n_rows']} baris dalam {meta['build_seconds']} detik.")
@@ -104,57 +104,24 @@
 # print("Model trained and saved successfully.")
 
 import json
-import pickle
 import numpy as np
-import nltk
-from nltk.stem import LancasterStemmer
 from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import Dense, Dropout
 from tensorflow.keras.optimizers import SGD
 import random
+from functions.bow_encoder import BowEncoder
 random.seed(42)
 np.random.seed(42)
 
-stemmer = LancasterStemmer()
-
 with open("chatbot/samudra.json") as f:
     data = json.load(f)
 
-words = []
-classes = []
-documents = []
-ignore_words = ['?', '!', '.', ',']
-
-for intent in data['intents']:
-    for pattern in intent['patterns']:
-        w = nltk.word_tokenize(pattern)
-        words.extend(w)
-        documents.append((w, intent['tag']))
-        if intent['tag'] not in classes:
-            classes.append(intent['tag'])
-
-words = [stemmer.stem(w.lower()) for w in words if w not in ignore_words]
-words = sorted(list(set(words)))
-classes = sorted(list(set(classes)))
-
-pickle.dump(words, open("chatbot/words-samudraAI_new.pkl", "wb"))
-pickle.dump(classes, open("chatbot/classes-samudraAI_new.pkl", "wb"))
-
-training = []
-output_empty = [0] * len(classes)
-
-for doc in documents:
-    bag = []
-    pattern_words = doc[0]
-    pattern_words = [stemmer.stem(w.lower()) for w in pattern_words]
-    bag = [1 if w in pattern_words else 0 for w in words]
-    output_row = list(output_empty)
-    output_row[classes.index(doc[1])] = 1
-    training.append([bag, output_row])
-
-training = np.array(training, dtype=object)
-train_x = np.array(list(training[:, 0]))
-train_y = np.array(list(training[:, 1]))
+# Vocabulary, kelas, dan encoding dibuat oleh encoder yang sama dengan aplikasi
+encoder, documents = BowEncoder.from_intents(data)
+encoder.save("chatbot/words-samudraAI_new.pkl", "chatbot/classes-samudraAI_new.pkl")
+
+train_x = encoder.encode_batch([text for text, _ in documents])
+train_y = encoder.encode_labels([tag for _, tag in documents])
 
 model = Sequential()
 model.add(Dense(128, input_shape=(len(train_x[0]),), activation="relu"))